@@ -11,77 +11,51 @@ For instructions on using this code, please read the corresponding README.
 import numpy as np
 import pandas as pd
 import os
+import sys
 
-# The directory of the CIF files
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+from co2mof import read_cif_atoms, to_species
+from co2mof.boa import bag_indices, bag_names
+from co2mof.sparse import BagCounts
+
+# The directory of the CIF files (can also be given on the command line: python bag-of-atoms.py [directory])
 directory_in_str = 'C:/Users/Jake/OneDrive - University of Ottawa/Desktop/QSPR Codes/cifs'
+if len(sys.argv) > 1:
+    directory_in_str = sys.argv[1]
 directory = os.fsencode(directory_in_str)
 
 # Name of CSV file to store descriptors
 csv = 'atom-bins.csv'
 
+# Store the bags compactly instead, as the number of atoms of each element in each bag (see co2mof/sparse.py),
+# in the .npz file below; gen-bag-of-atoms.py then reads it if its compact setting is on
+compact = False
+compact_file = 'atom-bins.npz'
+names, species, all_bags = [], [], []
+
 # For every file in the directory...
 for file in os.listdir(directory):
-
-    # Generate the "bag" as a nested list
-    bag_of_atoms = np.zeros((6, 6, 6), str)
-    bag_of_atoms = bag_of_atoms.tolist()
-
-    # Set up a dataframe to store all 6*6*6 bins of atoms, and generate column names depending on which section of the unit cell each atom is located in
-    bag_of_atoms_df = pd.DataFrame(index=np.arange(1), columns=np.arange(216))
-    column_names = []
-    for i in range(6):
-        for n in range(6):
-            for m in range(6):
-                column_names.append('bin {}{}{}'.format(i,n,m))
-    bag_of_atoms_df.columns = column_names
-
-    # Read the CIF line-by-line
     filename = os.fsdecode(file)
-    keyword_start = '_atom_type_partial_charge'
-    keyword_end = 'loop_'
-    cif_file = open('{}/{}'.format(directory_in_str, filename), 'r')
-    line = cif_file.readline().split('data_')
-    MOF_name = line[1]
-
-    while keyword_start not in line:
-        line = cif_file.readline()
-
-    counter = 0
-
-    while keyword_end not in line:
-        # Except an index error since there is a blank line before end keyword appears
-        try:
-            # Split the line into a list
-            line = cif_file.readline().split()
-            atom_type = line[1]
-            x = float(line[3])
-            y = float(line[4])
-            z = float(line[5])
-            
-            posx = None
-            posy = None
-            posz = None
-            
-            # A counter to count the number of total framework atoms
-            counter += 1
-
-            # "Cut" the unit cell into sixths in all dimensions and assign an x,y,z position (0, 1, 2, 3, 4, or 5) for each atom
-            i = 0
-            while (posx == None or posy == None or posz == None):
-                if i*(1/6) <= x < (i+1)*(1/6):
-                    posx = i
-                if i*(1/6) <= y < (i+1)*(1/6):
-                    posy = i
-                if i*(1/6) <= z <= (i+1)*(1/6):
-                    posz = i
-                i += 1
-
-            # Add it to the bag and corresponding "bin"
-            bag_of_atoms[posx][posy][posz] += (' ' + atom_type)
-            bag_of_atoms_df['bin {}{}{}'.format(posx, posy, posz)] = bag_of_atoms[posx][posy][posz]
-
-        except IndexError:
-            pass
+    if not filename.endswith('.cif'):
+        continue
+
+    # Read the atoms from the CIF and find which 6 x 6 x 6 section ("bin") of the unit cell each one is in
+    MOF_name, atom_types, frac = read_cif_atoms('{}/{}'.format(directory_in_str, filename))
+    bags = bag_indices(frac)
+    # A counter to count the number of total framework atoms
+    counter = len(atom_types)
+
+    if compact:
+        names.append(MOF_name)
+        species.append(to_species(atom_types))
+        all_bags.append(bags)
+        continue
+
+    # Add each atom to its bag as a space-separated string of atom types; empty bins are left empty
+    bag_of_atoms = [''] * len(bag_names)
+    for atom_type, bag in zip(atom_types, bags):
+        bag_of_atoms[bag] += (' ' + atom_type)
+    bag_of_atoms_df = pd.DataFrame([[atoms if atoms else np.nan for atoms in bag_of_atoms]], columns=bag_names)
 
     # Put the data into a csv file and make the index the name of the CIF file
     bag_of_atoms_df.index = [MOF_name]
@@ -95,3 +69,11 @@ for file in os.listdir(directory):
         bag_of_atoms_df.to_csv('{}/{}'.format(directory_in_str, csv))
     else:
         bag_of_atoms_df.to_csv('{}/{}'.format(directory_in_str, csv))
+
+if compact:
+    # Added to the bags already in the file, as the csv is
+    bag_counts = BagCounts.from_atoms(names, species, all_bags)
+    compact_path = '{}/{}'.format(directory_in_str, compact_file)
+    if os.path.exists(compact_path):
+        bag_counts = BagCounts.concat([BagCounts.load(compact_path), bag_counts])
+    bag_counts.save(compact_path)
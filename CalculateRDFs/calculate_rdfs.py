@@ -6,18 +6,27 @@ July 2, 2020
 Modified by Jake Burner, July 3, 2020
 
 '''
+import os
+import sys
+import threading
+import zlib
 import numpy as np
 import multiprocessing as mp
-from glob import glob
-from CifFile import ReadCif
-from atomic_property_dict import apd
-from itertools import product, combinations, combinations_with_replacement
+from dataclasses import replace
 from datetime import datetime
-import math
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+from co2mof import RDFConfig, read_cif, compute_aprdf, compute_aprdf_batch
+from co2mof.dedup import structure_fingerprint, group_duplicates
+from co2mof.geometry import geometric_columns, geometric_descriptors
+from co2mof.ingest import CifPrefetcher, is_archive, list_cifs
+from co2mof.rdf_kernels import has_numba
+from co2mof.rdf_sampling import compute_aprdf_sampled
 
 ########################### USER MUST DEFINE THESE ###########################
 
-# Where your cifs are located (src) and desired path for csv
+# Where your cifs are located (src: a directory, or a .zip or .tar(.gz/.bz2/.xz) archive of cifs, which is
+# read without extracting it) and desired path for csv
 src = "OneDrive/Documents/RDFs/cifs"
 dst = "OneDrive/Documents/RDFs/cifs/RDFs.csv"
 
@@ -28,7 +37,7 @@ n_cores = 3
 smooth = -10
 factor = 0.001
 
-# Desired distance bins (in this case with linear increase in bin size from 2 to 30 A)
+# Desired distance bins (in this case with linear increase in bin size from 2 to 30 A, as co2mof.default_bins)
 bins = np.arange(113, dtype=np.float64)
 bins[0] = 2.0
 step = 0.004425
@@ -41,74 +50,206 @@ n_bins = len(bins)
 
 # Properties desired for the RDFs
 prop_names = ["electronegativity", "hardness", "vdWaalsVolume"]
-prop_list = [apd[name] for name in prop_names]
 n_props = len(prop_names)
 
+# Kernel used for the pair accumulation (see co2mof/rdf_kernels.py): "auto" (numba if installed, otherwise numpy),
+# "numba", "numpy" or "reference" (the original, slow pair-by-pair loop).
+# The numba kernel is multithreaded itself, so keep n_cores * NUMBA_NUM_THREADS at or below the core count.
+backend = "auto"
+
+# Gaussian truncation tolerance for the numpy/numba backends. If set (e.g. 1e-12), only bins where
+# exp(B * (r - d) ** 2) >= gauss_tol are evaluated for each pair; None evaluates every bin.
+# The error in any (unrounded, unnormalised) bin is at most gauss_tol times the sum of the pair property products.
+gauss_tol = None
+
+# Floating point precision of the distance and Gaussian evaluation for the numpy/numba backends,
+# "float64" or "float32" (accumulation is always float64). Use precision_report.py to check the
+# effect of "float32" on your structures and on the model predictions before switching.
+precision = "float64"
+
+# Each worker reads batch_size cifs at a time. With the NumPy kernel (backend "numpy", or "auto" without numba),
+# those with fewer than batch_atoms atoms are computed together in one vectorised NumPy call, which saves the
+# per-structure overhead on small MOFs; the "numba" and "reference" backends (and "auto" with numba) compute
+# every structure on its own with that backend. The batched call sums every pair, so no structure is batched with
+# symmetry = True, nor any that sample_pairs samples. batch_size = 1 computes every structure on its own.
+batch_size = 100
+batch_atoms = 200
+
+# Find duplicate structures (same composition, cell and atoms, in any order; see co2mof/dedup.py) first and
+# compute the AP-RDFs once per unique structure, writing the same line for every copy. Every cif is still parsed once
+# only: the parsed unique structures are kept in memory between the two passes.
+dedup = False
+
+# With n_readers > 0, that many threads read the cifs ahead of the workers into a queue of at most max_queued files
+# (see co2mof/ingest.py), and the queue depth and stalls are printed at the end; a .tar archive is always read by one
+# thread. With n_readers = 0 every worker reads its own cifs (directories only; archives use one reader).
+n_readers = 0
+max_queued = 256
+
+# Find the symmetry operations of every structure, whatever the backend and size (P1 cifs of symmetric frameworks,
+# supercells; see co2mof/symmetry.py) and sum only over the pairs of one atom per orbit, which is up to |G| times
+# faster for a group of |G| operations. Atoms count as symmetric copies within symprec (A). One structure in
+# verify_every (chosen by name) is also computed with the full pair sum; if the two differ by more than verify_tol
+# in any value, a warning is printed and the full sum is written.
+symmetry = False
+symprec = 1e-3
+verify_every = 20
+verify_tol = 1e-9
+
+# Approximate AP-RDFs for first-pass screening of very large structures (see co2mof/rdf_sampling.py): the AP-RDFs of
+# structures with more than sample_pairs atom pairs are estimated from a stratified random sample of about sample_pairs
+# pairs (None computes every pair). With sample_rel_error set (e.g. 0.01), sampling stops early once the largest
+# standard error is below that fraction of the largest value. The standard error of every value is written to
+# error_dst (same layout as dst; 0 for structures computed exactly) if given. Run sampling_report.py to measure the
+# accuracy on your structures and the effect on the predictions.
+sample_pairs = None
+sample_rel_error = None
+error_dst = None
+
+# Also estimate geometric descriptors of every structure in the same pass (density, largest included sphere, CO2 void
+# fraction and CO2-accessible surface area; see co2mof/geometry.py) and write them to geometry_dst (None skips this).
+# They approximate the Zeo++ values the 'geo' models were trained with, and Pore_3 is not estimated.
+# grid_spacing (A) is the resolution of the distance grid behind the void fraction.
+geometry_dst = None
+grid_spacing = 0.5
+
 ###############################################################################
 
-super_cell = np.array(list(product([-1, 0, 1], repeat=3)), dtype=float)
+# The paths can also be given on the command line: python calculate_rdfs.py [src [dst]]
+if __name__ == "__main__" and len(sys.argv) > 1:
+    src = sys.argv[1]
+    if len(sys.argv) > 2:
+        dst = sys.argv[2]
 
-csv_header = [f"RDF_{prop}_{r:.2f}" for prop in prop_names for r in bins]
-csv_header.insert(0, "Structure_Name")
+config = RDFConfig(smooth=smooth, factor=factor, bins=bins, prop_names=tuple(prop_names), backend=backend,
+                   gauss_tol=gauss_tol, precision=precision, symmetry=symmetry, symprec=symprec)
+full_config = replace(config, symmetry=False)
 
+csv_header = config.columns
+csv_header.insert(0, "Structure_Name")
 
-def main(name):
-    mof = ReadCif(name)
-    mof = mof[mof.visible_keys[0]]
-
-    elements = mof["_atom_site_type_symbol"]
-    n_atoms = len(elements)
-
-    prop_dict = {}
-    for a1, a2 in combinations_with_replacement(set(elements), 2):
-        prop_arr = [prop[a1] * prop[a2] for prop in prop_list]
-        prop_dict[(a1, a2)] = prop_arr
-        if a1 != a2:
-            prop_dict[(a2, a1)] = prop_arr
-
-    la = float(mof["_cell_length_a"])
-    lb = float(mof["_cell_length_b"])
-    lc = float(mof["_cell_length_c"])
-    aa = np.deg2rad(float(mof["_cell_angle_alpha"]))
-    ab = np.deg2rad(float(mof["_cell_angle_beta"]))
-    ag = np.deg2rad(float(mof["_cell_angle_gamma"]))
-    # If volume is missing from .cif, calculate it.
-    try:
-        cv = float(mof["_cell_volume"])
-    except KeyError:
-        cv = la * lb * lc * math.sqrt(1 - (math.cos(aa)) ** 2 -
-                (math.cos(ab)) ** 2 - (math.cos(ag)) ** 2 +
-                (2 * math.cos(aa) * math.cos(ab) * math.cos(ag)))
-
-
-    frac2cart = np.zeros([3, 3], dtype=float)
-    frac2cart[0, 0] = la
-    frac2cart[0, 1] = lb * np.cos(ag)
-    frac2cart[0, 2] = lc * np.cos(ab)
-    frac2cart[1, 1] = lb * np.sin(ag)
-    frac2cart[1, 2] = lc * (np.cos(aa) - np.cos(ab)*np.cos(ag)) / np.sin(ag)
-    frac2cart[2, 2] = cv / (la * lb * np.sin(ag))
-
-    frac = np.array([
-        mof["_atom_site_fract_x"],
-        mof["_atom_site_fract_y"],
-        mof["_atom_site_fract_z"],
-    ], dtype=float).T
-
-    apw_rdf = np.zeros([n_props, n_bins], dtype=np.float64)
-    for i, j in combinations(range(n_atoms), 2):
-        cart_i = frac2cart @ frac[i]
-        cart_j = (frac2cart @ (super_cell + frac[j]).T).T
-        dist_ij = min(np.linalg.norm(cart_j - cart_i, axis=1))
-        rdf = np.exp(smooth * (bins - dist_ij) ** 2)
-        rdf = rdf.repeat(n_props).reshape(n_bins, n_props)
-        apw_rdf += (rdf * prop_dict[(elements[i], elements[j])]).T
-    apw_rdf = np.round(apw_rdf.flatten() * factor / n_atoms, decimals=12)
 
+def csv_line(name, apw_rdf):
     return ("{}," * len(apw_rdf) + "{}\n").format(
         name.split('/')[-1], *apw_rdf.tolist())
 
 
+def sampled(n_atoms):
+    # Whether the AP-RDFs of a structure of n_atoms atoms are estimated by sampling
+    return sample_pairs is not None and n_atoms * (n_atoms - 1) // 2 > sample_pairs
+
+
+def aprdf(name, structure):
+    # AP-RDFs of one structure, and their standard errors if they were estimated by sampling (None otherwise)
+    if sampled(len(structure[2])):
+        return compute_aprdf_sampled(*structure, full_config, sample_pairs, sample_rel_error,
+                                     seed=zlib.crc32(name.encode()))
+
+    apw_rdf = compute_aprdf(*structure, config)
+    if config.symmetry and verify_every and zlib.crc32(name.encode()) % verify_every == 0:
+        full = compute_aprdf(*structure, full_config)
+        deviation = np.abs(apw_rdf - full).max()
+        if deviation > verify_tol:
+            print("Warning: the symmetry-reduced AP-RDFs of {} differ from the full pair sum by {:.3e}, "
+                  "writing the full sum".format(name, deviation), file=sys.stderr)
+            return full, None
+    return apw_rdf, None
+
+
+def geometry(name, structure):
+    # Geometric descriptors of one structure, in the order of geometric_columns
+    values = geometric_descriptors(*structure, spacing=grid_spacing)
+    return np.array([values[column] for column in geometric_columns])
+
+
+def main(name):
+    apw_rdf, _ = aprdf(name, read_cif(name))
+
+    return csv_line(name, apw_rdf)
+
+
+def fingerprint(name, data=None):
+    # Fingerprint of a cif and its parsed structure, kept for the AP-RDFs if it is the first of its copies
+    structure = read_cif(name, data)
+    return structure_fingerprint(*structure), structure
+
+
+def fingerprint_batch(batch):
+    # batch: [(name, data)] of prefetched cifs
+    return [(name, fingerprint(name, data)) for name, data in batch]
+
+
+def main_batch(names, aliases=None, data=None, structures=None):
+    # aliases: {name: [names of its copies]}, to write the AP-RDFs of name for every copy (dedup)
+    # data: the contents of the cifs, if already read by the prefetcher
+    # structures: the parsed cifs, if already parsed (dedup)
+    # Returns the csv lines of the AP-RDFs and, if error_dst and geometry_dst are set, of their
+    # standard errors and of the geometric descriptors
+    if structures is None:
+        if data is None:
+            data = [None] * len(names)
+        structures = [read_cif(name, cif) for name, cif in zip(names, data)]
+    # The batch kernel is the NumPy one and sums every pair, so the other backends, and the symmetry-reduced and
+    # sampled structures, are computed on their own
+    numpy_kernel = config.backend == "numpy" or (config.backend == "auto" and not has_numba)
+    small = [k for k, (_, _, species) in enumerate(structures) if len(species) < batch_atoms
+             and not sampled(len(species))] if numpy_kernel and not config.symmetry else []
+
+    apw_rdfs, errors = {}, {}
+    if small:
+        apw_rdfs.update(zip(small, compute_aprdf_batch([structures[k] for k in small], config)))
+    for k, structure in enumerate(structures):
+        if k not in apw_rdfs:
+            apw_rdfs[k], errors[k] = aprdf(names[k], structure)
+
+    rows = [(name, k) for k, name in enumerate(names)] if aliases is None else \
+        [(alias, k) for k, name in enumerate(names) for alias in aliases[name]]
+    lines = "".join(csv_line(name, apw_rdfs[k]) for name, k in rows)
+    error_lines = geometry_lines = ""
+    if error_dst is not None:
+        zeros = np.zeros(len(csv_header) - 1)
+        error_lines = "".join(csv_line(name, zeros if errors.get(k) is None else errors[k]) for name, k in rows)
+    if geometry_dst is not None:
+        values = [geometry(name, structure) for name, structure in zip(names, structures)]
+        geometry_lines = "".join(csv_line(name, values[k]) for name, k in rows)
+    return lines, error_lines, geometry_lines
+
+
+def main_batch_parsed(batch):
+    # batch: [(names of the copies of a structure, representative first, its parsed structure)]
+    aliases, structures = zip(*batch)
+    return main_batch([copies[0] for copies in aliases], {copies[0]: copies for copies in aliases},
+                      structures=structures)
+
+
+def main_batch_read(batch):
+    # batch: [(name, data)] of prefetched cifs
+    names, data = zip(*batch)
+    return main_batch(names, data=data)
+
+
+def read_ahead(pool, worker, items):
+    # Results of worker over batches of batch_size items, sent to the pool as the items arrive. At most
+    # 2 * n_cores batches are in flight, since Pool.imap_unordered would otherwise take (and hold) all of them at once.
+    slots = threading.BoundedSemaphore(2 * n_cores)
+
+    def batches():
+        batch = []
+        for item in items:
+            batch.append(item)
+            if len(batch) == batch_size:
+                slots.acquire()
+                yield batch
+                batch = []
+        if batch:
+            slots.acquire()
+            yield batch
+
+    for results in pool.imap_unordered(worker, batches()):
+        slots.release()
+        yield results
+
+
 if __name__ == "__main__":
 
     start = datetime.now()
@@ -119,13 +260,48 @@ if __name__ == "__main__":
     print("")
     print("Starting RDF calculations on structures in {}, using {} cores...".format(src, n_cores))
     print("RDFs will be written continuously to: {}".format(dst))
+    if error_dst is not None:
+        print("Standard errors of the sampled RDFs will be written to: {}".format(error_dst))
+    if geometry_dst is not None:
+        print("Geometric descriptors will be written to: {}".format(geometry_dst))
 
-    with open(dst, 'w') as csv, mp.Pool(n_cores) as pool:
+    with open(dst, 'w') as csv, open(error_dst or os.devnull, 'w') as errors, \
+            open(geometry_dst or os.devnull, 'w') as geometries, mp.Pool(n_cores) as pool:
         csv.write(','.join(csv_header) + '\n')
+        errors.write(','.join(csv_header) + '\n')
+        geometries.write(','.join(("Structure_Name",) + geometric_columns) + '\n')
         csv.flush()
-        for results in pool.imap_unordered(main, glob(f"{src}/*.cif")):
+        names = list_cifs(src)
+        prefetch = n_readers > 0 or is_archive(src)
+        if dedup:
+            if prefetch:
+                prefetcher = CifPrefetcher(src, names, n_readers, max_queued)
+                parsed = dict(item for results in read_ahead(pool, fingerprint_batch, prefetcher) for item in results)
+                # Readers deliver the cifs out of order; keep the representatives independent of that
+                parsed = [parsed[name] for name in names]
+            else:
+                parsed = pool.map(fingerprint, names, chunksize=batch_size)
+            groups = group_duplicates(names, [key for key, _ in parsed])
+            print("{} structures, {} unique".format(len(names), len(groups)))
+            # The AP-RDFs are computed from the structures parsed for the fingerprints, without reading the cifs again
+            structures = {name: structure for name, (_, structure) in zip(names, parsed) if name in groups}
+            del parsed
+            groups = [(aliases, structures.pop(name)) for name, aliases in groups.items()]
+            batches = [groups[k:k + batch_size] for k in range(0, len(groups), batch_size)]
+            all_results = pool.imap_unordered(main_batch_parsed, batches)
+        elif prefetch:
+            prefetcher = CifPrefetcher(src, names, n_readers, max_queued)
+            all_results = read_ahead(pool, main_batch_read, prefetcher)
+        else:
+            batches = [names[k:k + batch_size] for k in range(0, len(names), batch_size)]
+            all_results = pool.imap_unordered(main_batch, batches)
+        for results, error_lines, geometry_lines in all_results:
             csv.write(results)
+            errors.write(error_lines)
+            geometries.write(geometry_lines)
             csv.flush()
+        if prefetch:
+            print(prefetcher.summary())
 
     print("")
     print("")
@@ -0,0 +1,134 @@
+'''
+Accuracy report for the float32 AP-RDF mode of calculate_rdfs.py.
+
+Computes the AP-RDFs of every cif in src twice, with precision="float64" (the reference) and
+precision="float32", using the bins, properties, backend and gauss_tol set in calculate_rdfs.py, and
+reports the largest deviation over the dataset and the time spent in each mode.
+
+If descriptor_csv is given, the RDF columns of the matching rows (matched on the cif name without
+extension against the "Unnamed: 0" column) are replaced by the float64 and float32 AP-RDFs and fed
+to every shipped wc/Sel model that uses AP-RDFs, to report the effect on the predictions. As in
+load_pytorch.py, features are standardised with a StandardScaler, fitted here on the float64 features
+and applied to both so that only the precision differs.
+
+For instructions on using this code, please read the corresponding README.
+'''
+import os
+import sys
+import numpy as np
+import multiprocessing as mp
+from dataclasses import replace
+from glob import glob
+from time import perf_counter
+from datetime import datetime
+
+import calculate_rdfs as cr
+from co2mof import read_cif, compute_aprdf
+
+########################### USER MUST DEFINE THESE ###########################
+
+# Where your cifs are located
+src = "OneDrive/Documents/RDFs/cifs"
+
+# Optional csv with the descriptors of (some of) the same structures, laid out as required by
+# load_pytorch.py, used to measure the effect on the model predictions. None skips this part.
+descriptor_csv = None
+
+# Number of cores for calculations
+n_cores = 3
+
+###############################################################################
+
+configs = {precision: replace(cr.config, precision=precision) for precision in ("float64", "float32")}
+
+
+def warm_up():
+    # Compile (or load) the kernels for both precisions before anything is timed
+    for config in configs.values():
+        compute_aprdf(10 * np.eye(3), np.array([[0.0, 0.0, 0.0], [0.1, 0.1, 0.1]]), np.array([6, 6]), config)
+
+
+def compare(name):
+    structure = read_cif(name)
+
+    start = perf_counter()
+    rdf64 = compute_aprdf(*structure, configs["float64"])
+    t64 = perf_counter() - start
+
+    start = perf_counter()
+    rdf32 = compute_aprdf(*structure, configs["float32"])
+    t32 = perf_counter() - start
+
+    return os.path.basename(name), rdf64, rdf32, t64, t32
+
+
+def prediction_report(names, rdf64, rdf32, descriptor_csv):
+    # Also used by sampling_report.py, with the exact and the sampled AP-RDFs as rdf64 and rdf32
+    import pandas as pd
+    from sklearn.preprocessing import StandardScaler
+    from co2mof import Predictor, get_features
+    from co2mof.model import model_dir
+
+    data = pd.read_csv(descriptor_csv)
+    index = {os.path.splitext(name)[0]: k for k, name in enumerate(names)}
+    data = data[data['Unnamed: 0'].astype(str).isin(index)].reset_index(drop=True)
+    if len(data) == 0:
+        print("None of the structures found in {}, skipping the prediction report".format(descriptor_csv))
+        return
+    rows = [index[name] for name in data['Unnamed: 0'].astype(str)]
+    rdf_columns = data.filter(like='RDF').columns
+
+    print("\nEffect on predictions for {} structures found in {}:".format(len(data), descriptor_csv))
+    for target in ('wc', 'Sel'):
+        for path in sorted(glob('{}/{}/*_{}_model.pt'.format(model_dir, target, target))):
+            feature_set = os.path.basename(path)[:-len('_{}_model.pt'.format(target))]
+            if 'rdf' not in feature_set:
+                continue
+
+            features = []
+            for rdf in (rdf64, rdf32):
+                data.loc[:, rdf_columns] = rdf[rows]
+                features.append(get_features(feature_set, data, verbose=False).to_numpy(dtype=np.float64))
+            scaler = StandardScaler().fit(features[0])
+
+            predictor = Predictor(feature_set, target, 'cpu')
+            predictions = [predictor.predict(f, scaler) for f in features]
+            diff = np.abs(predictions[1] - predictions[0])
+            print("\t{} {}: max |dy| = {:.3e}, mean |dy| = {:.3e}, max |dy|/|y| = {:.3e}".format(
+                target, feature_set, diff.max(), diff.mean(),
+                np.max(diff / np.maximum(np.abs(predictions[0]), 1e-12))))
+
+
+if __name__ == "__main__":
+
+    start = datetime.now()
+    print("Start: ", start.strftime("%c"))
+    print("Comparing float64 and float32 AP-RDFs of the structures in {} (backend: {}, gauss_tol: {}), using {} cores..."
+          .format(src, cr.config.backend, cr.config.gauss_tol, n_cores))
+
+    with mp.Pool(n_cores, initializer=warm_up) as pool:
+        results = pool.map(compare, sorted(glob(f"{src}/*.cif")))
+    if not results:
+        sys.exit("No cifs found in {}".format(src))
+
+    names = [r[0] for r in results]
+    rdf64 = np.array([r[1] for r in results])
+    rdf32 = np.array([r[2] for r in results])
+    diff = np.abs(rdf32 - rdf64)
+    worst = np.unravel_index(np.argmax(diff), diff.shape)
+
+    print("\n{} structures, {} descriptors each".format(*rdf64.shape))
+    print("Time in float64: {:.2f} s, float32: {:.2f} s".format(sum(r[3] for r in results), sum(r[4] for r in results)))
+    print("Max |float32 - float64|: {:.3e} ({} in {})".format(diff.max(), cr.csv_header[worst[1] + 1], names[worst[0]]))
+    print("Mean |float32 - float64|: {:.3e}".format(diff.mean()))
+    print("Max |float32 - float64| / max |float64| per structure: {:.3e}".format(
+        np.max(diff.max(axis=1) / np.maximum(np.abs(rdf64).max(axis=1), 1e-12))))
+    n_bins = len(cr.config.bins)
+    for p, prop in enumerate(cr.config.prop_names):
+        block = slice(p * n_bins, (p + 1) * n_bins)
+        print("\t{}: max |dRDF| = {:.3e}".format(prop, diff[:, block].max()))
+
+    if descriptor_csv is not None:
+        prediction_report(names, rdf64, rdf32, descriptor_csv)
+
+    print("\nEnd: ", datetime.now().strftime("%c"))
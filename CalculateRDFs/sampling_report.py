@@ -0,0 +1,103 @@
+'''
+Accuracy report for the sampled (approximate) AP-RDF mode of calculate_rdfs.py.
+
+Computes the AP-RDFs of every cif in src exactly and from a stratified sample of about sample_pairs
+atom pairs (see co2mof/rdf_sampling.py), using the bins, properties and backend set in
+calculate_rdfs.py, and reports the time spent in each mode, the largest deviation over the dataset
+and how well the estimated standard errors describe the actual errors: about 95% of the values
+should be within 2 standard errors of the exact ones.
+
+If descriptor_csv is given, the effect on the predictions of every shipped wc/Sel model that uses
+AP-RDFs is reported as in precision_report.py.
+
+For instructions on using this code, please read the corresponding README.
+'''
+import os
+import sys
+import numpy as np
+import multiprocessing as mp
+from glob import glob
+from time import perf_counter
+from datetime import datetime
+
+import calculate_rdfs as cr
+from precision_report import prediction_report
+from co2mof import read_cif, compute_aprdf
+from co2mof.rdf_sampling import compute_aprdf_sampled
+
+########################### USER MUST DEFINE THESE ###########################
+
+# Where your cifs are located
+src = "OneDrive/Documents/RDFs/cifs"
+
+# Optional csv with the descriptors of (some of) the same structures, laid out as required by
+# load_pytorch.py, used to measure the effect on the model predictions. None skips this part.
+descriptor_csv = None
+
+# Sampling budget and early stopping, as in calculate_rdfs.py (its settings are used if set there)
+sample_pairs = cr.sample_pairs or 100000
+sample_rel_error = cr.sample_rel_error
+
+# Number of cores for calculations
+n_cores = 3
+
+###############################################################################
+
+
+def warm_up():
+    # Compile (or load) the kernels before anything is timed
+    compute_aprdf(10 * np.eye(3), np.array([[0.0, 0.0, 0.0], [0.1, 0.1, 0.1]]), np.array([6, 6]), cr.full_config)
+
+
+def compare(name):
+    structure = read_cif(name)
+
+    start = perf_counter()
+    exact = compute_aprdf(*structure, cr.full_config)
+    t_exact = perf_counter() - start
+
+    start = perf_counter()
+    sampled, stderr = compute_aprdf_sampled(*structure, cr.full_config, sample_pairs, sample_rel_error)
+    t_sampled = perf_counter() - start
+
+    return os.path.basename(name), exact, sampled, stderr, t_exact, t_sampled
+
+
+if __name__ == "__main__":
+
+    start = datetime.now()
+    print("Start: ", start.strftime("%c"))
+    print("Comparing exact and sampled AP-RDFs ({} pairs, rel_error {}) of the structures in {}, using {} cores..."
+          .format(sample_pairs, sample_rel_error, src, n_cores))
+
+    with mp.Pool(n_cores, initializer=warm_up) as pool:
+        results = pool.map(compare, sorted(glob(f"{src}/*.cif")))
+    if not results:
+        sys.exit("No cifs found in {}".format(src))
+
+    names = [r[0] for r in results]
+    exact = np.array([r[1] for r in results])
+    sampled = np.array([r[2] for r in results])
+    stderr = np.array([r[3] for r in results])
+    diff = np.abs(sampled - exact)
+    worst = np.unravel_index(np.argmax(diff), diff.shape)
+    estimated = stderr > 0
+
+    print("\n{} structures, {} descriptors each; {} sampled, the others computed exactly".format(
+        *exact.shape, int(estimated.any(axis=1).sum())))
+    print("Time exact: {:.2f} s, sampled: {:.2f} s".format(sum(r[4] for r in results), sum(r[5] for r in results)))
+    print("Max |sampled - exact|: {:.3e} ({} in {})".format(diff.max(), cr.csv_header[worst[1] + 1], names[worst[0]]))
+    print("Mean |sampled - exact|: {:.3e}".format(diff.mean()))
+    print("Max |sampled - exact| / max |exact| per structure: {:.3e}".format(
+        np.max(diff.max(axis=1) / np.maximum(np.abs(exact).max(axis=1), 1e-12))))
+    if estimated.any():
+        z = diff[estimated] / stderr[estimated]
+        print("Values within 1 / 2 / 3 standard errors: {:.1%} / {:.1%} / {:.1%} (normal: 68.3% / 95.4% / 99.7%)".format(
+            np.mean(z <= 1), np.mean(z <= 2), np.mean(z <= 3)))
+        print("RMS error / RMS standard error: {:.3f}".format(
+            np.sqrt(np.mean(diff[estimated] ** 2) / np.mean(stderr[estimated] ** 2))))
+
+    if descriptor_csv is not None:
+        prediction_report(names, exact, sampled, descriptor_csv)
+
+    print("\nEnd: ", datetime.now().strftime("%c"))
@@ -0,0 +1,36 @@
+"""
+Descriptors (AP-RDF, bag-of-atoms) and PyTorch models for low-pressure CO2 adsorption in MOFs.
+
+    from co2mof import read_cif, compute_aprdf, compute_boa, Predictor
+
+    cell, frac, species = read_cif("MOF.cif")
+    rdf = compute_aprdf(cell, frac, species)            # 339 AP-RDF values
+    boa = compute_boa(frac, species)                    # 432 bag-of-atoms values
+    wc = Predictor('geo+rdf', 'wc').predict(features)   # features: (n_mofs, 345) array
+
+The scripts in CalculateRDFs/, CalculateBOAs/ and load_pytorch.py are command line wrappers around
+this package. Importing it does not import torch; co2mof.predict and co2mof.model do.
+"""
+from .aprdf import RDFConfig, compute_aprdf, compute_aprdf_batch, default_bins, default_config
+from .boa import boa_columns, compute_boa, compute_boa_batch
+from .cif import cell_matrix, read_cif, read_cif_atoms
+from .element_table import to_species
+
+__all__ = [
+    "RDFConfig", "compute_aprdf", "compute_aprdf_batch", "default_bins", "default_config",
+    "boa_columns", "compute_boa", "compute_boa_batch",
+    "cell_matrix", "read_cif", "read_cif_atoms",
+    "to_species",
+    "Predictor", "get_features",
+]
+
+
+def __getattr__(name):
+    # Predictor and get_features pull in torch/sklearn/pandas, so they are only imported when used
+    if name == "Predictor":
+        from .predict import Predictor
+        return Predictor
+    if name == "get_features":
+        from .features import get_features
+        return get_features
+    raise AttributeError("module 'co2mof' has no attribute '{}'".format(name))
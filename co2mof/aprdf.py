@@ -0,0 +1,91 @@
+'''
+Atomic-property-weighted RDF (AP-RDF) descriptor.
+
+compute_aprdf returns the descriptor exactly as written by CalculateRDFs/calculate_rdfs.py: one
+block of n_bins values per property, normalised by factor / n_atoms and rounded to 12 decimals.
+The defaults of RDFConfig are the settings used for the shipped models (339 values per MOF).
+
+With symmetry=True, compute_aprdf first finds the symmetry operations of the structure (see
+symmetry.py) and sums only over the pairs of one atom per orbit, weighted by the orbit sizes. The
+result is the full pair sum up to rounding when the structure is symmetric to well within symprec.
+'''
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from .element_table import property_table, gather
+from .rdf_kernels import compute_apw_rdf, rdf_numpy_batch
+from .symmetry import asymmetric_unit
+
+
+def default_bins():
+    # 113 distance bins with linear increase in bin size from 2 to 30 A
+    bins = np.arange(113, dtype=np.float64)
+    bins[0] = 2.0
+    step = 0.004425
+
+    for i in range(1, 113):
+        bins[i] = bins[i-1] + step
+        step += 0.004425
+    return bins
+
+
+@dataclass
+class RDFConfig:
+    # Smooth parameter (B) and factor (f)
+    smooth: float = -10
+    factor: float = 0.001
+    bins: np.ndarray = field(default_factory=default_bins)
+    # Properties desired for the RDFs, from atomic_property_dict.py
+    prop_names: tuple = ("electronegativity", "hardness", "vdWaalsVolume")
+    # See rdf_kernels.py
+    backend: str = "auto"
+    gauss_tol: float = None
+    precision: str = "float64"
+    decimals: int = 12
+    # Sum over the asymmetric unit (numpy/numba backends); symprec is the matching tolerance in A
+    symmetry: bool = False
+    symprec: float = 1e-3
+
+    @property
+    def prop_table(self):
+        return property_table(self.prop_names)
+
+    @property
+    def columns(self):
+        return [f"RDF_{prop}_{r:.2f}" for prop in self.prop_names for r in self.bins]
+
+
+default_config = RDFConfig()
+
+
+def compute_aprdf(cell, frac, species, config=None):
+    # AP-RDF of one structure, shape (len(prop_names) * len(bins),)
+    config = config or default_config
+    n_atoms = len(species)
+    atom_props = gather(config.prop_table, species)
+
+    orbits = None
+    if config.symmetry:
+        order, starts, ends, sizes = asymmetric_unit(cell, frac, species, config.symprec)
+        if len(starts) < n_atoms:
+            frac, atom_props, orbits = frac[order], atom_props[order], (starts, ends, sizes)
+
+    apw_rdf = compute_apw_rdf(cell, frac, atom_props, config.bins, config.smooth, config.backend,
+                              config.gauss_tol, config.precision, orbits)
+    return np.round(apw_rdf.flatten() * config.factor / n_atoms, decimals=config.decimals)
+
+
+def compute_aprdf_batch(structures, config=None):
+    # compute_aprdf for a list of (cell, frac, species), all computed in one vectorised call.
+    # Meant for many small structures; returns (len(structures), len(prop_names) * len(bins)).
+    # config.symmetry is not used here: every pair is summed.
+    config = config or default_config
+    n_atoms = np.array([len(species) for _, _, species in structures])
+    apw_rdf = rdf_numpy_batch(
+        np.array([cell for cell, _, _ in structures]),
+        np.concatenate([frac for _, frac, _ in structures]),
+        gather(config.prop_table, np.concatenate([species for _, _, species in structures])),
+        n_atoms, config.bins, config.smooth, config.gauss_tol, config.precision)
+    return np.round(apw_rdf.reshape(len(structures), -1) * config.factor / n_atoms[:, None],
+                    decimals=config.decimals)
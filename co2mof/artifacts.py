@@ -0,0 +1,97 @@
+"""
+NumPy copies of the shipped models, for predictions without importing PyTorch.
+
+The models are plain stacks of Linear + ReLU layers (Net2/Net3, dropout is inactive at inference),
+so their forward pass is a few matrix products. The first time a model is used its weights are
+exported from the .pt file (this step needs torch) to an .npz file in cache_dir; after that it is
+loaded with NumPy alone. An artifact is re-exported whenever its .pt file changes.
+"""
+import os
+
+import numpy as np
+
+from .features import feature_sets
+
+# Directory holding the wc/ and Sel/ model folders (as co2mof.model.model_dir, which imports torch)
+model_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+# Where the exported models are kept; set CO2MOF_CACHE_DIR to use another directory
+cache_dir = os.environ.get("CO2MOF_CACHE_DIR", os.path.join(model_dir, ".model_cache"))
+
+
+class NumpyModel:
+    """Forward pass of a Net2/Net3 model in float32 NumPy: ReLU(W x + b) for every layer."""
+
+    def __init__(self, weights, biases):
+        self.weights = [np.ascontiguousarray(w.T, dtype=np.float32) for w in weights]
+        self.biases = [np.asarray(b, dtype=np.float32) for b in biases]
+
+    @property
+    def n_features(self):
+        return self.weights[0].shape[0]
+
+    def __call__(self, x):
+        x = np.asarray(x, dtype=np.float32)
+        for w, b in zip(self.weights, self.biases):
+            x = x @ w
+            x += b
+            np.maximum(x, 0, out=x)
+        return x
+
+
+def _source_stat(path):
+    stat = os.stat(path)
+    return np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+
+def artifact_path(feature_set, target):
+    return os.path.join(cache_dir, "{}_{}_model.npz".format(feature_set, target))
+
+
+def export_artifact(feature_set, target):
+    # Needs torch, to unpickle the .pt file
+    from .model import get_model, model_path
+
+    model = get_model(feature_set, target, 'cpu')
+    layers = [getattr(model, name) for name in ('hidden1', 'hidden2', 'hidden3') if hasattr(model, name)]
+    layers.append(model.output)
+
+    arrays = {"source_stat": _source_stat(model_path(feature_set, target))}
+    for k, layer in enumerate(layers):
+        arrays["weight{}".format(k)] = layer.weight.detach().numpy()
+        arrays["bias{}".format(k)] = layer.bias.detach().numpy()
+
+    os.makedirs(cache_dir, exist_ok=True)
+    path = artifact_path(feature_set, target)
+    # Write to a temporary file first, so concurrent workers never read a partial artifact
+    tmp = "{}.{}.tmp.npz".format(path[:-len(".npz")], os.getpid())
+    np.savez(tmp, **arrays)
+    os.replace(tmp, path)
+    return path
+
+
+_models = {}
+
+def load_artifact(feature_set, target):
+    # NumpyModel for a shipped model, exported first if the cache is missing or out of date
+    if feature_set not in feature_sets:
+        raise ValueError("Invalid Feature_Set defined: '{}', expected one of {}".format(feature_set, feature_sets))
+    source = "{}/{}/{}_{}_model.pt".format(model_dir, target, feature_set, target)
+    if not os.path.exists(source):
+        raise FileNotFoundError("No {} model for the '{}' feature set ({})".format(target, feature_set, source))
+    stat = _source_stat(source)
+
+    key = (feature_set, target)
+    if key in _models and np.array_equal(_models[key][0], stat):
+        return _models[key][1]
+
+    path = artifact_path(feature_set, target)
+    arrays = np.load(path) if os.path.exists(path) else None
+    if arrays is None or not np.array_equal(arrays["source_stat"], stat):
+        arrays = np.load(export_artifact(feature_set, target))
+
+    n_layers = sum(1 for name in arrays.files if name.startswith("weight"))
+    model = NumpyModel([arrays["weight{}".format(k)] for k in range(n_layers)],
+                       [arrays["bias{}".format(k)] for k in range(n_layers)])
+    _models[key] = (stat, model)
+    return model
@@ -7,6 +7,8 @@
 # - mass
 # - radii
 # - electron
+# - epsilon (UFF Lennard-Jones well depth, used by the bag-of-atoms descriptor)
+# - sigma (UFF Lennard-Jones diameter, used by the bag-of-atoms descriptor)
 
 apd = {
     "electronegativity": {
@@ -605,4 +607,56 @@ apd = {
         'Bi': 4.11568,
         'Po': 5.16,
     },
+    "epsilon": {
+        'O': 0.06,
+        'C': 0.105,
+        'Zn': 0.124,
+        'N': 0.069,
+        'H': 0.044,
+        'Fe': 0.013,
+        'Cl': 0.227,
+        'Cu': 0.005,
+        'S': 0.274,
+        'Co': 0.014,
+        'F': 0.05,
+        'Ni': 0.015,
+        'In': 0.599,
+        'I': 0.339,
+        'V': 0.016,
+        'Cd': 0.228,
+        'Br': 0.251,
+        'Cr': 0.015,
+        'Mn': 0.013,
+        'Zr': 0.069,
+        'P': 0.305,
+        'Ba': 0.364,
+        'Mg': 0.111,
+        'Al': 0.505,
+    },
+    "sigma": {
+        'O': 3.1181,
+        'C': 3.4309,
+        'Zn': 2.4616,
+        'N': 3.2607,
+        'H': 2.5711,
+        'Fe': 2.5943,
+        'Cl': 3.5164,
+        'Cu': 3.1137,
+        'S': 3.5948,
+        'Co': 2.5587,
+        'F': 2.997,
+        'Ni': 2.5248,
+        'In': 3.9761,
+        'I': 4.009,
+        'V': 2.801,
+        'Cd': 2.5373,
+        'Br': 3.732,
+        'Cr': 2.6932,
+        'Mn': 2.638,
+        'Zr': 2.7832,
+        'P': 3.6946,
+        'Ba': 3.299,
+        'Mg': 2.6914,
+        'Al': 4.0082,
+    },
 }
@@ -0,0 +1,72 @@
+'''
+Bag-of-atoms (BOA) descriptor.
+
+The unit cell is cut into 6 x 6 x 6 cuboids ("bags") along the fractional axes. For every bag the
+UFF epsilon and sigma of the atoms in it are summed and normalised by the number of framework atoms,
+giving 216 epsilon and 216 sigma values. compute_boa returns them in the column order of the
+descriptors.csv written by CalculateBOAs/gen-bag-of-atoms.py (boa_columns), unrounded.
+'''
+import numpy as np
+
+from .element_table import property_table, gather
+
+n_bags = 6
+
+# Bag edges, computed as i*(1/6) exactly as bag-of-atoms.py does
+bag_edges = np.arange(n_bags + 1) * (1 / n_bags)
+
+bag_names = ['bin {}{}{}'.format(i, n, m) for i in range(n_bags) for n in range(n_bags) for m in range(n_bags)]
+boa_columns = [name.format(i, n, m) for i in range(n_bags) for n in range(n_bags) for m in range(n_bags)
+               for name in ('epsilon bin {}{}{}', 'sigma bin {}{}{}')]
+
+
+def uff_table():
+    # UFF epsilon and sigma of every element, indexed by atomic number
+    return property_table(("epsilon", "sigma"))
+
+
+def bag_indices(frac):
+    # Flat bag index (36 * posx + 6 * posy + posz) of every atom, following bag-of-atoms.py:
+    # x and y fall in [i/6, (i+1)/6), z in [i/6, (i+1)/6]. A z exactly on an inner edge k/6 goes to
+    # bag k if the atom's x or y bag index is at least k (the original search loop was still
+    # running) and to bag k - 1 otherwise.
+    frac = np.asarray(frac, dtype=float).reshape(-1, 3)
+    x, y, z = frac.T
+    if ((frac < 0).any() or (x >= 1).any() or (y >= 1).any() or (z > 1).any()):
+        raise ValueError("Fractional coordinates must be in [0, 1) (z in [0, 1]) for the bag-of-atoms descriptor")
+
+    posx = np.searchsorted(bag_edges, x, side='right') - 1
+    posy = np.searchsorted(bag_edges, y, side='right') - 1
+    posz = np.maximum(np.searchsorted(bag_edges, z, side='left') - 1, 0)
+    on_edge = (z == bag_edges[posz + 1]) & (posz + 1 < n_bags)
+    posz = np.where(on_edge & (np.maximum(posx, posy) > posz), posz + 1, posz)
+
+    return (posx * n_bags + posy) * n_bags + posz
+
+
+def bag_descriptor(species, bags, n_atoms):
+    # Sum of the epsilon and sigma of the atoms in each bag, normalised by the number of framework
+    # atoms (empty bags are 0), interleaved as in boa_columns
+    uff = gather(uff_table(), np.asarray(species, dtype=np.intp))
+    bags = np.asarray(bags, dtype=np.intp)
+    epsilons = np.bincount(bags, weights=uff[:, 0], minlength=n_bags ** 3) / n_atoms
+    sigmas = np.bincount(bags, weights=uff[:, 1], minlength=n_bags ** 3) / n_atoms
+    return np.stack([epsilons, sigmas], axis=1).ravel()
+
+
+def compute_boa(frac, species):
+    # Bag-of-atoms descriptor of one structure, shape (432,)
+    return bag_descriptor(species, bag_indices(frac), len(species))
+
+
+def compute_boa_batch(structures):
+    # compute_boa for a list of (cell, frac, species) (the cell is not used), all in one bincount;
+    # returns (len(structures), 432)
+    n_structures = len(structures)
+    n_atoms = np.array([len(species) for _, _, species in structures])
+    bags = bag_indices(np.concatenate([np.reshape(frac, (-1, 3)) for _, frac, _ in structures]))
+    bags += np.repeat(np.arange(n_structures) * n_bags ** 3, n_atoms)
+    uff = gather(uff_table(), np.concatenate([np.asarray(species, dtype=np.intp) for _, _, species in structures]))
+    sums = [np.bincount(bags, weights=uff[:, k], minlength=n_structures * n_bags ** 3).reshape(n_structures, -1)
+            for k in range(2)]
+    return (np.stack(sums, axis=2) / n_atoms[:, None, None]).reshape(n_structures, -1)
@@ -0,0 +1,92 @@
+'''
+Reading structures from cif files.
+
+A structure is handled as (cell, frac, species): the 3 x 3 fractional-to-Cartesian matrix of the
+unit cell, the (n_atoms, 3) fractional coordinates and the atomic number of every atom.
+'''
+import io
+import math
+
+import numpy as np
+
+from .element_table import to_species
+
+
+def cell_matrix(la, lb, lc, alpha, beta, gamma, volume=None):
+    # Fractional-to-Cartesian matrix from the cell lengths and angles (in degrees).
+    # If volume is missing from the .cif, calculate it.
+    aa, ab, ag = np.deg2rad(alpha), np.deg2rad(beta), np.deg2rad(gamma)
+    if volume is None:
+        volume = la * lb * lc * math.sqrt(1 - (math.cos(aa)) ** 2 -
+                (math.cos(ab)) ** 2 - (math.cos(ag)) ** 2 +
+                (2 * math.cos(aa) * math.cos(ab) * math.cos(ag)))
+
+    frac2cart = np.zeros([3, 3], dtype=float)
+    frac2cart[0, 0] = la
+    frac2cart[0, 1] = lb * np.cos(ag)
+    frac2cart[0, 2] = lc * np.cos(ab)
+    frac2cart[1, 1] = lb * np.sin(ag)
+    frac2cart[1, 2] = lc * (np.cos(aa) - np.cos(ab)*np.cos(ag)) / np.sin(ag)
+    frac2cart[2, 2] = volume / (la * lb * np.sin(ag))
+    return frac2cart
+
+
+def read_cif(name, data=None):
+    # Needs PyCifRW (pip install PyCifRW). data: the contents of the file (bytes or str) if already
+    # read, e.g. from an archive by ingest.CifPrefetcher; name is then not opened.
+    from CifFile import ReadCif
+
+    if data is not None:
+        mof = ReadCif(io.StringIO(data.decode() if isinstance(data, bytes) else data))
+    else:
+        mof = ReadCif(name)
+    mof = mof[mof.visible_keys[0]]
+
+    species = to_species(mof["_atom_site_type_symbol"])
+    try:
+        volume = float(mof["_cell_volume"])
+    except KeyError:
+        volume = None
+    cell = cell_matrix(float(mof["_cell_length_a"]), float(mof["_cell_length_b"]), float(mof["_cell_length_c"]),
+                       float(mof["_cell_angle_alpha"]), float(mof["_cell_angle_beta"]),
+                       float(mof["_cell_angle_gamma"]), volume)
+
+    frac = np.array([
+        mof["_atom_site_fract_x"],
+        mof["_atom_site_fract_y"],
+        mof["_atom_site_fract_z"],
+    ], dtype=float).T
+
+    return cell, frac, species
+
+
+def read_cif_atoms(name):
+    # Line-by-line reader used for the bag-of-atoms descriptor. It expects the layout of the
+    # CoRE/hypothetical MOF cifs: a 'data_<name>' first line and an atom site loop ending with
+    # _atom_type_partial_charge, whose rows are 'label type_symbol description x y z charge'.
+    # Returns the MOF name (as written after 'data_', including the line break), the element
+    # symbols and the fractional coordinates.
+    keyword_start = '_atom_type_partial_charge'
+    keyword_end = 'loop_'
+    symbols, frac = [], []
+    with open(name, 'r') as cif_file:
+        line = cif_file.readline().split('data_')
+        MOF_name = line[1]
+
+        while keyword_start not in line:
+            line = cif_file.readline()
+            if not line:
+                raise ValueError("{} has no {} loop".format(name, keyword_start))
+
+        while keyword_end not in line:
+            line = cif_file.readline()
+            if not line:
+                break
+            line = line.split()
+            # Skip the blank line before the end keyword appears
+            if len(line) < 6 or keyword_end in line:
+                continue
+            symbols.append(line[1])
+            frac.append([float(line[3]), float(line[4]), float(line[5])])
+
+    return MOF_name, symbols, np.array(frac, dtype=float).reshape(-1, 3)
@@ -0,0 +1,126 @@
+'''
+Multi-threaded, schema-pinned reading of descriptor csv files with pyarrow.
+
+pandas.read_csv parses on one thread and infers the type of every one of the ~800 columns of a
+descriptor csv from its values. iter_descriptor_csv uses the pyarrow CSV reader instead, which
+parses blocks of the file on several threads, converts only the columns of the feature set and
+gives each column a fixed type from its group in the README layout (column_types): float32 for the
+bag-of-atoms, AP-RDF and geometric descriptors, uint8 for the chemical motifs and string for the
+MOF names. The header is checked first against the order the README requires (validate_columns).
+
+pyarrow is optional (pip install pyarrow); features.iter_features and the readers built on it
+(read_features_into, screening.screen_csv) use this module with csv_engine="arrow".
+'''
+from importlib.util import find_spec
+
+import numpy as np
+
+from .features import feature_columns, geom_features, read_header
+
+has_pyarrow = find_spec("pyarrow") is not None
+
+# Column groups in the order they must appear in the csv
+column_groups = ('names', 'motifs', 'bag-of-atoms', 'AP-RDFs', 'geometric')
+
+
+def column_group(name):
+    # Group of a csv column (as feature_columns matches them), or None for the other columns (targets, labels)
+    if name == 'Unnamed: 0':
+        return 'names'
+    if 'motif' in name:
+        return 'motifs'
+    if 'epsilon' in name or 'sigma' in name:
+        return 'bag-of-atoms'
+    if 'RDF' in name:
+        return 'AP-RDFs'
+    if name in geom_features:
+        return 'geometric'
+    return None
+
+
+def validate_columns(columns):
+    # Raises a ValueError unless the names, motifs, bag-of-atoms, AP-RDFs and geometric descriptors
+    # come in that order (any of them may be missing; other columns can be anywhere)
+    last = 0
+    for name in columns:
+        group = column_group(name)
+        if group is None:
+            continue
+        rank = column_groups.index(group)
+        if rank < last:
+            raise ValueError("Column '{}' ({}) comes after the {} columns; the csv must have the {} in that order"
+                             .format(name, group, column_groups[last], ", ".join(column_groups)))
+        last = rank
+
+
+def unique_names(columns):
+    # Duplicate column names numbered as pandas.read_csv does ('name', 'name.1', ...)
+    seen, names = {}, []
+    for name in columns:
+        count = seen.get(name, 0)
+        seen[name] = count + 1
+        names.append(name if count == 0 else '{}.{}'.format(name, count))
+    return names
+
+
+def column_types(columns):
+    # pyarrow type of every column of a known group
+    import pyarrow as pa
+
+    types = {'names': pa.string(), 'motifs': pa.uint8(), 'bag-of-atoms': pa.float32(), 'AP-RDFs': pa.float32(),
+             'geometric': pa.float32()}
+    return {name: types[column_group(name)] for name in columns if column_group(name) is not None}
+
+
+def has_quotes(descriptor_csv):
+    # Whether the file has quoted fields, which may span lines (e.g. the MOF names of descriptors.csv
+    # end with the line break of the cif's data_ line); pyarrow then has to look for line breaks in
+    # values, which makes it parse less in parallel
+    with open(descriptor_csv, 'rb') as f:
+        return any(b'"' in block for block in iter(lambda: f.read(1 << 20), b''))
+
+
+def iter_descriptor_csv(feature_set, descriptor_csv, chunk_size=100000, dtype=np.float32, block_size=1 << 22):
+    # As features.iter_features: yields the MOF names (or row numbers) and an (n_rows, n_features)
+    # array of dtype for every chunk_size rows of the csv, parsed by pyarrow in blocks of block_size bytes
+    if not has_pyarrow:
+        raise ImportError("The arrow csv engine requires pyarrow (pip install pyarrow)")
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+
+    header = read_header(descriptor_csv)
+    validate_columns(header)
+    columns = unique_names(header)
+    selected = [columns[k] for k in feature_columns(feature_set, columns)]
+    has_names = 'Unnamed: 0' in columns
+    included = (['Unnamed: 0'] if has_names else []) + selected
+    reader = pa_csv.open_csv(
+        descriptor_csv,
+        read_options=pa_csv.ReadOptions(column_names=columns, skip_rows=1, block_size=block_size, use_threads=True),
+        parse_options=pa_csv.ParseOptions(newlines_in_values=has_quotes(descriptor_csv)),
+        convert_options=pa_csv.ConvertOptions(include_columns=included, column_types=column_types(included)))
+
+    n_rows = 0
+
+    def chunk(table):
+        nonlocal n_rows
+        features = np.empty((table.num_rows, len(selected)), dtype=dtype)
+        for j, name in enumerate(selected):
+            features[:, j] = table.column(name).to_numpy()
+        if has_names:
+            names = table.column('Unnamed: 0').to_numpy()
+        else:
+            names = np.arange(n_rows, n_rows + table.num_rows)
+        n_rows += table.num_rows
+        return names, features
+
+    pending = None
+    for batch in reader:
+        table = pa.Table.from_batches([batch])
+        pending = table if pending is None else pa.concat_tables([pending, table])
+        while pending.num_rows >= chunk_size:
+            yield chunk(pending.slice(0, chunk_size))
+            pending = pending.slice(chunk_size)
+    if pending is not None and pending.num_rows:
+        yield chunk(pending)
+
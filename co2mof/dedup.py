@@ -0,0 +1,41 @@
+'''
+Fingerprints for finding duplicate structures before computing their descriptors.
+
+Two structures get the same fingerprint when they have the same composition, the same cell and the
+same atoms at the same fractional coordinates (to `decimals` places), in any order. Both the AP-RDF
+and the bag-of-atoms are sums over atoms (pairs), so such duplicates have the same descriptors,
+and those need only be computed once per fingerprint. Copies related by other symmetry operations
+(e.g. an origin shift) are not merged, since the bag-of-atoms, which depends on where the atoms
+sit in the cell, is not invariant under them.
+'''
+import hashlib
+
+import numpy as np
+
+
+def structure_fingerprint(cell, frac, species, decimals=6):
+    # Hex digest of the composition, cell matrix and sorted (species, x, y, z) rows of a structure.
+    # cell may be None for descriptors that do not depend on it (bag-of-atoms).
+    species = np.asarray(species, dtype=np.int64)
+    h = hashlib.blake2b(digest_size=16)
+
+    # Composition first, then the cell, then the atoms; + 0.0 turns -0.0 into 0.0
+    elements, counts = np.unique(species, return_counts=True)
+    h.update(np.stack([elements, counts]).tobytes())
+    if cell is not None:
+        h.update((np.round(np.asarray(cell, dtype=np.float64), decimals) + 0.0).tobytes())
+
+    rows = np.column_stack([species.astype(np.float64),
+                            np.round(np.asarray(frac, dtype=np.float64).reshape(-1, 3), decimals) + 0.0])
+    rows = rows[np.lexsort(rows.T[::-1])]
+    h.update(rows.tobytes())
+    return h.hexdigest()
+
+
+def group_duplicates(names, fingerprints):
+    # {representative name: [names of all its copies, representative first]}, in the order the
+    # representatives first appear
+    groups = {}
+    for name, fingerprint in zip(names, fingerprints):
+        groups.setdefault(fingerprint, []).append(name)
+    return {aliases[0]: aliases for aliases in groups.values()}
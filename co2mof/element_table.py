@@ -0,0 +1,80 @@
+'''
+Element-indexed view of the atomic property dictionary (atomic_property_dict.apd).
+
+Structures are handled as integer species arrays (atomic numbers) instead of lists of element
+symbols, and every property is a NumPy array indexed by atomic number, so looking up the
+properties of all the atoms of a structure is a single gather:
+
+    species = to_species(["Zn", "O", "C"])            # array([30, 8, 6])
+    table = property_table(["electronegativity", "hardness"])
+    atom_props = table[species]                       # (n_atoms, 2)
+
+Property arrays are built on first use and cached. Elements missing from a property are NaN in
+its array; gather() raises a KeyError for them, as the dictionary lookups did.
+'''
+from functools import lru_cache
+
+import numpy as np
+
+from .atomic_property_dict import apd
+
+symbols = (
+    "X", "H", "He", "Li", "Be", "B", "C", "N", "O", "F", "Ne",
+    "Na", "Mg", "Al", "Si", "P", "S", "Cl", "Ar", "K", "Ca",
+    "Sc", "Ti", "V", "Cr", "Mn", "Fe", "Co", "Ni", "Cu", "Zn",
+    "Ga", "Ge", "As", "Se", "Br", "Kr", "Rb", "Sr", "Y", "Zr",
+    "Nb", "Mo", "Tc", "Ru", "Rh", "Pd", "Ag", "Cd", "In", "Sn",
+    "Sb", "Te", "I", "Xe", "Cs", "Ba", "La", "Ce", "Pr", "Nd",
+    "Pm", "Sm", "Eu", "Gd", "Tb", "Dy", "Ho", "Er", "Tm", "Yb",
+    "Lu", "Hf", "Ta", "W", "Re", "Os", "Ir", "Pt", "Au", "Hg",
+    "Tl", "Pb", "Bi", "Po", "At", "Rn", "Fr", "Ra", "Ac", "Th",
+    "Pa", "U", "Np", "Pu", "Am", "Cm", "Bk", "Cf", "Es", "Fm",
+    "Md", "No", "Lr", "Rf", "Db", "Sg", "Bh", "Hs", "Mt", "Ds",
+    "Rg", "Cn", "Nh", "Fl", "Mc", "Lv", "Ts", "Og",
+)
+n_elements = len(symbols)
+
+atomic_numbers = {symbol: z for z, symbol in enumerate(symbols)}
+# Temporary IUPAC names still used as keys in apd
+atomic_numbers.update({"Uut": 113, "Uuq": 114, "Uup": 115, "Uuh": 116, "Uus": 117, "Uuo": 118})
+
+property_names = tuple(apd)
+
+
+def to_species(elements):
+    # Atomic number of each element symbol; the symbol lookup is done once per distinct element
+    unique, inverse = np.unique(np.asarray(elements, dtype=str), return_inverse=True)
+    try:
+        return np.array([atomic_numbers[e] for e in unique], dtype=np.intp)[inverse.ravel()]
+    except KeyError as e:
+        raise KeyError("Unknown element symbol '{}'".format(e.args[0])) from None
+
+
+@lru_cache(maxsize=None)
+def property_array(name):
+    array = np.full(n_elements, np.nan)
+    for symbol, value in apd[name].items():
+        array[atomic_numbers[symbol]] = value
+    array.setflags(write=False)
+    return array
+
+
+@lru_cache(maxsize=None)
+def _property_table(names):
+    table = np.stack([property_array(name) for name in names], axis=1)
+    table.setflags(write=False)
+    return table
+
+
+def property_table(names):
+    # (n_elements, len(names)) array with one column per selected property
+    return _property_table(tuple(names))
+
+
+def gather(table, species):
+    values = table[species]
+    if np.isnan(values).any():
+        bad = np.unique(np.asarray(species)[np.isnan(values).reshape(len(values), -1).any(axis=1)])
+        raise KeyError("No value for element(s) {} in the selected properties".format(
+            ", ".join(symbols[z] for z in bad)))
+    return values
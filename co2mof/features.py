@@ -0,0 +1,262 @@
+"""
+Selection of the descriptor columns each model expects, from a dataframe laid out like the csv
+described in the README (motifs, bag-of-atoms, AP-RDFs, then the six geometric descriptors).
+The readers below also take a compact .npz descriptor file (sparse.SparseDescriptors) in place of
+the csv, densifying the feature columns chunk by chunk.
+"""
+import csv
+
+import numpy as np
+
+feature_sets = ('geo', 'rdf', 'mot', 'boa', 'rdf+boa', 'geo+rdf', 'geo+mot', 'geo+boa', 'geo+mot+boa',
+                'geo+rdf+boa', 'geo+mot+rdf')
+
+geom_features = ["CO2_Surf_m2/g", "CO2_VFrac", "Pore_1", "CO2_Surf_m2/cm3", "dense", "Pore_3"]
+
+# Motif columns of the csv that no model uses
+dropped_motifs = ['motif_furan', 'motif_pyrrole', 'motif_thiophene', 'motif_PO3']
+
+descriptions = {
+    'geo': "Geometric",
+    'geo+rdf+boa': "Geometric + APW-RDF + Bag of Atoms",
+    'rdf+boa': "Bag of Atoms + APW-RDF",
+    'geo+boa': "Bag of Atoms + Geometric",
+    'boa': "Bag of Atoms",
+    'rdf': "APW-RDF",
+    'geo+rdf': "Geometric + APW-RDF",
+    'mot': "Chemical Motifs",
+    'geo+mot': "Chemical Motifs + Geometric",
+    'geo+mot+boa': "Chemical Motifs + Geometric + Bag of Atoms",
+    'geo+mot+rdf': "Chemical Motifs + Geometric + APW-RDF",
+}
+
+def feature_columns(feature_set, columns):
+    # Positions, in columns (the csv header as pandas names it), of the features of feature_set
+    # in the order the models expect them. Missing columns raise a KeyError, as in pandas.
+    columns = [str(name) for name in columns]
+    position = {name: k for k, name in enumerate(columns)}
+
+    def positions(names):
+        missing = [name for name in names if name not in position]
+        if missing:
+            raise KeyError("{} not in the descriptor columns".format(missing))
+        return [position[name] for name in names]
+
+    dropped = set(positions(dropped_motifs))
+    kept = [k for k in range(len(columns)) if k not in dropped]
+
+    def like(text):
+        return [k for k in kept if text in columns[k]]
+
+    # Geometric
+    if feature_set == 'geo':
+        return positions(geom_features)
+
+    # Bag of Atoms + Geometric + APW-RDF
+    elif feature_set == 'geo+rdf+boa':
+        excluded = set(positions(['wc', 'Unnamed: 0', 'Sel', 'label']) + like('motif'))
+        return [k for k in kept if k not in excluded]
+
+    # Bag of Atoms + APW-RDF
+    elif feature_set == 'rdf+boa':
+        excluded = set(positions(['wc', 'Unnamed: 0', 'Sel', 'label'] + geom_features) + like('motif'))
+        return [k for k in kept if k not in excluded]
+
+    # Bag of Atoms + Geometric
+    elif feature_set == 'geo+boa':
+        return like('epsilon') + like('sigma') + positions(geom_features)
+
+    # Bag of Atoms only
+    elif feature_set == 'boa':
+        return like('epsilon') + like('sigma')
+
+    # APW-RDF only
+    elif feature_set == 'rdf':
+        return like('RDF')
+
+    # APW-RDF + Geometric
+    elif feature_set == 'geo+rdf':
+        return like('RDF') + positions(geom_features)
+
+    # Chemical Motifs only
+    elif feature_set == 'mot':
+        return like('motif')
+
+    # Chemical Motifs + Geometric
+    elif feature_set == 'geo+mot':
+        return like('motif') + positions(geom_features)
+
+    # Chemical Motifs + Geometric + Bag of Atoms
+    elif feature_set == 'geo+mot+boa':
+        return like('motif') + positions(geom_features) + like('sigma') + like('epsilon')
+
+    # Chemical Motifs + Geometric + RDF
+    elif feature_set == 'geo+mot+rdf':
+        return like('motif') + positions(geom_features) + like('RDF')
+
+    # No valid feature set
+    else:
+        raise ValueError("Invalid Feature_Set defined: '{}', expected one of {}".format(feature_set, feature_sets))
+
+def print_description(feature_set, n_features):
+    print("\n\tFeature/Descriptor set:  {} {} features".format(descriptions[feature_set], n_features))
+
+def get_features(feature_set, data, verbose=True):
+    # The feature columns of a dataframe read from the descriptor csv
+    Features = data.iloc[:, feature_columns(feature_set, data.columns)]
+    if verbose:
+        print_description(feature_set, Features.shape[1])
+    return Features
+
+def assemble_features(feature_set, boa=None, rdf=None, geometric=None, rdf_columns=None):
+    # Model inputs of feature_set from descriptor arrays instead of a csv: boa (n_mofs, 432) as
+    # compute_boa, rdf (n_mofs, n) as compute_aprdf (columns named rdf_columns, by default those of the
+    # default RDFConfig) and geometric (n_mofs, 6) in the order of geom_features. The arrays are laid
+    # out as the csv rows would be and the columns selected with feature_columns. Chemical motifs
+    # cannot be given, so the 'mot' feature sets are not available.
+    from .aprdf import default_config
+    from .boa import boa_columns
+
+    parts = feature_set.split('+')
+    if 'mot' in parts:
+        raise ValueError("Chemical motifs are not computed by this package; '{}' is not available".format(feature_set))
+    blocks = {'boa': boa, 'rdf': rdf, 'geo': geometric}
+    block_names = {'boa': "bag-of-atoms", 'rdf': "AP-RDFs", 'geo': "geometric descriptors"}
+    for part in parts:
+        if blocks.get(part, 0) is None:
+            raise ValueError("The {} features need the {}".format(feature_set, block_names[part]))
+    given = [block for block in blocks.values() if block is not None]
+    if not given:
+        raise ValueError("No descriptors given")
+
+    rdf_columns = list(rdf_columns or default_config.columns)
+    widths = {'boa': len(boa_columns), 'rdf': len(rdf_columns), 'geo': len(geom_features)}
+    n_mofs = len(np.atleast_2d(given[0]))
+
+    def block(part):
+        if blocks[part] is None:
+            return np.full((n_mofs, widths[part]), np.nan)
+        return np.asarray(blocks[part], dtype=np.float64).reshape(n_mofs, widths[part])
+
+    columns = ['Unnamed: 0'] + dropped_motifs + boa_columns + rdf_columns + geom_features + ['wc', 'Sel', 'label']
+    rows = np.concatenate([np.full((n_mofs, 1 + len(dropped_motifs)), np.nan), block('boa'), block('rdf'),
+                           block('geo'), np.full((n_mofs, 3), np.nan)], axis=1)
+    return rows[:, feature_columns(feature_set, columns)]
+
+def is_sparse(descriptor_csv):
+    # Whether the descriptors are in a SparseDescriptors .npz file rather than a csv
+    return str(descriptor_csv).endswith('.npz')
+
+def read_header(descriptor_csv):
+    # Column names of the csv, with unnamed columns named as pandas.read_csv does ('Unnamed: <k>')
+    if is_sparse(descriptor_csv):
+        from .sparse import SparseDescriptors
+        return SparseDescriptors.load_columns(descriptor_csv)
+    with open(descriptor_csv, newline='') as f:
+        header = next(csv.reader(f))
+    return [name or 'Unnamed: {}'.format(k) for k, name in enumerate(header)]
+
+def read_features(feature_set, descriptor_csv, verbose=True):
+    # get_features straight from the csv with the csv module and NumPy, without pandas. Meant for
+    # small files, where importing pandas takes longer than reading them; returns the MOF names
+    # (the 'Unnamed: 0' column, or None if there is none) and a float64 (n_mofs, n_features) array.
+    if is_sparse(descriptor_csv):
+        from .sparse import SparseDescriptors
+        descriptors = SparseDescriptors.load(descriptor_csv)
+        Features = descriptors.dense(positions=feature_columns(feature_set, descriptors.columns))
+        if verbose:
+            print_description(feature_set, Features.shape[1])
+        return (None if descriptors.names is None else list(descriptors.names)), Features
+
+    columns = read_header(descriptor_csv)
+    selected = feature_columns(feature_set, columns)
+    name_column = columns.index('Unnamed: 0') if 'Unnamed: 0' in columns else None
+
+    names, rows = [], []
+    with open(descriptor_csv, newline='') as f:
+        reader = csv.reader(f)
+        next(reader)
+        for row in reader:
+            if not row:
+                continue
+            if name_column is not None:
+                names.append(row[name_column])
+            rows.append([row[k] or 'nan' for k in selected])
+
+    Features = np.array(rows, dtype=np.float64).reshape(len(rows), len(selected))
+    if verbose:
+        print_description(feature_set, Features.shape[1])
+    return (names if name_column is not None else None), Features
+
+def count_rows(descriptor_csv):
+    # Number of lines after the header: the number of MOFs, or more if some quoted names span lines
+    if is_sparse(descriptor_csv):
+        with np.load(descriptor_csv) as f:
+            return len(f['indptr']) - 1
+    n_lines, last = 0, b'\n'
+    with open(descriptor_csv, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            n_lines += block.count(b'\n')
+            last = block[-1:]
+    return max(n_lines + (last != b'\n') - 1, 0)
+
+def iter_features(feature_set, descriptor_csv, chunk_size=100000, dtype=np.float64, csv_engine="pandas"):
+    # get_features over the csv in blocks of chunk_size rows, so that memory does not grow with the
+    # size of the file. Yields the MOF names of each block (the 'Unnamed: 0' column, or the row
+    # numbers if there is none) and an (n_rows, n_features) array of dtype. A SparseDescriptors
+    # file is loaded whole (it is small) and each block densified from it. csv_engine="arrow"
+    # parses the csv with pyarrow (csv_reader.iter_descriptor_csv).
+    if is_sparse(descriptor_csv):
+        from .sparse import SparseDescriptors
+        descriptors = SparseDescriptors.load(descriptor_csv)
+        selected = feature_columns(feature_set, descriptors.columns)
+        for start in range(0, len(descriptors), chunk_size):
+            stop = min(start + chunk_size, len(descriptors))
+            names = np.arange(start, stop) if descriptors.names is None else descriptors.names[start:stop]
+            yield names, descriptors.dense(start, stop, selected, dtype)
+        return
+    if csv_engine == "arrow":
+        from .csv_reader import iter_descriptor_csv
+        yield from iter_descriptor_csv(feature_set, descriptor_csv, chunk_size, dtype)
+        return
+
+    import pandas as pd
+
+    selected = None
+    for data in pd.read_csv(descriptor_csv, chunksize=chunk_size):
+        if selected is None:
+            selected = feature_columns(feature_set, data.columns)
+        names = data['Unnamed: 0'].to_numpy() if 'Unnamed: 0' in data else data.index.to_numpy()
+        yield names, data.iloc[:, selected].to_numpy(dtype=dtype)
+
+def read_features_into(feature_set, descriptor_csv, chunk_size=100000, dtype=np.float32, fit=False,
+                       csv_engine="pandas"):
+    # The features of the whole csv in one C-contiguous array of dtype, allocated once (from
+    # count_rows) and filled chunk by chunk, so no full-size float64 copy or DataFrame is ever made.
+    # Returns the MOF names, the array and, with fit=True, the ScalerStats fitted (in float64) on
+    # the chunks as they are read; otherwise None.
+    from .predict import ScalerStats
+
+    n_max = count_rows(descriptor_csv)
+    features, names, n_rows = None, [], 0
+
+    def chunks():
+        nonlocal features, n_rows
+        for chunk_names, chunk in iter_features(feature_set, descriptor_csv, chunk_size, csv_engine=csv_engine):
+            if features is None:
+                features = np.empty((n_max, chunk.shape[1]), dtype=dtype)
+            features[n_rows:n_rows + len(chunk)] = chunk
+            n_rows += len(chunk)
+            names.extend(chunk_names)
+            yield chunk
+
+    if fit:
+        scaler = ScalerStats.fit_chunks(chunks())
+    else:
+        scaler = None
+        for _ in chunks():
+            pass
+    columns = read_header(descriptor_csv)
+    if features is None:
+        features = np.empty((0, len(feature_columns(feature_set, columns))), dtype=dtype)
+    return (names if 'Unnamed: 0' in columns else None), features[:n_rows], scaler
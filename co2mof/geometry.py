@@ -0,0 +1,126 @@
+'''
+Geometric descriptors of a structure, estimated from the same periodic images as the AP-RDF.
+
+The 'geo' feature sets use six geometric descriptors (features.geom_features) that come from an
+external tool (Zeo++). geometric_descriptors estimates five of them from the structure itself:
+
+    dense             density (g/cm3), exact: the atomic masses over the cell volume
+    Pore_1            largest included sphere diameter (A)
+    CO2_VFrac         fraction of the cell the centre of a CO2 probe can reach
+    CO2_Surf_m2/cm3   CO2-accessible surface area per volume
+    CO2_Surf_m2/g     CO2-accessible surface area per mass
+
+The atoms are spheres of their UFF radius (the 'radii' property) and the probe a sphere of
+probe_radius. DistanceGrid keeps one k-d tree per element over the 27 periodic images of the atoms
+(rdf_kernels.super_cell, the images the AP-RDF sums over) and the distance from every point of a
+regular grid of about `spacing` A to the nearest atom surface: Pore_1 is twice the largest of these
+distances (refined off the grid by a local search) and CO2_VFrac the fraction of points at least
+probe_radius from every surface. The surface area is sampled, as in Zeo++, at points spread over the
+probe-inflated atom spheres, found free or buried with the same trees.
+
+These are estimates: pockets the probe cannot reach from the channels are not excluded, the grid
+limits the resolution of CO2_VFrac, and Pore_3 is not estimated. Check them against the values of
+your usual tool on a few structures before mixing the two. Needs scipy.
+'''
+import numpy as np
+
+from .element_table import gather, property_table
+from .rdf_kernels import super_cell
+
+# Columns of the estimated descriptors, in the order of features.geom_features
+geometric_columns = ("CO2_Surf_m2/g", "CO2_VFrac", "Pore_1", "CO2_Surf_m2/cm3", "dense")
+
+# Radius (A) of the CO2 probe (kinetic diameter 3.3 A)
+co2_probe_radius = 1.65
+
+avogadro = 6.02214076e23
+
+
+def cell_volume(cell):
+    return float(abs(np.linalg.det(cell)))
+
+
+def density(cell, species):
+    # g/cm3: g/mol over A^3, times 1e24 A^3/cm3 over Avogadro's number
+    mass = float(gather(property_table(("mass",)), np.asarray(species, dtype=np.intp)).sum())
+    return mass / cell_volume(cell) * 1e24 / avogadro
+
+
+class DistanceGrid:
+    """
+    Distances from the points of a grid of about spacing A in the cell to the nearest atom surface
+    (negative inside an atom), and the per-element trees to find them for any other points.
+    """
+
+    def __init__(self, cell, frac, species, spacing=0.5):
+        from scipy.spatial import cKDTree
+
+        self.cell = np.asarray(cell, dtype=np.float64)
+        frac = np.mod(np.asarray(frac, dtype=np.float64).reshape(-1, 3), 1.0)
+        self.radii = gather(property_table(("radii",)), np.asarray(species, dtype=np.intp))[:, 0]
+        self.cart = frac @ self.cell.T
+        images = (super_cell[:, None, :] + frac[None, :, :]) @ self.cell.T
+        self.trees = [(radius, cKDTree(images[:, self.radii == radius].reshape(-1, 3)))
+                      for radius in np.unique(self.radii)]
+
+        self.shape = tuple(int(n) for n in np.maximum(np.ceil(np.linalg.norm(self.cell, axis=0) / spacing), 1))
+        axes = [(np.arange(n) + 0.5) / n for n in self.shape]
+        self.points = np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1).reshape(-1, 3) @ self.cell.T
+        self.distances = self.surface_distance(self.points).reshape(self.shape)
+        self.spacing = spacing
+
+    def surface_distance(self, points):
+        # Distance from each of points (Cartesian, in the cell) to the nearest atom surface
+        distance = np.full(len(points), np.inf)
+        for radius, tree in self.trees:
+            np.minimum(distance, tree.query(points)[0] - radius, out=distance)
+        return distance
+
+    def largest_included_sphere(self, n_starts=8):
+        # Diameter (A) of the largest sphere that overlaps no atom: the n_starts best grid points,
+        # each moved by a pattern search with steps halving from spacing / 2 to spacing / 64
+        best = np.argsort(self.distances.ravel())[-n_starts:]
+        centres, values = self.points[best], self.distances.ravel()[best]
+        moves = np.concatenate([np.eye(3), -np.eye(3)])
+        step = self.spacing / 2
+        while step >= self.spacing / 64:
+            trial = (centres[:, None, :] + step * moves[None, :, :]).reshape(-1, 3)
+            trial_values = self.surface_distance(trial).reshape(len(centres), len(moves))
+            move = np.argmax(trial_values, axis=1)
+            better = trial_values[np.arange(len(centres)), move] > values
+            centres[better] = trial.reshape(len(centres), len(moves), 3)[better, move[better]]
+            values[better] = trial_values[better, move[better]]
+            if not better.any():
+                step /= 2
+        return 2 * max(float(values.max()), 0.0)
+
+    def void_fraction(self, probe_radius):
+        # Fraction of the grid points a probe of probe_radius can be centred on
+        return float(np.mean(self.distances >= probe_radius))
+
+    def surface_area(self, probe_radius, n_samples=500):
+        # Probe-accessible surface area (A^2 per cell): the part of each atom's sphere of radius
+        # radius + probe_radius that lies outside the spheres of all the other atoms, sampled at
+        # n_samples evenly spread points (a golden-angle spiral) per atom
+        z = 1 - (2 * np.arange(n_samples) + 1) / n_samples
+        phi = np.arange(n_samples) * np.pi * (3 - np.sqrt(5))
+        directions = np.stack([np.sqrt(1 - z ** 2) * np.cos(phi), np.sqrt(1 - z ** 2) * np.sin(phi), z], axis=1)
+        inflated = self.radii + probe_radius
+        points = (self.cart[:, None, :] + inflated[:, None, None] * directions[None, :, :]).reshape(-1, 3)
+        # A point on an atom's own sphere is exactly probe_radius from its surface
+        free = (self.surface_distance(points) >= probe_radius * (1 - 1e-9)).reshape(len(self.cart), n_samples)
+        return float(np.sum(4 * np.pi * inflated ** 2 * free.mean(axis=1)))
+
+
+def geometric_descriptors(cell, frac, species, probe_radius=co2_probe_radius, spacing=0.5, n_samples=500):
+    # {column: value} of the geometric_columns of one structure
+    grid = DistanceGrid(cell, frac, species, spacing)
+    area = grid.surface_area(probe_radius, n_samples)
+    mass = float(gather(property_table(("mass",)), np.asarray(species, dtype=np.intp)).sum())
+    return {
+        "CO2_Surf_m2/g": area * 1e-20 * avogadro / mass,
+        "CO2_VFrac": grid.void_fraction(probe_radius),
+        "Pore_1": grid.largest_included_sphere(),
+        "CO2_Surf_m2/cm3": area / cell_volume(cell) * 1e4,
+        "dense": density(cell, species),
+    }
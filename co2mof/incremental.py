@@ -0,0 +1,154 @@
+'''
+Descriptors of a structure that is edited a few atoms at a time.
+
+IncrementalDescriptors keeps the unnormalised AP-RDF sum and the epsilon/sigma sums of the 6 x 6 x 6
+bags of a structure. Adding, removing or moving an atom only adds or subtracts the pairs of that
+atom with the others, O(N) instead of the O(N^2) of a full compute_aprdf, and moves one atom between
+bags, O(1). rdf(), boa() and features() give the descriptors of the current structure in the layout
+of compute_aprdf, compute_boa and the model inputs.
+
+Atoms keep the id they were given (their position in the initial structure, or the id returned by
+add) until they are removed. The sums are updated by additions and subtractions, so after many edits
+the values can differ from a full calculation by rounding in the last of the 12 decimals kept;
+recompute() starts the sums afresh. The pair sums always evaluate every bin in float64
+(config.gauss_tol, precision and symmetry are not used).
+'''
+import numpy as np
+
+from .aprdf import default_config
+from .boa import bag_indices, n_bags, uff_table
+from .element_table import atomic_numbers, gather
+from .features import assemble_features
+from .rdf_kernels import compute_apw_rdf, min_image_distances
+
+
+class IncrementalDescriptors:
+    """AP-RDF and bag-of-atoms of (cell, frac, species), updated atom by atom."""
+
+    def __init__(self, cell, frac, species, config=None):
+        self.cell = np.asarray(cell, dtype=np.float64)
+        self.config = config or default_config
+        self._bins = np.asarray(self.config.bins, dtype=np.float64)
+        self._frac = np.empty((0, 3))
+        self._species = np.empty(0, dtype=np.intp)
+        self._props = np.empty((0, len(self.config.prop_names)))
+        self._uff = np.empty((0, 2))
+        self._bags = np.empty(0, dtype=np.intp)
+        self._alive = np.empty(0, dtype=bool)
+        self._n_slots = 0
+        self._reserve(len(species))
+
+        n = len(species)
+        species = np.asarray(species, dtype=np.intp)
+        self._frac[:n] = np.asarray(frac, dtype=np.float64).reshape(-1, 3)
+        self._species[:n] = species
+        self._props[:n] = gather(self.config.prop_table, species)
+        self._uff[:n] = gather(uff_table(), species)
+        self._bags[:n] = bag_indices(self._frac[:n])
+        self._alive[:n] = True
+        self._n_slots = n
+        self.recompute()
+
+    def _reserve(self, n):
+        # Grow the atom arrays (by doubling) to hold at least n atoms
+        capacity = len(self._alive)
+        if n <= capacity:
+            return
+        capacity = max(n, 2 * capacity, 16)
+        for name in ('_frac', '_species', '_props', '_uff', '_bags', '_alive'):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def _check(self, atom):
+        if not (0 <= atom < self._n_slots and self._alive[atom]):
+            raise KeyError("No atom with id {}".format(atom))
+
+    @property
+    def n_atoms(self):
+        return int(self._alive[:self._n_slots].sum())
+
+    def ids(self):
+        return np.flatnonzero(self._alive[:self._n_slots])
+
+    def structure(self):
+        # Current (cell, frac, species), atoms in the order of their ids
+        ids = self.ids()
+        return self.cell, self._frac[ids].copy(), self._species[ids].copy()
+
+    def recompute(self):
+        # Full O(N^2) calculation of the sums of the current structure
+        _, frac, species = self.structure()
+        ids = self.ids()
+        self._apw_rdf = compute_apw_rdf(self.cell, frac, self._props[ids], self._bins, self.config.smooth,
+                                        self.config.backend)
+        self._bag_sums = np.zeros((n_bags ** 3, 2))
+        np.add.at(self._bag_sums, self._bags[ids], self._uff[ids])
+
+    def _pair_terms(self, frac, props, skip):
+        # Sum of the AP-RDF terms of the pairs of an atom at frac (with properties props) with every atom but skip
+        others = self._alive[:self._n_slots].copy()
+        if skip is not None:
+            others[skip] = False
+        others = np.flatnonzero(others)
+        if len(others) == 0:
+            return 0.0
+        dist = min_image_distances(self.cell, frac[None, :], self._frac[others])
+        gauss = np.exp(self.config.smooth * (self._bins[None, :] - dist[:, None]) ** 2)
+        return (self._props[others] * props).T @ gauss
+
+    def add(self, element, frac):
+        # Adds an atom (element symbol or atomic number) at fractional coordinates frac and returns its id
+        z = atomic_numbers[element] if isinstance(element, str) else int(element)
+        frac = np.asarray(frac, dtype=np.float64).reshape(3)
+        props = gather(self.config.prop_table, np.array([z]))[0]
+        uff = gather(uff_table(), np.array([z]))[0]
+        bag = bag_indices(frac)[0]
+
+        self._apw_rdf += self._pair_terms(frac, props, None)
+        atom = self._n_slots
+        self._reserve(atom + 1)
+        self._frac[atom], self._species[atom], self._props[atom] = frac, z, props
+        self._uff[atom], self._bags[atom], self._alive[atom] = uff, bag, True
+        self._n_slots += 1
+        self._bag_sums[bag] += uff
+        return atom
+
+    def remove(self, atom):
+        self._check(atom)
+        self._apw_rdf -= self._pair_terms(self._frac[atom], self._props[atom], atom)
+        self._bag_sums[self._bags[atom]] -= self._uff[atom]
+        self._alive[atom] = False
+
+    def move(self, atom, frac):
+        # Moves an atom to new fractional coordinates
+        self._check(atom)
+        frac = np.asarray(frac, dtype=np.float64).reshape(3)
+        bag = bag_indices(frac)[0]
+        self._apw_rdf += (self._pair_terms(frac, self._props[atom], atom)
+                          - self._pair_terms(self._frac[atom], self._props[atom], atom))
+        self._bag_sums[self._bags[atom]] -= self._uff[atom]
+        self._bag_sums[bag] += self._uff[atom]
+        self._frac[atom], self._bags[atom] = frac, bag
+
+    def rdf(self):
+        # As compute_aprdf of the current structure
+        n_atoms = self.n_atoms
+        return np.round(self._apw_rdf.flatten() * self.config.factor / n_atoms, decimals=self.config.decimals)
+
+    def boa(self):
+        # As compute_boa of the current structure
+        return (self._bag_sums / self.n_atoms).ravel()
+
+    def features(self, feature_set, geometric=None):
+        # Input vector of the feature_set models for the current structure. geometric: the six geometric
+        # descriptors (in the order of features.geom_features), needed by the 'geo' feature sets.
+        # Chemical motifs are not computed here, so the 'mot' feature sets are not available.
+        return assemble_features(feature_set, self.boa(), self.rdf(), None if geometric is None else [geometric],
+                                 self.config.columns)[0]
+
+    def score(self, predictor, scaler, geometric=None):
+        # Prediction of a Predictor for the current structure, standardised with a fitted scaler
+        # (e.g. ScalerStats.load of the statistics of the screened database)
+        return float(predictor.predict(self.features(predictor.feature_set, geometric)[None, :], scaler)[0])
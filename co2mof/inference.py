@@ -0,0 +1,196 @@
+"""
+Batched CPU inference for the shipped models.
+
+InferenceEngine runs a Predictor's Linear + ReLU layers batch by batch into buffers allocated once
+per worker (torch.addmm / np.matmul with out=), so long screening runs do not allocate per batch,
+and spreads the batches over a thread pool (torch and NumPy release the GIL in the matrix
+products). autotune times a few batch sizes, torch intra-op thread counts and worker counts on a
+sample and returns the fastest combination; InferenceEngine.autotuned builds an engine with it.
+run_concurrently runs several engines (e.g. a wc and a Sel model) at the same time.
+
+torch's intra-op thread count is process-wide: an engine sets it while it runs and close() puts
+back the count it found, as autotune does when it returns. torch's inter-op threads are left to
+the caller, e.g. torch.set_num_interop_threads(1) at start-up as load_pytorch.py does, since the
+batches are already spread over the engine's own pool.
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+batch_sizes = (256, 1024, 4096, 16384)
+
+
+def model_layers(predictor):
+    # (weight, bias) of every layer of the predictor's model, as (in, out) and (out,) float32 arrays
+    # (NumPy engine) or tensors (torch engine); None for int8 models
+    if predictor.engine == "numpy":
+        return list(zip(predictor.model.weights, predictor.model.biases))
+    if predictor.engine == "int8":
+        # The packed int8 layers are run through the model's own forward
+        return None
+    model = predictor.model
+    layers = [getattr(model, name) for name in ('hidden1', 'hidden2', 'hidden3') if hasattr(model, name)]
+    layers.append(model.output)
+    return [(layer.weight.detach().to('cpu').t(), layer.bias.detach().to('cpu')) for layer in layers]
+
+
+def set_torch_threads(n_threads):
+    # Sets torch's intra-op threads and returns the previous count
+    import torch
+    previous = torch.get_num_threads()
+    torch.set_num_threads(n_threads)
+    return previous
+
+
+class InferenceEngine:
+    """
+    Forward pass of a Predictor in batches of batch_size rows on n_workers threads, each with its
+    own preallocated input and layer buffers (except for int8 models, which run their own forward).
+    n_threads sets torch's intra-op threads (torch and int8 engines) until close().
+
+    run takes features that are already scaled; predict scales them as Predictor.predict does.
+    """
+
+    def __init__(self, predictor, batch_size=4096, n_threads=None, n_workers=1):
+        self.predictor = predictor
+        self.batch_size = batch_size
+        self.n_threads = n_threads
+        self.n_workers = n_workers
+        self.layers = model_layers(predictor)
+        self.n_features = predictor.n_features
+        self._buffers = [self._allocate() for _ in range(n_workers)]
+        self._pool = ThreadPoolExecutor(n_workers) if n_workers > 1 else None
+        self._saved_threads = None
+        if predictor.engine != "numpy" and n_threads:
+            self._saved_threads = set_torch_threads(n_threads)
+
+    @classmethod
+    def autotuned(cls, predictor, sample=None, **kwargs):
+        settings = autotune(predictor, sample, **kwargs)
+        return cls(predictor, settings["batch_size"], settings["n_threads"], settings["n_workers"])
+
+    def _allocate(self):
+        if self.layers is None:
+            return None
+        sizes = [self.n_features] + [bias.shape[0] for _, bias in self.layers]
+        if self.predictor.engine == "numpy":
+            return [np.empty((self.batch_size, size), dtype=np.float32) for size in sizes]
+        import torch
+        return [torch.empty((self.batch_size, size), dtype=torch.float32) for size in sizes]
+
+    def _forward_numpy(self, buffers, x, out):
+        n = len(x)
+        h = buffers[0][:n]
+        h[...] = x
+        for (weight, bias), buffer in zip(self.layers, buffers[1:]):
+            h = np.matmul(h, weight, out=buffer[:n])
+            h += bias
+            np.maximum(h, 0, out=h)
+        out[:] = h[:, 0]
+
+    def _forward_torch(self, buffers, x, out):
+        import torch
+        n = len(x)
+        h = buffers[0][:n]
+        h.copy_(torch.from_numpy(x))
+        with torch.inference_mode():
+            for (weight, bias), buffer in zip(self.layers, buffers[1:]):
+                h = torch.addmm(bias, h, weight, out=buffer[:n])
+                h.relu_()
+        out[:] = h[:, 0].numpy()
+
+    def _forward_module(self, buffers, x, out):
+        import torch
+        with torch.inference_mode():
+            out[:] = self.predictor.model(torch.from_numpy(x)).numpy().ravel()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        if self._saved_threads is not None:
+            set_torch_threads(self._saved_threads)
+            self._saved_threads = None
+
+    def run(self, x):
+        # Predictions for scaled features x, shape (n_mofs, n_features), as a float32 array
+        x = np.ascontiguousarray(x, dtype=np.float32)
+        if x.ndim != 2 or x.shape[1] != self.n_features:
+            raise ValueError("The model expects {} features per MOF, got an array of shape {}".format(
+                self.n_features, x.shape))
+        if self.predictor.engine != "numpy" and self.n_threads:
+            set_torch_threads(self.n_threads)
+        forward = {"numpy": self._forward_numpy, "torch": self._forward_torch,
+                   "int8": self._forward_module}[self.predictor.engine]
+
+        out = np.empty(len(x), dtype=np.float32)
+        starts = range(0, len(x), self.batch_size)
+        if self._pool is None:
+            for start in starts:
+                forward(self._buffers[0], x[start:start + self.batch_size], out[start:start + self.batch_size])
+            return out
+
+        # Worker w takes every n_workers-th batch, so each thread only touches its own buffers
+        def work(w):
+            for start in starts[w::self.n_workers]:
+                forward(self._buffers[w], x[start:start + self.batch_size], out[start:start + self.batch_size])
+        for future in [self._pool.submit(work, w) for w in range(self.n_workers)]:
+            future.result()
+        return out
+
+    def predict(self, features, scaler=None):
+        features = np.asarray(features, dtype=np.float64)
+        if scaler is None:
+            from .predict import ScalerStats, fit_scaler
+            scaler = ScalerStats.fit(features) if self.predictor.engine == "numpy" else fit_scaler(features)
+        return self.run(scaler.transform(features))
+
+
+def autotune(predictor, sample=None, n_rows=8192, batch_sizes=batch_sizes, max_threads=None, repeats=2):
+    # Fastest (batch_size, n_threads, n_workers) for the predictor on this machine, timed on sample
+    # (scaled features; random ones if None) with n_workers * n_threads <= max_threads (all CPUs).
+    # Returns them with the measured throughput in rows/s; torch's thread count is left as it was.
+    max_threads = max_threads or os.cpu_count() or 1
+    if sample is None:
+        sample = np.random.default_rng(0).standard_normal((n_rows, predictor.n_features)).astype(np.float32)
+    sample = np.ascontiguousarray(sample[:n_rows], dtype=np.float32)
+
+    thread_counts = [n for n in (1, 2, 4, 8, 16, 32, 64) if n <= max_threads]
+    if predictor.engine == "numpy":
+        # NumPy's BLAS threads are not controlled here, only the number of workers
+        combinations = [(1, n_workers) for n_workers in thread_counts]
+    else:
+        combinations = [(n_threads, n_workers) for n_threads in thread_counts for n_workers in thread_counts
+                        if n_threads * n_workers <= max_threads]
+
+    best = None
+    for batch_size in batch_sizes:
+        if batch_size > len(sample) and batch_size != batch_sizes[0]:
+            continue
+        for n_threads, n_workers in combinations:
+            engine = InferenceEngine(predictor, batch_size, n_threads, n_workers)
+            try:
+                engine.run(sample[:batch_size])
+                elapsed = float('inf')
+                for _ in range(repeats):
+                    start = time.perf_counter()
+                    engine.run(sample)
+                    elapsed = min(elapsed, time.perf_counter() - start)
+            finally:
+                engine.close()
+            if best is None or elapsed < best["seconds"]:
+                best = {"batch_size": batch_size, "n_threads": n_threads, "n_workers": n_workers,
+                        "seconds": elapsed}
+
+    best["rows_per_s"] = len(sample) / best.pop("seconds")
+    return best
+
+
+def run_concurrently(jobs):
+    # engine.run(x) for every (engine, x) in jobs, e.g. the wc and Sel models of the same features,
+    # each in its own thread; returns the predictions in the order of jobs
+    with ThreadPoolExecutor(len(jobs)) as pool:
+        futures = [pool.submit(engine.run, x) for engine, x in jobs]
+        return [future.result() for future in futures]
@@ -0,0 +1,166 @@
+'''
+Reading cifs ahead of the workers that process them.
+
+CifPrefetcher reads the raw bytes of the cifs of a directory, a .zip archive or a .tar archive
+(optionally compressed), without extracting it, on background reader threads. The files go into a
+queue of at most max_queued files, so reading stays ahead of the computation without holding the
+whole dataset in memory. Iterating over the prefetcher yields (name, data) as files arrive; the
+structures are then parsed with read_cif(name, data).
+
+The prefetcher records how well this works (see stats):
+    queue depth:     number of files waiting when the consumer asked for the next one
+    consumer stalls: times (and seconds) the consumer found the queue empty, i.e. the computation
+                     waited for I/O; more readers (or faster storage) would help
+    reader stalls:   seconds the readers waited on a full queue, i.e. I/O is ahead of the computation
+'''
+import os
+import queue
+import tarfile
+import threading
+import zipfile
+from glob import glob
+from time import perf_counter
+
+
+def is_archive(src):
+    return os.path.isfile(src) and (zipfile.is_zipfile(src) or tarfile.is_tarfile(src))
+
+
+def list_cifs(src):
+    # Names of the cifs in src: file paths for a directory, member names for an archive
+    if os.path.isdir(src):
+        return glob(os.path.join(src, '*.cif'))
+    if zipfile.is_zipfile(src):
+        with zipfile.ZipFile(src) as archive:
+            return [info.filename for info in archive.infolist() if not info.is_dir() and info.filename.endswith('.cif')]
+    if tarfile.is_tarfile(src):
+        with tarfile.open(src) as archive:
+            return [member.name for member in archive if member.isfile() and member.name.endswith('.cif')]
+    raise ValueError("{} is not a directory, a .zip or a .tar archive".format(src))
+
+
+class _Done:
+    pass
+
+
+class CifPrefetcher:
+    """
+    Iterable over (name, data) of the cifs in src (all of them, or only names), read by n_readers
+    threads into a queue of at most max_queued files. Files of a .tar archive are read by a single
+    thread, in the order they are stored, since a tar stream cannot be read in parallel.
+    """
+
+    def __init__(self, src, names=None, n_readers=4, max_queued=256):
+        self.src = src
+        self.names = list_cifs(src) if names is None else list(names)
+        self.is_tar = os.path.isfile(src) and not zipfile.is_zipfile(src)
+        self.n_readers = 1 if self.is_tar else max(1, n_readers)
+        self.max_queued = max_queued
+
+        self.n_files = 0
+        self.n_bytes = 0
+        self.depth_total = 0
+        self.depth_max = 0
+        self.consumer_stalls = 0
+        self.consumer_stall_time = 0.0
+        self.reader_stall_time = 0.0
+        self.elapsed = 0.0
+        self._n_queued = 0
+        self._lock = threading.Lock()
+
+    def _put(self, q, item):
+        start = perf_counter()
+        q.put(item)
+        with self._lock:
+            self.reader_stall_time += perf_counter() - start
+            self._n_queued += 1
+
+    def _read_files(self, q, names):
+        # Reader for a directory or a zip archive; names is an iterator shared by the readers
+        archive = zipfile.ZipFile(self.src) if os.path.isfile(self.src) else None
+        try:
+            while True:
+                with self._lock:
+                    name = next(names, None)
+                if name is None:
+                    break
+                if archive is None:
+                    with open(name, 'rb') as f:
+                        data = f.read()
+                else:
+                    data = archive.read(name)
+                self._put(q, (name, data))
+        except Exception as error:
+            self._put(q, error)
+        finally:
+            if archive is not None:
+                archive.close()
+            q.put(_Done)
+
+    def _read_tar(self, q):
+        wanted = set(self.names)
+        try:
+            with tarfile.open(self.src, 'r|*') as archive:
+                for member in archive:
+                    if member.name in wanted:
+                        self._put(q, (member.name, archive.extractfile(member).read()))
+        except Exception as error:
+            self._put(q, error)
+        finally:
+            q.put(_Done)
+
+    def __iter__(self):
+        q = queue.Queue(self.max_queued)
+        if self.is_tar:
+            readers = [threading.Thread(target=self._read_tar, args=(q,), daemon=True)]
+        else:
+            names = iter(self.names)
+            readers = [threading.Thread(target=self._read_files, args=(q, names), daemon=True)
+                       for _ in range(self.n_readers)]
+        start = perf_counter()
+        for reader in readers:
+            reader.start()
+
+        n_done = 0
+        while n_done < len(readers):
+            # Files read but not yet taken (the end-of-reader markers are not counted)
+            with self._lock:
+                depth = self._n_queued - self.n_files
+            if depth == 0 and q.empty():
+                waited = perf_counter()
+                item = q.get()
+                if item is not _Done:
+                    self.consumer_stalls += 1
+                    self.consumer_stall_time += perf_counter() - waited
+            else:
+                item = q.get()
+
+            if item is _Done:
+                n_done += 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                self.depth_total += depth
+                self.depth_max = max(self.depth_max, depth)
+                self.n_files += 1
+                self.n_bytes += len(item[1])
+                yield item
+        self.elapsed = perf_counter() - start
+
+    def stats(self):
+        n_gets = max(self.n_files, 1)
+        return {
+            "files": self.n_files,
+            "MB": self.n_bytes / 1e6,
+            "mean queue depth": self.depth_total / n_gets,
+            "max queue depth": self.depth_max,
+            "consumer stalls": self.consumer_stalls,
+            "consumer stall s": self.consumer_stall_time,
+            "reader stall s": self.reader_stall_time,
+            "elapsed s": self.elapsed,
+        }
+
+    def summary(self):
+        return ("Read {files} cifs ({MB:.1f} MB): mean queue depth {mean queue depth:.1f} (max {max queue depth}), "
+                "{consumer stalls} consumer stalls ({consumer stall s:.2f} s waiting on reads), "
+                "readers waited {reader stall s:.2f} s on a full queue".format(**self.stats()))
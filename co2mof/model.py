@@ -0,0 +1,89 @@
+"""
+The PyTorch models of Burner et al. (wc/ and Sel/ at the top of the repository) and their loading.
+"""
+import os
+import pickle
+import warnings
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+# Directory holding the wc/ and Sel/ model folders
+model_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+targets = ('wc', 'Sel')
+
+# If CUDA device is available, then use it, otherwise use CPU
+use_cuda = torch.cuda.is_available()
+device = torch.device('cuda:0' if use_cuda else 'cpu')
+
+# Class for 3-layer models
+class Net3(nn.Module):
+    
+    def __init__(self):
+        super(Net3, self).__init__()
+
+    #forward function applies activation function
+    #to input and sends it to output (x is input tensor)
+    def forward(self, x):
+        if device == 'cuda:0':
+            x.cuda(device)
+        x = self.dropout(F.relu(self.hidden1(x)))
+        x = self.dropout(F.relu(self.hidden2(x)))
+        x = self.dropout(F.relu(self.hidden3(x)))
+        x = F.relu(self.output(x))
+        return x
+        
+# Class for 2-layer models
+class Net2(nn.Module):
+    
+    def __init__(self):
+        super(Net2, self).__init__()
+        
+    #forward function applies activation function
+    #to input and sends it to output (x is input tensor)
+    def forward(self, x):
+        if device == 'cuda:0':
+            x.cuda(device)
+        x = self.dropout(F.relu(self.hidden1(x)))
+        x = self.dropout(F.relu(self.hidden2(x)))
+        x = F.relu(self.output(x))
+        return x
+
+# The models were pickled from a script, so Net2/Net3 are recorded as classes of __main__.
+# This unpickler resolves them to the classes above, whichever script loads them.
+class _ModelUnpickler(pickle.Unpickler):
+
+    def find_class(self, module, name):
+        if module == '__main__' and name in ('Net2', 'Net3'):
+            return globals()[name]
+        return super().find_class(module, name)
+
+class _model_pickle:
+    Unpickler = _ModelUnpickler
+    load = staticmethod(lambda f, **kwargs: _ModelUnpickler(f, **kwargs).load())
+
+def load_model(path, map_location=device):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", torch.serialization.SourceChangeWarning)
+        model = torch.load(path, map_location=torch.device(map_location), pickle_module=_model_pickle, weights_only=False)
+    model.eval()
+    return model
+
+def model_path(feature_set, target, directory=None):
+    if target not in targets:
+        raise ValueError("Invalid selection of target property '{}', expected one of {}".format(target, targets))
+    return '{}/{}/{}_{}_model.pt'.format(directory or model_dir, target, feature_set, target)
+
+_models = {}
+
+def get_model(feature_set, target, map_location=device):
+    # load_model, cached per process so that a long-lived worker loads each model only once
+    path = model_path(feature_set, target)
+    key = (path, str(map_location))
+    if key not in _models:
+        if not os.path.exists(path):
+            raise FileNotFoundError("No {} model for the '{}' feature set ({})".format(target, feature_set, path))
+        _models[key] = load_model(path, map_location)
+    return _models[key]
@@ -0,0 +1,72 @@
+'''
+numba kernels of the AP-RDF accumulation, called by rdf_kernels.rdf_numba (see rdf_kernels.py for the
+quantity they compute). Kept apart so that numba is only imported when this backend is used.
+'''
+import numba
+import numpy as np
+
+
+@numba.njit(cache=True)
+def add_pair(partial, cart, shifts, atom_props, bins, smooth, cutoff, i, j, props_i):
+    # Adds the Gaussians of the pair (i, j), weighted by props_i * atom_props[j], to partial (n_props, n_bins)
+    n_props = atom_props.shape[1]
+    n_bins = bins.shape[0]
+
+    # Start from image 0 rather than inf so d2 keeps the dtype of cart
+    dx = cart[j, 0] + shifts[0, 0] - cart[i, 0]
+    dy = cart[j, 1] + shifts[0, 1] - cart[i, 1]
+    dz = cart[j, 2] + shifts[0, 2] - cart[i, 2]
+    d2 = dx * dx + dy * dy + dz * dz
+    for k in range(1, shifts.shape[0]):
+        dx = cart[j, 0] + shifts[k, 0] - cart[i, 0]
+        dy = cart[j, 1] + shifts[k, 1] - cart[i, 1]
+        dz = cart[j, 2] + shifts[k, 2] - cart[i, 2]
+        r2 = dx * dx + dy * dy + dz * dz
+        if r2 < d2:
+            d2 = r2
+    dist = np.sqrt(d2)
+    lo, hi = 0, n_bins
+    if cutoff > 0:
+        lo = np.searchsorted(bins, dist - cutoff, side='left')
+        hi = np.searchsorted(bins, dist + cutoff, side='right')
+    for b in range(lo, hi):
+        g = np.exp(smooth * (bins[b] - dist) ** 2)
+        for p in range(n_props):
+            partial[p, b] += g * props_i[p] * atom_props[j, p]
+
+
+@numba.njit(parallel=True, cache=True)
+def rdf_kernel(cart, shifts, atom_props, bins, smooth, cutoff, n_threads):
+    n_atoms, n_props = atom_props.shape
+    n_bins = bins.shape[0]
+
+    # One (n_props, n_bins) accumulator per thread; rows are dealt out round-robin
+    # so the triangular pair loop stays balanced.
+    partial = np.zeros((n_threads, n_props, n_bins))
+    for t in numba.prange(n_threads):
+        for i in range(t, n_atoms - 1, n_threads):
+            for j in range(i + 1, n_atoms):
+                add_pair(partial[t], cart, shifts, atom_props, bins, smooth, cutoff, i, j, atom_props[i])
+    return partial.sum(axis=0)
+
+
+@numba.njit(parallel=True, cache=True)
+def rdf_kernel_orbits(cart, shifts, atom_props, bins, smooth, cutoff, n_threads, starts, ends, sizes):
+    # Pairs (starts[k], j > starts[k]), weighted by sizes[k] / 2 within the orbit and sizes[k] beyond it
+    n_atoms, n_props = atom_props.shape
+    n_bins = bins.shape[0]
+
+    partial = np.zeros((n_threads, n_props, n_bins))
+    for t in numba.prange(n_threads):
+        within = np.empty(n_props, dtype=atom_props.dtype)
+        beyond = np.empty(n_props, dtype=atom_props.dtype)
+        for k in range(t, starts.shape[0], n_threads):
+            i = starts[k]
+            for p in range(n_props):
+                within[p] = atom_props[i, p] * sizes[k] / 2
+                beyond[p] = atom_props[i, p] * sizes[k]
+            for j in range(i + 1, ends[k]):
+                add_pair(partial[t], cart, shifts, atom_props, bins, smooth, cutoff, i, j, within)
+            for j in range(ends[k], n_atoms):
+                add_pair(partial[t], cart, shifts, atom_props, bins, smooth, cutoff, i, j, beyond)
+    return partial.sum(axis=0)
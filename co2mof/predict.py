@@ -0,0 +1,183 @@
+"""
+Predictions of CO2 working capacity (wc) and CO2/N2 selectivity (Sel) from descriptor arrays.
+
+torch and sklearn are only imported when they are needed: the "numpy" engine runs the models from
+their cached NumPy copies (see artifacts.py), and ScalerStats replaces sklearn's StandardScaler.
+"""
+import numpy as np
+
+from .features import get_features
+
+engines = ("torch", "numpy", "int8")
+
+
+class ScalerStats:
+    """
+    Mean and scale of a fitted StandardScaler, saved to an .npz file so that later runs can
+    standardise their features with the same statistics without importing sklearn.
+    """
+
+    def __init__(self, mean, scale):
+        self.mean_ = np.asarray(mean, dtype=np.float64)
+        self.scale_ = np.asarray(scale, dtype=np.float64)
+
+    @classmethod
+    def from_scaler(cls, scaler):
+        return cls(scaler.mean_, scaler.scale_)
+
+    @classmethod
+    def fit(cls, features):
+        # StandardScaler().fit in NumPy, with the same corrected two-pass variance and the same
+        # handling of (near) constant features, whose scale is set to 1
+        features = np.asarray(features, dtype=np.float64)
+        n_samples = features.shape[0]
+        total = np.sum(features, axis=0)
+        mean = total / n_samples
+        centred = features - mean
+        correction = np.sum(centred, axis=0)
+        var = (np.sum(centred ** 2, axis=0) - correction ** 2 / n_samples) / n_samples
+        return cls._from_moments(n_samples, mean, var)
+
+    @classmethod
+    def fit_chunks(cls, chunks):
+        # fit over an iterable of row blocks without holding them all in memory. The statistics of
+        # the blocks are merged pairwise (Chan, Golub and LeVeque) as in StandardScaler.partial_fit,
+        # so the result only differs from fit on the whole array by rounding.
+        n_samples, mean, m2 = 0, 0.0, 0.0
+        for features in chunks:
+            features = np.asarray(features, dtype=np.float64)
+            n = features.shape[0]
+            if n == 0:
+                continue
+            chunk_mean = np.sum(features, axis=0) / n
+            centred = features - chunk_mean
+            chunk_m2 = np.sum(centred ** 2, axis=0) - np.sum(centred, axis=0) ** 2 / n
+            total = n_samples + n
+            delta = chunk_mean - mean
+            mean = mean + delta * (n / total)
+            m2 = m2 + chunk_m2 + delta ** 2 * (n_samples * n / total)
+            n_samples = total
+        if n_samples == 0:
+            raise ValueError("Cannot fit a scaler on no rows")
+        return cls._from_moments(n_samples, mean, m2 / n_samples)
+
+    @classmethod
+    def _from_moments(cls, n_samples, mean, var):
+        eps = np.finfo(np.float64).eps
+        scale = np.sqrt(var)
+        scale[var <= n_samples * eps * var + (n_samples * mean * eps) ** 2] = 1.0
+        return cls(mean, scale)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as stats:
+            return cls(stats["mean"], stats["scale"])
+
+    def save(self, path):
+        np.savez(path, mean=self.mean_, scale=self.scale_)
+
+    def transform_in_place(self, features, block_size=65536):
+        # transform, overwriting features (e.g. a float32 array too large to copy) block by block
+        mean = self.mean_.astype(features.dtype)
+        scale = self.scale_.astype(features.dtype)
+        for start in range(0, len(features), block_size):
+            block = features[start:start + block_size]
+            block -= mean
+            block /= scale
+        return features
+
+    def transform(self, features):
+        # Same operations as StandardScaler.transform
+        features = np.array(features, dtype=np.float64)
+        features -= self.mean_
+        features /= self.scale_
+        return features
+
+
+def fit_scaler(features):
+    from sklearn.preprocessing import StandardScaler
+    return StandardScaler().fit(features)
+
+
+class Predictor:
+    """
+    One of the shipped models, loaded once per process (see model.get_model and artifacts.load_artifact).
+
+    predict takes an (n_mofs, n_features) array with the columns in the order get_features returns
+    them for feature_set. As in load_pytorch.py the features are standardised with a StandardScaler,
+    by default fitted on the array itself; pass a fitted scaler (or ScalerStats) to use fixed
+    statistics instead. engine="numpy" predicts (and fits the scaler) without importing torch or sklearn;
+    engine="int8" uses the dynamically quantized version of the model (see quantize.py).
+    """
+
+    def __init__(self, feature_set, target, map_location=None, engine="torch"):
+        if engine not in engines:
+            raise ValueError("Invalid engine '{}', expected one of {}".format(engine, engines))
+        self.feature_set = feature_set
+        self.target = target
+        self.engine = engine
+        if engine == "numpy":
+            from .artifacts import load_artifact
+            self.model = load_artifact(feature_set, target)
+        elif engine == "int8":
+            # Quantized models only run on CPU
+            import torch
+            from .quantize import get_quantized_model
+            self.device = torch.device('cpu')
+            self.model = get_quantized_model(feature_set, target)
+        else:
+            import torch
+            from .model import device, get_model
+            self.device = torch.device(map_location or device)
+            self.model = get_model(feature_set, target, self.device)
+
+    @property
+    def n_features(self):
+        if self.engine == "numpy":
+            return self.model.n_features
+        return self.model.hidden1.in_features
+
+    def predict(self, features, scaler=None):
+        features = np.asarray(features, dtype=np.float64)
+        if features.ndim != 2 or features.shape[1] != self.n_features:
+            raise ValueError("The {} {} model expects {} features per MOF, got an array of shape {}".format(
+                self.feature_set, self.target, self.n_features, features.shape))
+        if scaler is None:
+            scaler = ScalerStats.fit(features) if self.engine == "numpy" else fit_scaler(features)
+
+        if self.engine == "numpy":
+            return self.model(scaler.transform(features)).ravel()
+
+        import torch
+        x = torch.from_numpy(scaler.transform(features)).float().to(self.device)
+        with torch.no_grad():
+            y = self.model(x)
+        return y.to('cpu').numpy().ravel()
+
+    def predict_scaled(self, x, out=None, batch_size=65536):
+        # Predictions for features already scaled, given as a C-contiguous float32 array, which is
+        # passed to the model batch by batch without copying (torch.from_numpy). They are written to
+        # out (a float32 array of len(x)) if given, and returned.
+        if x.dtype != np.float32 or not x.flags.c_contiguous:
+            raise ValueError("predict_scaled needs a C-contiguous float32 array")
+        if x.ndim != 2 or x.shape[1] != self.n_features:
+            raise ValueError("The {} {} model expects {} features per MOF, got an array of shape {}".format(
+                self.feature_set, self.target, self.n_features, x.shape))
+        if out is None:
+            out = np.empty(len(x), dtype=np.float32)
+
+        if self.engine == "numpy":
+            for start in range(0, len(x), batch_size):
+                out[start:start + batch_size] = self.model(x[start:start + batch_size]).ravel()
+            return out
+
+        import torch
+        with torch.inference_mode():
+            for start in range(0, len(x), batch_size):
+                y = self.model(torch.from_numpy(x[start:start + batch_size]).to(self.device))
+                out[start:start + batch_size] = y.to('cpu').numpy().ravel()
+        return out
+
+    def predict_dataframe(self, data, scaler=None):
+        # predict from a dataframe laid out like the descriptor csv described in the README
+        return self.predict(get_features(self.feature_set, data, verbose=False).to_numpy(), scaler)
@@ -0,0 +1,114 @@
+"""
+Persistent cache of predictions, for rescoring overlapping sets of MOFs with the same models.
+
+A prediction is stored under (model key, row key): the model key hashes the model file, the engine
+that runs it and the scaling statistics (see model_key), the row key hashes the descriptor values of
+the MOF. A repeated run therefore only sends the rows it has not seen before to the model. Note
+that the scaling statistics are part of the key: runs that fit their scaler on their own csv only
+share predictions if the statistics come out identical, so use a saved scaler (scaler_file in
+load_pytorch.py) for rescoring.
+
+The cache is a single SQLite file. Every hit or new entry is stamped with the time it was last used,
+and once the cache holds more than max_entries predictions the least recently used ones are evicted.
+"""
+import hashlib
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+from .artifacts import model_dir
+
+key_size = 16
+
+
+def model_key(feature_set, target, engine, scaler, variant=""):
+    # Hash of everything besides the descriptors that determines a prediction
+    h = hashlib.blake2b(digest_size=key_size)
+    with open("{}/{}/{}_{}_model.pt".format(model_dir, target, feature_set, target), 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    h.update("{}|{}|{}|{}".format(feature_set, target, engine, variant).encode())
+    h.update(np.asarray(scaler.mean_, dtype=np.float64).tobytes())
+    h.update(np.asarray(scaler.scale_, dtype=np.float64).tobytes())
+    return h.digest()
+
+
+def row_keys(rows):
+    # Hash of the values of every row of a 2-D array
+    rows = np.ascontiguousarray(rows)
+    return [hashlib.blake2b(row.tobytes(), digest_size=key_size).digest() for row in rows]
+
+
+class PredictionCache:
+    """Size-bounded, least-recently-used store of predictions keyed by (model key, row key)."""
+
+    def __init__(self, path, max_entries=10000000):
+        self.path = path
+        self.max_entries = max_entries
+        self.n_hits = 0
+        self.n_misses = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS predictions "
+                         "(model BLOB, row BLOB, value REAL, used INTEGER, PRIMARY KEY (model, row)) WITHOUT ROWID")
+        self._db.execute("CREATE INDEX IF NOT EXISTS predictions_used ON predictions (used)")
+        self._db.commit()
+
+    def close(self):
+        self._db.close()
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+
+    def lookup(self, model, keys):
+        # Cached predictions for the row keys (NaN where missing) and the mask of hits
+        values = np.full(len(keys), np.nan, dtype=np.float32)
+        hit = np.zeros(len(keys), dtype=bool)
+        db = self._db
+        db.execute("CREATE TEMP TABLE IF NOT EXISTS wanted (row BLOB, position INTEGER)")
+        db.execute("DELETE FROM wanted")
+        db.executemany("INSERT INTO wanted VALUES (?, ?)", zip(keys, range(len(keys))))
+        found = db.execute("SELECT wanted.position, predictions.value FROM wanted JOIN predictions "
+                           "ON predictions.model = ? AND predictions.row = wanted.row", (model,)).fetchall()
+        if found:
+            positions, cached = zip(*found)
+            positions = np.array(positions, dtype=np.intp)
+            values[positions] = cached
+            hit[positions] = True
+            db.execute("UPDATE predictions SET used = ? WHERE model = ? AND row IN (SELECT row FROM wanted)",
+                       (time.time_ns(), model))
+        db.execute("DELETE FROM wanted")
+        db.commit()
+        return values, hit
+
+    def store(self, model, keys, values):
+        now = time.time_ns()
+        self._db.executemany("INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?)",
+                             ((model, key, float(value), now) for key, value in zip(keys, values)))
+        self._db.commit()
+        self.evict()
+
+    def evict(self):
+        # Drop the least recently used predictions beyond max_entries
+        excess = len(self) - self.max_entries
+        if excess > 0:
+            self._db.execute("DELETE FROM predictions WHERE (model, row) IN "
+                             "(SELECT model, row FROM predictions ORDER BY used LIMIT ?)", (excess,))
+            self._db.commit()
+
+    def predict(self, model, rows, predict_rows):
+        # Predictions for every row of rows: cached ones are reused, and predict_rows(indices) is
+        # called with the indices of the others, whose predictions are then stored
+        keys = row_keys(rows)
+        values, hit = self.lookup(model, keys)
+        missing = np.flatnonzero(~hit)
+        self.n_hits += len(keys) - len(missing)
+        self.n_misses += len(missing)
+        if len(missing):
+            values[missing] = predict_rows(missing)
+            self.store(model, [keys[i] for i in missing], values[missing])
+        return values
@@ -0,0 +1,68 @@
+"""
+Dynamically quantized (int8 Linear) versions of the shipped models, for faster CPU screening.
+
+quantize_model converts every Linear layer of a model to int8 weights with activations quantized on
+the fly (torch.ao.quantization.quantize_dynamic). get_quantized_model returns the int8 version of a
+shipped model, quantized the first time it is used and kept in the cache directory of artifacts.py
+next to the NumPy copies; like those it is remade whenever the .pt file changes. The int8 models
+only run on CPU. See quantize_models.py for their accuracy and speed against the float32 ones.
+"""
+import copy
+import os
+import warnings
+
+import torch
+import torch.nn as nn
+
+from .artifacts import cache_dir, _source_stat
+from .model import get_model, model_path
+
+
+def quantize_model(model):
+    with warnings.catch_warnings():
+        # Eager-mode quantization is deprecated in favour of torchao but still works
+        warnings.simplefilter("ignore")
+        return torch.ao.quantization.quantize_dynamic(copy.deepcopy(model).to('cpu'), {nn.Linear}, dtype=torch.qint8)
+
+
+def quantized_path(feature_set, target):
+    return os.path.join(cache_dir, "{}_{}_model_int8.pt".format(feature_set, target))
+
+
+def export_quantized(feature_set, target):
+    source = model_path(feature_set, target)
+    model = quantize_model(get_model(feature_set, target, 'cpu'))
+    os.makedirs(cache_dir, exist_ok=True)
+    path = quantized_path(feature_set, target)
+    tmp = "{}.{}.tmp".format(path, os.getpid())
+    torch.save({"source_stat": _source_stat(source).tolist(), "model": model}, tmp)
+    os.replace(tmp, path)
+    return model
+
+
+_models = {}
+
+def get_quantized_model(feature_set, target):
+    # int8 version of a shipped model, cached per process and in cache_dir
+    source = model_path(feature_set, target)
+    if not os.path.exists(source):
+        raise FileNotFoundError("No {} model for the '{}' feature set ({})".format(target, feature_set, source))
+    stat = _source_stat(source).tolist()
+
+    key = (feature_set, target)
+    if key in _models and _models[key][0] == stat:
+        return _models[key][1]
+
+    path = quantized_path(feature_set, target)
+    model = None
+    if os.path.exists(path):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            saved = torch.load(path, map_location='cpu', weights_only=False)
+        if saved["source_stat"] == stat:
+            model = saved["model"]
+    if model is None:
+        model = export_quantized(feature_set, target)
+    model.eval()
+    _models[key] = (stat, model)
+    return model
@@ -0,0 +1,259 @@
+'''
+Kernels for the atomic-property-weighted RDF (AP-RDF) accumulation used by co2mof.aprdf.
+
+Every kernel computes the same quantity,
+
+    apw_rdf[p, b] = sum over pairs i < j of exp(smooth * (bins[b] - d_ij) ** 2) * P_p(i) * P_p(j)
+
+where d_ij is the shortest distance between atom i and the 27 periodic images of atom j and
+P_p(i) is property p of atom i (atom_props[i, p]). Normalisation (factor / n_atoms) and
+rounding are left to the caller.
+
+With gauss_tol set, the numpy and numba kernels only evaluate the Gaussian on the bins where it is
+at least gauss_tol, i.e. within gaussian_cutoff(smooth, gauss_tol) of d_ij. The window of each
+distance is found with np.searchsorted on bins. Every skipped term is smaller than gauss_tol times
+the pair weight, so the error in any bin is at most gauss_tol * sum over pairs of |P_p(i) * P_p(j)|.
+
+With precision="float32" the numpy and numba kernels compute distances, Gaussians and pair weights in
+single precision while the apw_rdf accumulator stays float64 (the NumPy kernel sums each chunk of
+pairs in float32 before adding it to the accumulator).
+
+Backends:
+    reference: the original pair-by-pair loop, kept as the ground truth for the other backends
+    numpy:     vectorised over chunks of pairs, memory bounded by chunk_size
+    numba:     fused distance/Gaussian/accumulation loop compiled with numba, parallel over atoms
+    auto:      numba if it is installed, otherwise numpy
+
+With orbits = (starts, ends, sizes) (see symmetry.asymmetric_unit; the atoms sorted so that every
+symmetry orbit is contiguous), the numpy and numba kernels only visit the pairs whose first atom is
+the first of its orbit, starts[k], and whose second atom comes after it: a pair within the orbit
+(j < ends[k]) stands for sizes[k] / 2 pairs of the full sum, a pair with a later orbit for sizes[k].
+That is one pair per pair of symmetric copies, about |G| times fewer than the full sum.
+
+rdf_numpy_batch computes the AP-RDFs of many structures in one vectorised call. Their atoms are
+concatenated into ragged arrays with one cell matrix per structure, pairs never cross structures,
+and the per-pair contributions are segment-reduced into one (n_props, n_bins) block per structure.
+'''
+from importlib.util import find_spec
+from itertools import combinations, product
+
+import numpy as np
+
+# numba takes a while to import, so numba_kernels.py is only imported by the first numba call
+has_numba = find_spec("numba") is not None
+
+super_cell = np.array(list(product([-1, 0, 1], repeat=3)), dtype=float)
+
+backends = ("auto", "numba", "numpy", "reference")
+precisions = ("float64", "float32")
+
+
+def rdf_reference(frac2cart, frac, atom_props, bins, smooth):
+    n_atoms, n_props = atom_props.shape
+    n_bins = len(bins)
+
+    apw_rdf = np.zeros([n_props, n_bins], dtype=np.float64)
+    for i, j in combinations(range(n_atoms), 2):
+        cart_i = frac2cart @ frac[i]
+        cart_j = (frac2cart @ (super_cell + frac[j]).T).T
+        dist_ij = min(np.linalg.norm(cart_j - cart_i, axis=1))
+        rdf = np.exp(smooth * (bins - dist_ij) ** 2)
+        rdf = rdf.repeat(n_props).reshape(n_bins, n_props)
+        apw_rdf += (rdf * (atom_props[i] * atom_props[j])).T
+    return apw_rdf
+
+
+def pair_chunks(n_atoms, chunk_size):
+    # Yield (i, j) index arrays covering all pairs i < j, a block of rows at a time,
+    # with roughly chunk_size pairs per block.
+    start = 0
+    while start < n_atoms - 1:
+        stop, n_pairs = start, 0
+        while stop < n_atoms - 1 and n_pairs < chunk_size:
+            n_pairs += n_atoms - 1 - stop
+            stop += 1
+        rows = np.arange(start, stop)
+        counts = n_atoms - 1 - rows
+        ii = np.repeat(rows, counts)
+        offsets = np.arange(n_pairs) - np.repeat(np.cumsum(counts) - counts, counts)
+        yield ii, ii + 1 + offsets
+        start = stop
+
+
+def orbit_pair_chunks(starts, n_atoms, chunk_size):
+    # Yield (i, j) index arrays covering the pairs i < j with i in starts, a block of rows at a time
+    n_blocks = min(len(starts), max(1, (len(starts) * n_atoms) // chunk_size))
+    for block in np.array_split(starts, n_blocks):
+        counts = n_atoms - 1 - block
+        if counts.sum() == 0:
+            continue
+        ii = np.repeat(block, counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        yield ii, ii + 1 + offsets
+
+
+def orbit_pair_scale(starts, ends, sizes, n_atoms):
+    # Per-row multiplicities: (weight of pairs within the orbit, weight of the others, end of the orbit)
+    # indexed by atom, for the first atom of each orbit
+    within, beyond, end = np.zeros(n_atoms), np.zeros(n_atoms), np.zeros(n_atoms, dtype=np.intp)
+    within[starts], beyond[starts], end[starts] = sizes / 2, sizes, ends
+    return within, beyond, end
+
+
+def min_image_distances(frac2cart, frac_i, frac_j):
+    # Shortest distance between each atom i and the 27 images of the matching atom j
+    shifts = super_cell.astype(frac_i.dtype, copy=False)
+    delta = (frac_j - frac_i)[:, None, :] + shifts[None, :, :]
+    cart = delta @ frac2cart.T
+    return np.sqrt(np.min(np.einsum('pkx,pkx->pk', cart, cart), axis=1))
+
+
+def gaussian_cutoff(smooth, gauss_tol):
+    # Distance beyond which exp(smooth * r ** 2) drops below gauss_tol
+    if smooth >= 0 or not 0 < gauss_tol < 1:
+        raise ValueError("gauss_tol needs a negative smooth and 0 < gauss_tol < 1")
+    return np.sqrt(np.log(gauss_tol) / smooth)
+
+
+def bin_windows(bins, dist, cutoff):
+    # [lo, hi) range of bins within cutoff of each distance
+    lo = np.searchsorted(bins, dist - cutoff, side='left')
+    hi = np.searchsorted(bins, dist + cutoff, side='right')
+    return lo, hi
+
+
+def rdf_numpy(frac2cart, frac, atom_props, bins, smooth, gauss_tol=None, precision="float64",
+              chunk_size=8192, orbits=None):
+    n_atoms, n_props = atom_props.shape
+    n_bins = len(bins)
+    dtype = np.dtype(precision)
+    frac2cart, frac, atom_props, bins = (np.asarray(a, dtype=dtype) for a in (frac2cart, frac, atom_props, bins))
+    smooth = dtype.type(smooth)
+    if gauss_tol is not None:
+        cutoff = dtype.type(gaussian_cutoff(smooth, gauss_tol))
+
+    if orbits is None:
+        pairs = pair_chunks(n_atoms, chunk_size)
+    else:
+        pairs = orbit_pair_chunks(orbits[0], n_atoms, chunk_size)
+        within, beyond, end = orbit_pair_scale(*orbits, n_atoms)
+        within, beyond = within.astype(dtype), beyond.astype(dtype)
+
+    apw_rdf = np.zeros([n_props, n_bins], dtype=np.float64)
+    for ii, jj in pairs:
+        dist = min_image_distances(frac2cart, frac[ii], frac[jj])
+        weights = atom_props[ii] * atom_props[jj]
+        if orbits is not None:
+            weights *= np.where(jj < end[ii], within[ii], beyond[ii])[:, None]
+        if gauss_tol is None:
+            gauss = np.exp(smooth * (bins[None, :] - dist[:, None]) ** 2)
+            apw_rdf += weights.T @ gauss
+            continue
+
+        # Flatten the ragged (pair, bin) windows and scatter them back with bincount
+        lo, hi = bin_windows(bins, dist, cutoff)
+        counts = hi - lo
+        pair = np.repeat(np.arange(len(dist)), counts)
+        b = np.arange(counts.sum()) + np.repeat(lo - (np.cumsum(counts) - counts), counts)
+        gauss = np.exp(smooth * (bins[b] - dist[pair]) ** 2)
+        for p in range(n_props):
+            apw_rdf[p] += np.bincount(b, weights=gauss * weights[pair, p], minlength=n_bins)
+    return apw_rdf
+
+
+def rdf_numpy_batch(frac2carts, frac, atom_props, n_atoms, bins, smooth, gauss_tol=None,
+                    precision="float64", chunk_size=8192):
+    # frac2carts: (n_structures, 3, 3); frac, atom_props: atoms of all structures concatenated in order;
+    # n_atoms: number of atoms of each structure. Returns (n_structures, n_props, n_bins).
+    n_structures = len(n_atoms)
+    n_props = atom_props.shape[1]
+    n_bins = len(bins)
+    dtype = np.dtype(precision)
+    seg = np.repeat(np.arange(n_structures), n_atoms)
+
+    # Cartesian coordinates of every atom and the 27 image shifts of every cell
+    cart = np.einsum('ayx,ax->ay', frac2carts[seg], frac).astype(dtype)
+    shifts = np.einsum('kx,syx->sky', super_cell, frac2carts).astype(dtype)
+    atom_props, bins = atom_props.astype(dtype), np.asarray(bins, dtype=dtype)
+    smooth = dtype.type(smooth)
+    if gauss_tol is not None:
+        cutoff = dtype.type(gaussian_cutoff(smooth, gauss_tol))
+
+    # Number of pairs (i, j > i) in the row of each atom
+    counts = np.cumsum(n_atoms)[seg] - 1 - np.arange(len(seg))
+    row_ends = np.cumsum(counts)
+
+    apw_rdf = np.zeros([n_structures, n_props, n_bins], dtype=np.float64)
+    start = 0
+    while start < len(seg):
+        done = row_ends[start - 1] if start > 0 else 0
+        stop = max(np.searchsorted(row_ends, done + chunk_size, side='right'), start + 1)
+        rows = np.arange(start, stop)
+        c = counts[rows]
+        start = stop
+        if c.sum() == 0:
+            continue
+        ii = np.repeat(rows, c)
+        jj = ii + 1 + np.arange(c.sum()) - np.repeat(np.cumsum(c) - c, c)
+        s = seg[ii]
+
+        delta = (cart[jj] - cart[ii])[:, None, :] + shifts[s]
+        dist = np.sqrt(np.min(np.einsum('pkx,pkx->pk', delta, delta), axis=1))
+        weights = atom_props[ii] * atom_props[jj]
+
+        if gauss_tol is None:
+            # Pairs are ordered by structure, so each structure is one contiguous segment
+            first = np.flatnonzero(np.r_[True, s[1:] != s[:-1]])
+            gauss = np.exp(smooth * (bins[None, :] - dist[:, None]) ** 2)
+            for p in range(n_props):
+                apw_rdf[s[first], p] += np.add.reduceat(gauss * weights[:, p, None], first, axis=0)
+            continue
+
+        lo, hi = bin_windows(bins, dist, cutoff)
+        counts_b = hi - lo
+        pair = np.repeat(np.arange(len(dist)), counts_b)
+        b = np.arange(counts_b.sum()) + np.repeat(lo - (np.cumsum(counts_b) - counts_b), counts_b)
+        gauss = np.exp(smooth * (bins[b] - dist[pair]) ** 2)
+        key = s[pair] * n_bins + b
+        for p in range(n_props):
+            apw_rdf[:, p] += np.bincount(key, weights=gauss * weights[pair, p],
+                                         minlength=n_structures * n_bins).reshape(n_structures, n_bins)
+    return apw_rdf
+
+
+def rdf_numba(frac2cart, frac, atom_props, bins, smooth, gauss_tol=None, precision="float64", orbits=None):
+    if not has_numba:
+        raise ImportError("The numba backend requires numba (pip install numba)")
+    import numba
+    from .numba_kernels import rdf_kernel, rdf_kernel_orbits
+
+    dtype = np.dtype(precision)
+    cutoff = 0.0 if gauss_tol is None else gaussian_cutoff(smooth, gauss_tol)
+    cart = np.ascontiguousarray(frac @ frac2cart.T, dtype=dtype)
+    shifts = np.ascontiguousarray(super_cell @ frac2cart.T, dtype=dtype)
+    args = (cart, shifts, np.ascontiguousarray(atom_props, dtype=dtype), np.ascontiguousarray(bins, dtype=dtype),
+            dtype.type(smooth), dtype.type(cutoff), numba.get_num_threads())
+    if orbits is None:
+        return rdf_kernel(*args)
+    starts, ends, sizes = orbits
+    return rdf_kernel_orbits(*args, starts.astype(np.intp), ends.astype(np.intp), sizes.astype(dtype))
+
+
+def compute_apw_rdf(frac2cart, frac, atom_props, bins, smooth, backend="auto", gauss_tol=None,
+                    precision="float64", orbits=None):
+    if backend == "auto":
+        backend = "numba" if has_numba else "numpy"
+    if precision not in precisions:
+        raise ValueError("Unknown precision '{}', expected one of {}".format(precision, precisions))
+
+    if backend == "numba":
+        return rdf_numba(frac2cart, frac, atom_props, bins, smooth, gauss_tol, precision, orbits)
+    elif backend == "numpy":
+        return rdf_numpy(frac2cart, frac, atom_props, bins, smooth, gauss_tol, precision, orbits=orbits)
+    elif backend == "reference":
+        if orbits is not None:
+            raise ValueError("The reference backend always sums over every pair; use numpy or numba with symmetry")
+        # The reference loop always evaluates every bin in float64
+        return rdf_reference(frac2cart, frac, atom_props, bins, smooth)
+    else:
+        raise ValueError("Unknown RDF backend '{}', expected one of {}".format(backend, backends))
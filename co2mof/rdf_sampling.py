@@ -0,0 +1,111 @@
+'''
+Approximate AP-RDFs from a stratified random sample of the atom pairs, for first-pass screening of
+very large structures.
+
+The atomic properties only depend on the element, so the pairs fall into strata, one per pair of
+elements, within which every pair has the same weight P_p(i) * P_p(j). The Gaussian sum of each
+stratum is estimated from a simple random sample of n_h of its N_h pairs (drawn without
+replacement) as N_h times the sample mean, with variance N_h^2 (1 - n_h / N_h) s_h^2 / n_h, and the
+AP-RDF and its variance are the weighted sums over the strata. The estimate is unbiased; its
+standard error is returned for every bin.
+
+Pairs are allocated to the strata in proportion to their size, with at least min_stratum pairs per
+stratum; strata that small are summed exactly. The budget is about max_pairs pairs per structure.
+With rel_error set, the sample is drawn in rounds of doubling size and sampling stops after the
+first round in which the largest standard error falls below rel_error times the largest bin.
+'''
+import numpy as np
+
+from .aprdf import compute_aprdf, default_config
+from .element_table import gather
+from .rdf_kernels import min_image_distances
+
+n_rounds = 4
+
+
+def pair_strata(species):
+    # (atoms of element a, atoms of element b, a == b) for every pair of elements a <= b present
+    elements = np.unique(species)
+    atoms = [np.flatnonzero(species == element) for element in elements]
+    return [(atoms[a], atoms[b], a == b) for a in range(len(elements)) for b in range(a, len(elements))]
+
+
+def stratum_size(first, second, same):
+    return len(first) * (len(first) - 1) // 2 if same else len(first) * len(second)
+
+
+def stratum_pairs(first, second, same, k):
+    # Atom pairs (i, j) of the stratum for the linear pair indices k
+    if not same:
+        return first[k // len(second)], second[k % len(second)]
+    # Pairs i < j of one element, row by row: row r holds the n - 1 - r pairs (r, r + 1...)
+    n = len(first)
+    row_ends = np.cumsum(np.arange(n - 1, 0, -1))
+    rows = np.searchsorted(row_ends, k, side='right')
+    offsets = k - (row_ends[rows] - (n - 1 - rows))
+    return first[rows], first[rows + 1 + offsets]
+
+
+def allocate(sizes, budget, min_stratum):
+    # Number of pairs to sample from each stratum
+    sizes = np.asarray(sizes, dtype=np.int64)
+    share = np.round(budget * sizes / max(sizes.sum(), 1)).astype(np.int64)
+    return np.minimum(sizes, np.maximum(share, min_stratum))
+
+
+def sample_apw_rdf(frac2cart, frac, species, atom_props, bins, smooth, max_pairs, rel_error=None,
+                   min_stratum=32, seed=0, chunk_size=8192):
+    # Estimated (n_props, n_bins) apw_rdf (unnormalised, as rdf_kernels.compute_apw_rdf) and its standard error
+    rng = np.random.default_rng(seed)
+    species = np.asarray(species)
+    strata = [stratum for stratum in pair_strata(species) if stratum_size(*stratum) > 0]
+    sizes = np.array([stratum_size(*stratum) for stratum in strata], dtype=np.int64)
+    weights = np.array([atom_props[first[0]] * atom_props[second[0]] for first, second, _ in strata])
+
+    # Draw the whole budget up front; each round takes a longer prefix of every stratum's sample
+    final = allocate(sizes, max_pairs, min_stratum)
+    drawn = [rng.choice(size, n, replace=False) if n < size else np.arange(size) for size, n in zip(sizes, final)]
+    budgets = [max_pairs >> (n_rounds - 1 - r) for r in range(n_rounds)] if rel_error is not None else [max_pairs]
+
+    n_bins = len(bins)
+    done = np.zeros(len(strata), dtype=np.int64)
+    sum_g = np.zeros((len(strata), n_bins))
+    sum_g2 = np.zeros((len(strata), n_bins))
+    for budget in budgets:
+        target = np.minimum(allocate(sizes, budget, min_stratum), final)
+        for h, (first, second, same) in enumerate(strata):
+            for start in range(done[h], target[h], chunk_size):
+                ii, jj = stratum_pairs(first, second, same, drawn[h][start:min(start + chunk_size, target[h])])
+                dist = min_image_distances(frac2cart, frac[ii], frac[jj])
+                gauss = np.exp(smooth * (bins[None, :] - dist[:, None]) ** 2)
+                sum_g[h] += gauss.sum(axis=0)
+                sum_g2[h] += (gauss * gauss).sum(axis=0)
+        done = np.maximum(done, target)
+
+        n = np.maximum(done, 1)[:, None]
+        mean = sum_g / n
+        var = np.maximum(sum_g2 - n * mean * mean, 0) / np.maximum(n - 1, 1)
+        # Finite population correction: strata summed exactly have no error
+        var_total = sizes[:, None] ** 2 * (1 - done[:, None] / sizes[:, None]) * var / n
+        apw_rdf = weights.T @ (sizes[:, None] * mean)
+        stderr = np.sqrt((weights ** 2).T @ var_total)
+        if rel_error is not None and stderr.max() <= rel_error * np.abs(apw_rdf).max():
+            break
+    return apw_rdf, stderr
+
+
+def compute_aprdf_sampled(cell, frac, species, config=None, max_pairs=100000, rel_error=None, seed=0):
+    # Approximate compute_aprdf from about max_pairs sampled pairs, and the standard error of every value.
+    # Structures with at most max_pairs pairs are computed exactly (with zero error).
+    config = config or default_config
+    n_atoms = len(species)
+    if n_atoms * (n_atoms - 1) // 2 <= max_pairs:
+        apw_rdf = compute_aprdf(cell, frac, species, config)
+        return apw_rdf, np.zeros_like(apw_rdf)
+
+    atom_props = gather(config.prop_table, species)
+    apw_rdf, stderr = sample_apw_rdf(cell, np.asarray(frac, dtype=np.float64), species, atom_props,
+                                     np.asarray(config.bins, dtype=np.float64), config.smooth, max_pairs,
+                                     rel_error, seed=seed)
+    scale = config.factor / n_atoms
+    return np.round(apw_rdf.flatten() * scale, decimals=config.decimals), stderr.flatten() * scale
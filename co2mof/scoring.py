@@ -0,0 +1,87 @@
+"""
+In-process scoring of candidate structures held in memory, for generative and optimisation loops.
+
+BatchScorer takes a batch of (cell, frac, species) structures and returns the predictions of the wc
+and/or Sel models of one feature set, with no cifs or csv files in between. Only the descriptors the
+feature set uses are computed: the AP-RDFs (compute_aprdf_batch for the structures with fewer than
+batch_atoms atoms, compute_aprdf for the others) and the bag-of-atoms (compute_boa_batch). By default
+batch_atoms is 0 when the numba kernel is used, which is faster than the NumPy batch from ~20 atoms
+up, and 200 otherwise (as in calculate_rdfs.py); the Gaussian truncation of the config (gauss_tol,
+e.g. 1e-12) speeds the AP-RDFs up several times more. The descriptors are assembled into the
+columns get_features would select (features.assemble_features) and every model is run on the whole
+batch.
+
+The features are scaled with fixed statistics, e.g. the ScalerStats of the database the candidates
+are compared with (the scaler_file written by load_pytorch.py), since a batch of candidates is too
+small and too alike to fit its own. The geometric descriptors are not computed by this package, so
+the 'geo' feature sets need them for every candidate, and the 'mot' sets are not available.
+"""
+import os
+from time import perf_counter
+
+import numpy as np
+
+from .aprdf import compute_aprdf, compute_aprdf_batch, default_config
+from .artifacts import model_dir
+from .boa import compute_boa_batch
+from .features import assemble_features
+from .predict import Predictor
+from .rdf_kernels import has_numba
+
+
+class BatchScorer:
+    """
+    Predictions of the feature_set models of targets (default: every target with such a model) for
+    batches of structures. timings accumulates the seconds spent on each stage.
+    """
+
+    def __init__(self, feature_set, scaler, targets=None, engine="numpy", config=None, batch_atoms=None):
+        if targets is None:
+            targets = [target for target in ('wc', 'Sel')
+                       if os.path.exists("{}/{}/{}_{}_model.pt".format(model_dir, target, feature_set, target))]
+            if not targets:
+                raise FileNotFoundError("No wc or Sel model for the '{}' feature set".format(feature_set))
+        self.feature_set = feature_set
+        self.scaler = scaler
+        self.config = config or default_config
+        if batch_atoms is None:
+            numba_kernel = self.config.backend == "numba" or (self.config.backend == "auto" and has_numba)
+            batch_atoms = 0 if numba_kernel else 200
+        self.batch_atoms = batch_atoms
+        self.predictors = {target: Predictor(feature_set, target, engine=engine) for target in targets}
+        parts = feature_set.split('+')
+        self.uses_rdf = 'rdf' in parts
+        self.uses_boa = 'boa' in parts
+        self.timings = {'rdf': 0.0, 'boa': 0.0, 'model': 0.0}
+        self.n_scored = 0
+
+    def rdfs(self, structures):
+        small = [k for k, (_, _, species) in enumerate(structures) if len(species) < self.batch_atoms]
+        rdfs = np.empty((len(structures), len(self.config.columns)))
+        if small:
+            rdfs[small] = compute_aprdf_batch([structures[k] for k in small], self.config)
+        for k in sorted(set(range(len(structures))) - set(small)):
+            rdfs[k] = compute_aprdf(*structures[k], self.config)
+        return rdfs
+
+    def features(self, structures, geometric=None):
+        # (n_structures, n_features) model inputs; geometric: (n_structures, 6) in the order of geom_features
+        rdfs = boas = None
+        if self.uses_rdf:
+            start = perf_counter()
+            rdfs = self.rdfs(structures)
+            self.timings['rdf'] += perf_counter() - start
+        if self.uses_boa:
+            start = perf_counter()
+            boas = compute_boa_batch(structures)
+            self.timings['boa'] += perf_counter() - start
+        return assemble_features(self.feature_set, boas, rdfs, geometric, self.config.columns)
+
+    def score(self, structures, geometric=None):
+        # {target: (n_structures,) predictions}
+        features = self.features(structures, geometric)
+        start = perf_counter()
+        predictions = {target: predictor.predict(features, self.scaler) for target, predictor in self.predictors.items()}
+        self.timings['model'] += perf_counter() - start
+        self.n_scored += len(structures)
+        return predictions
@@ -0,0 +1,136 @@
+"""
+Screening mode: keep only the best MOFs of a descriptor csv instead of every prediction.
+
+The csv is streamed in chunks through the models of one or both targets. A bounded min-heap per
+target keeps the k highest predictions seen so far, and optionally the Pareto front of predicted
+wc and Sel (the MOFs no other MOF beats on both) is updated chunk by chunk. Memory and output size
+depend on k (and the size of the front), not on the number of MOFs screened.
+"""
+import csv
+import heapq
+
+import numpy as np
+
+from .features import iter_features
+from .predict import Predictor, ScalerStats
+
+
+class TopK:
+    """The k highest scores pushed so far, with their rows; ties keep the row pushed first."""
+
+    def __init__(self, k):
+        if k < 1:
+            raise ValueError("TopK needs k >= 1, got {}".format(k))
+        self.k = k
+        self._heap = []
+        self._count = 0
+
+    def push(self, scores, record):
+        # scores: (n,) array; record(i) gives the row kept with scores[i], only called for the
+        # rows that enter the heap
+        scores = np.asarray(scores)
+        first = self._count
+        self._count += len(scores)
+
+        candidates = np.flatnonzero(~np.isnan(scores))
+        if len(self._heap) == self.k:
+            candidates = candidates[scores[candidates] > self._heap[0][0]]
+        if len(candidates) > self.k:
+            # Only the k best of the chunk (and rows tied with the k-th) can enter the heap
+            kth = np.partition(scores[candidates], len(candidates) - self.k)[len(candidates) - self.k]
+            candidates = candidates[scores[candidates] >= kth]
+
+        for i in candidates:
+            key = (float(scores[i]), -(first + int(i)))
+            if len(self._heap) < self.k:
+                heapq.heappush(self._heap, key + (record(i),))
+            elif key > self._heap[0][:2]:
+                heapq.heapreplace(self._heap, key + (record(i),))
+
+    def items(self):
+        # (score, row) from the highest score down
+        return [(score, row) for score, _, row in sorted(self._heap, key=lambda item: item[:2], reverse=True)]
+
+
+def pareto_front(points):
+    # Indices of the rows of points (n, 2) not dominated by any other row, i.e. with no other row at
+    # least as high in both columns and higher in one, by decreasing first column. Rows with a NaN
+    # are ignored.
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    valid = np.flatnonzero(~np.isnan(points).any(axis=1))
+    order = valid[np.lexsort((-points[valid, 1], -points[valid, 0]))]
+    if len(order) == 0:
+        return order
+    x, y = points[order, 0], points[order, 1]
+
+    # Sorted by decreasing x (then y), a row is on the front if its y beats every row before it.
+    # Identical rows are adjacent and share the verdict of the first of them.
+    best_before = np.concatenate([[-np.inf], np.maximum.accumulate(y)[:-1]])
+    on_front = y > best_before
+    duplicate = np.concatenate([[False], (x[1:] == x[:-1]) & (y[1:] == y[:-1])])
+    first_of_run = np.maximum.accumulate(np.where(duplicate, 0, np.arange(len(order))))
+    return order[on_front[first_of_run]]
+
+
+class Screen:
+    """
+    Top k MOFs per target, and optionally the wc/Sel Pareto front, over chunks of predictions.
+    Each kept MOF is recorded as (name, {target: prediction}).
+    """
+
+    def __init__(self, targets, k, pareto=False):
+        if pareto and set(targets) != {'wc', 'Sel'}:
+            raise ValueError("The Pareto front needs both the wc and Sel predictions")
+        self.targets = tuple(targets)
+        self.top = {target: TopK(k) for target in self.targets}
+        self.pareto = pareto
+        self._front = []
+        self.n_screened = 0
+
+    def update(self, names, predictions):
+        # predictions: {target: (n,) array} for the n MOFs of names
+        def record(i):
+            return names[i], {target: float(predictions[target][i]) for target in self.targets}
+
+        for target in self.targets:
+            self.top[target].push(predictions[target], record)
+        if self.pareto:
+            # Only the chunk's own front can add to the overall front
+            chunk_front = pareto_front(np.stack([predictions['wc'], predictions['Sel']], axis=1))
+            candidates = self._front + [record(i) for i in chunk_front]
+            points = [(row[1]['wc'], row[1]['Sel']) for row in candidates]
+            self._front = [candidates[i] for i in pareto_front(points)]
+        self.n_screened += len(names)
+
+    def front(self):
+        # Pareto front, by decreasing wc
+        return list(self._front)
+
+    def write(self, rows, path):
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f, lineterminator='\n')
+            writer.writerow(['Unnamed: 0'] + list(self.targets))
+            for name, predictions in rows:
+                writer.writerow([name] + [np.float32(predictions[target]) for target in self.targets])
+
+    def write_top(self, target, path):
+        self.write([row for _, row in self.top[target].items()], path)
+
+    def write_front(self, path):
+        self.write(self.front(), path)
+
+
+def screen_csv(feature_set, descriptor_csv, targets, k, pareto=False, scaler=None, engine="torch",
+               chunk_size=100000, csv_engine="pandas"):
+    # Streams descriptor_csv through the feature_set models of targets and returns the Screen.
+    # Without a scaler the StandardScaler statistics are first computed over the whole csv
+    # (an extra pass), as load_pytorch.py fits them on all the MOFs it predicts.
+    if scaler is None:
+        chunks = iter_features(feature_set, descriptor_csv, chunk_size, csv_engine=csv_engine)
+        scaler = ScalerStats.fit_chunks(features for _, features in chunks)
+    predictors = {target: Predictor(feature_set, target, engine=engine) for target in targets}
+
+    screen = Screen(targets, k, pareto)
+    for names, features in iter_features(feature_set, descriptor_csv, chunk_size, csv_engine=csv_engine):
+        screen.update(names, {target: predictor.predict(features, scaler) for target, predictor in predictors.items()})
+    return screen
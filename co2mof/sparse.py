@@ -0,0 +1,184 @@
+'''
+Compact storage of the bag-of-atoms bags and of descriptor files.
+
+Most of the 216 bags of a MOF hold a few atoms or none, and so most of its bag-of-atoms values are
+0. BagCounts keeps the bags of many MOFs as (bag, element, count) triples of small integers, in
+place of the atom-symbol strings of atom-bins.csv. SparseDescriptors keeps a table of descriptors
+(MOF names, column names and values) in compressed sparse row (CSR) form, storing only the nonzero
+values, in place of a descriptor csv. Both are saved as .npz files. features.iter_features and the
+readers built on it (and so load_pytorch.py) read a SparseDescriptors file as they read a csv,
+densifying only the feature columns of one chunk of MOFs at a time.
+'''
+import numpy as np
+
+from .boa import boa_columns, n_bags, uff_table
+from .element_table import gather
+
+
+def _concat(arrays, dtype):
+    return np.concatenate([np.asarray(a, dtype=dtype).ravel() for a in arrays]) if arrays else np.empty(0, dtype)
+
+
+def _offsets(lengths):
+    indptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=indptr[1:])
+    return indptr
+
+
+class BagCounts:
+    """
+    The bags of many MOFs as the number of atoms of each element in each bag. The triples of MOF k
+    are bags[indptr[k]:indptr[k + 1]] (uint8, the flat bag index of bag_indices), species (uint8,
+    atomic numbers) and counts (uint16); n_atoms is the number of framework atoms of each MOF.
+    """
+
+    def __init__(self, names, n_atoms, indptr, bags, species, counts):
+        self.names = np.asarray(names, dtype=str)
+        self.n_atoms = np.asarray(n_atoms, dtype=np.int64)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.bags = np.asarray(bags, dtype=np.uint8)
+        self.species = np.asarray(species, dtype=np.uint8)
+        self.counts = np.asarray(counts, dtype=np.uint16)
+
+    @classmethod
+    def from_atoms(cls, names, species, bags):
+        # From the atomic numbers and bag indices (bag_indices) of the atoms of every MOF
+        triples = []
+        for mof_species, mof_bags in zip(species, bags):
+            keys = np.asarray(mof_bags, dtype=np.int64) * 256 + np.asarray(mof_species, dtype=np.int64)
+            triples.append(np.unique(keys, return_counts=True))
+        keys = _concat([k for k, _ in triples], np.int64)
+        return cls(names, [len(s) for s in species], _offsets([len(k) for k, _ in triples]),
+                   keys // 256, keys % 256, _concat([c for _, c in triples], np.uint16))
+
+    @classmethod
+    def concat(cls, parts):
+        return cls(_concat([p.names for p in parts], str), _concat([p.n_atoms for p in parts], np.int64),
+                   _offsets(np.concatenate([np.diff(p.indptr) for p in parts])),
+                   _concat([p.bags for p in parts], np.uint8), _concat([p.species for p in parts], np.uint8),
+                   _concat([p.counts for p in parts], np.uint16))
+
+    def __len__(self):
+        return len(self.names)
+
+    def descriptors(self, start=0, stop=None):
+        # compute_boa of MOFs start to stop, (n, 432) in the order of boa_columns
+        stop = len(self) if stop is None else min(stop, len(self))
+        n = max(stop - start, 0)
+        lo, hi = self.indptr[start], self.indptr[start + n]
+        rows = np.repeat(np.arange(n), np.diff(self.indptr[start:start + n + 1]))
+        flat = rows * n_bags ** 3 + self.bags[lo:hi]
+        uff = gather(uff_table(), self.species[lo:hi].astype(np.intp)) * self.counts[lo:hi, None]
+        sums = [np.bincount(flat, weights=uff[:, k], minlength=n * n_bags ** 3).reshape(n, -1) for k in range(2)]
+        return (np.stack(sums, axis=2) / self.n_atoms[start:stop, None, None]).reshape(n, -1)
+
+    def to_descriptors(self, decimals=8, chunk_size=100000):
+        # SparseDescriptors of the bag-of-atoms of every MOF, rounded and with the columns of descriptors.csv
+        # (the 'Unnamed: 0' column of names, as pandas reads it, then boa_columns)
+        columns = ['Unnamed: 0'] + boa_columns
+        chunks = []
+        for k in range(0, len(self), chunk_size):
+            values = np.round(self.descriptors(k, k + chunk_size), decimals)
+            chunks.append(SparseDescriptors.from_dense(self.names[k:k + chunk_size], columns,
+                                                       np.concatenate([np.zeros((len(values), 1)), values], axis=1)))
+        return SparseDescriptors.concat(chunks) if chunks else SparseDescriptors.from_dense(
+            self.names, columns, np.empty((0, len(columns))))
+
+    def save(self, path):
+        np.savez_compressed(path, names=self.names, n_atoms=self.n_atoms, indptr=self.indptr, bags=self.bags,
+                            species=self.species, counts=self.counts)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            return cls(f['names'], f['n_atoms'], f['indptr'], f['bags'], f['species'], f['counts'])
+
+
+class SparseDescriptors:
+    """
+    A descriptor table in CSR form: the nonzero values of row k are data[indptr[k]:indptr[k + 1]],
+    in the columns indices[indptr[k]:indptr[k + 1]]. columns is the csv header as pandas names it;
+    a table with MOF names has an 'Unnamed: 0' column (of zeros) for them, as the csv does, and
+    names is None otherwise. NaN values (empty csv cells) are stored explicitly.
+    """
+
+    def __init__(self, names, columns, indptr, indices, data):
+        self.names = None if names is None else np.asarray(names, dtype=str)
+        self.columns = [str(c) for c in columns]
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.min_scalar_type(max(len(self.columns) - 1, 0)))
+        self.data = np.asarray(data, dtype=np.float64)
+
+    @classmethod
+    def from_dense(cls, names, columns, values):
+        values = np.asarray(values, dtype=np.float64).reshape(-1, len(columns))
+        rows, indices = np.nonzero(values)
+        return cls(names, columns, _offsets(np.bincount(rows, minlength=len(values))), indices, values[rows, indices])
+
+    @classmethod
+    def from_csv(cls, descriptor_csv, chunk_size=100000):
+        # Reads a descriptor csv chunk by chunk. The 'Unnamed: 0' column holds the MOF names; text
+        # in the other columns (e.g. a label column) is stored as NaN.
+        import pandas as pd
+
+        chunks = []
+        for data in pd.read_csv(descriptor_csv, chunksize=chunk_size):
+            names = data.pop('Unnamed: 0').astype(str) if 'Unnamed: 0' in data else None
+            values = data.apply(pd.to_numeric, errors='coerce')
+            columns = (['Unnamed: 0'] if names is not None else []) + list(data.columns)
+            if names is not None:
+                # Kept as a column (of zeros, so not stored) since feature_columns looks it up
+                values.insert(0, 'Unnamed: 0', 0.0)
+            chunks.append(cls.from_dense(names, columns, values.to_numpy(dtype=np.float64)))
+        if not chunks:
+            raise ValueError("{} has no rows".format(descriptor_csv))
+        return cls.concat(chunks)
+
+    @classmethod
+    def concat(cls, parts):
+        # The rows of parts (with the same columns) one after the other
+        names = None if parts[0].names is None else _concat([p.names for p in parts], str)
+        return cls(names, parts[0].columns, _offsets(np.concatenate([np.diff(p.indptr) for p in parts])),
+                   _concat([p.indices for p in parts], np.int64), _concat([p.data for p in parts], np.float64))
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    @property
+    def shape(self):
+        return len(self), len(self.columns)
+
+    def dense(self, start=0, stop=None, positions=None, dtype=np.float64):
+        # Rows start to stop as a dense (n, len(positions)) array of the columns at positions (all by default)
+        stop = len(self) if stop is None else min(stop, len(self))
+        n = max(stop - start, 0)
+        if positions is None:
+            positions = np.arange(len(self.columns))
+        lookup = np.full(len(self.columns), -1, dtype=np.int64)
+        lookup[np.asarray(positions, dtype=np.int64)] = np.arange(len(positions))
+
+        lo, hi = self.indptr[start], self.indptr[start + n]
+        rows = np.repeat(np.arange(n), np.diff(self.indptr[start:start + n + 1]))
+        out_columns = lookup[self.indices[lo:hi]]
+        kept = out_columns >= 0
+        out = np.zeros((n, len(positions)), dtype=dtype)
+        out[rows[kept], out_columns[kept]] = self.data[lo:hi][kept]
+        return out
+
+    def save(self, path):
+        arrays = dict(columns=np.asarray(self.columns, dtype=str), indptr=self.indptr, indices=self.indices,
+                      data=self.data)
+        if self.names is not None:
+            arrays['names'] = self.names
+        np.savez_compressed(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            return cls(f['names'] if 'names' in f else None, f['columns'], f['indptr'], f['indices'], f['data'])
+
+    @staticmethod
+    def load_columns(path):
+        # Only the column names, without reading the values
+        with np.load(path) as f:
+            return [str(c) for c in f['columns']]
@@ -0,0 +1,138 @@
+'''
+Symmetry of a structure, for computing the AP-RDF over the asymmetric unit only.
+
+Cifs of the CoRE/hypothetical databases are usually P1 expansions of higher-symmetry frameworks
+(or supercells of smaller ones). find_symmetry recovers the operations x -> R x + t (in fractional
+coordinates) that map such a structure onto itself, as permutations of its atoms, and orbits groups
+the atoms into the orbits of the group they generate. Since the distance between two atoms and
+their property products are the same for every symmetric copy of the pair, the sum over all pairs
+of the AP-RDF can then be taken over one atom per orbit (see rdf_kernels.py), which is about |G|
+times fewer pairs for a group of |G| operations.
+
+Only the rotations with entries in {-1, 0, 1} in the basis of the cell are tried, which covers every
+point operation of a reduced cell. The atoms must match to within symprec (in A, measured per cell
+axis); the AP-RDF of an approximately symmetric structure is then only approximately the one of the
+full pair sum, so calculate_rdfs.py checks a sample of structures against it.
+
+The AP-RDF distance of a pair is the shortest over the 27 images of rdf_kernels.super_cell, which
+is only the minimum image distance (the one every symmetry operation keeps) when those images hold
+the nearest copy of every atom. In a skewed, unreduced basis they may not, and a symmetric copy of a
+pair can then have another AP-RDF distance; find_symmetry returns only the identity for such cells
+(see super_cell_has_nearest_images), so that the full pair sum is used. The same holds for atoms
+outside [0, 1) in the cif (the AP-RDF sums the coordinates as read, whose differences may then
+exceed one cell): the operations are found on the wrapped coordinates, so find_symmetry only looks
+for them when every coordinate is in [0, 1).
+'''
+from itertools import product
+
+import numpy as np
+
+candidate_rotations = np.array(list(product([-1, 0, 1], repeat=9)), dtype=np.int64).reshape(-1, 3, 3)
+
+
+def wrap(frac):
+    # Fractional coordinates in [0, 1)
+    frac = np.mod(frac, 1.0)
+    frac[frac >= 1.0] = 0.0
+    return frac
+
+
+def lattice_rotations(cell, tol=1e-6):
+    # Integer matrices R (acting on fractional coordinates) that leave the metric of the cell unchanged,
+    # i.e. keep every distance: R^T G R = G with G = cell^T cell
+    metric = cell.T @ cell
+    rotations = candidate_rotations.astype(np.float64)
+    transformed = rotations.transpose(0, 2, 1) @ metric @ rotations
+    keep = np.all(np.abs(transformed - metric) <= tol * np.abs(metric).max(), axis=(1, 2))
+    return candidate_rotations[keep]
+
+
+def super_cell_has_nearest_images(cell, reach=2):
+    # Whether the 27 images of super_cell hold the nearest copy of any atom to any other, for fractional
+    # coordinate differences in (-1, 1). They do if the Voronoi cell of the lattice (the points nearer to
+    # the origin than to any other lattice point) extends at most 1 along every fractional axis. The cell
+    # is bounded here with the lattice points up to reach cells away only, which can only enlarge it.
+    from scipy.optimize import linprog
+
+    metric = cell.T @ cell
+    shifts = np.array([n for n in product(range(-reach, reach + 1), repeat=3) if any(n)], dtype=np.float64)
+    # x is in the Voronoi cell if x.G.n <= n.G.n / 2 for every lattice vector n
+    bounds_a = shifts @ metric
+    bounds_b = np.einsum('ij,jk,ik->i', shifts, metric, shifts) / 2
+    for axis in range(3):
+        objective = np.zeros(3)
+        objective[axis] = -1.0
+        extent = -linprog(objective, A_ub=bounds_a, b_ub=bounds_b, bounds=(None, None)).fun
+        if extent > 1 + 1e-9:
+            return False
+    return True
+
+
+def find_symmetry(cell, frac, species, symprec=1e-3, n_probe=16):
+    # Permutations (n_ops, n_atoms) of the atoms under the operations that map the structure onto
+    # itself, identity included: perms[g, i] is the atom that atom i is moved onto by operation g.
+    # Only the identity if the cell is too skewed, or an atom outside [0, 1), for the AP-RDF distances
+    # to be kept by the operations.
+    # Needs scipy (installed with scikit-learn).
+    from scipy.spatial import cKDTree
+
+    species = np.asarray(species)
+    n_atoms = len(species)
+    frac = np.asarray(frac, dtype=np.float64)
+    if np.any((frac < 0.0) | (frac >= 1.0)) or not super_cell_has_nearest_images(np.asarray(cell, dtype=np.float64)):
+        return np.arange(n_atoms, dtype=np.intp)[None, :]
+    frac = wrap(frac)
+    tol = symprec / np.linalg.norm(cell, axis=0).max()
+
+    # Atoms are points of the periodic unit cube; the species coordinate keeps elements apart
+    points = np.column_stack([frac, species * 10.0])
+    tree = cKDTree(points, boxsize=[1.0, 1.0, 1.0, 10.0 * (species.max() + 2)])
+
+    def match(moved):
+        # Atom at each moved position (n_atoms where there is none)
+        _, found = tree.query(np.column_stack([wrap(moved[:, :3]), moved[:, 3]]),
+                              distance_upper_bound=tol, p=np.inf)
+        return found
+
+    # The operations are found from the images of an atom of the least common element, which can
+    # only land on atoms of the same element; a few probe atoms weed out most candidates cheaply
+    elements, counts = np.unique(species, return_counts=True)
+    reference = np.flatnonzero(species == elements[np.argmin(counts)])
+    probes = np.unique(np.linspace(0, n_atoms - 1, min(n_probe, n_atoms)).astype(np.intp))
+
+    perms = []
+    for rotation in lattice_rotations(cell):
+        rotated = frac @ rotation.T
+        translations = frac[reference] - rotated[reference[0]]
+        for i in probes:
+            found = match(np.column_stack([rotated[i] + translations, np.full(len(translations), points[i, 3])]))
+            translations = translations[found < n_atoms]
+        for translation in translations:
+            perm = match(np.column_stack([rotated + translation, points[:, 3]]))
+            if np.all(perm < n_atoms) and len(np.unique(perm)) == n_atoms:
+                perms.append(perm)
+    return np.array(perms, dtype=np.intp).reshape(-1, n_atoms)
+
+
+def orbits(perms):
+    # Orbit label of every atom (the lowest index in its orbit) under the group the permutations generate
+    n_atoms = perms.shape[1]
+    label = np.arange(n_atoms)
+    while True:
+        previous = label.copy()
+        for perm in perms:
+            np.minimum.at(label, perm, label)
+            label = np.minimum(label, label[perm])
+        label = label[label]
+        if np.array_equal(label, previous):
+            return label
+
+
+def asymmetric_unit(cell, frac, species, symprec=1e-3):
+    # Atom order that makes every orbit contiguous, and for each orbit the position of its first
+    # atom in that order (its representative), the end of the orbit and its size
+    label = orbits(find_symmetry(cell, frac, species, symprec))
+    order = np.argsort(label, kind='stable')
+    starts = np.flatnonzero(np.r_[True, label[order][1:] != label[order][:-1]])
+    ends = np.r_[starts[1:], len(order)]
+    return order, starts, ends, ends - starts
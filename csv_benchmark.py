@@ -0,0 +1,81 @@
+"""
+Load time and peak memory of the ways load_pytorch.py can read a descriptor csv.
+
+Reads descriptor_csv with every reader load_pytorch.py uses, each in a fresh process so that their
+peak memory (the growth of the process's maximum resident set size while reading) can be told
+apart:
+    pandas:        pd.read_csv of the whole file and get_features (the default)
+    pandas chunks: read_features_into with pandas, chunk_size rows at a time (zero_copy = True)
+    arrow:         read_features_into with the pyarrow reader of co2mof/csv_reader.py (arrow_csv = True)
+and reports the largest difference of the features from those of the default reader (the arrow
+reader parses the descriptors as float32).
+
+For instructions on using this code, please read the corresponding README.
+"""
+import os
+import resource
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from datetime import datetime
+
+import numpy as np
+
+########################### USER MUST DEFINE THESE ###########################
+
+# Descriptor csv laid out as described in the README, and the feature set to read from it
+descriptor_csv = 'New_Clean_Stats_3.csv'
+Feature_Set = 'geo+rdf+boa'
+
+# Rows per chunk of the chunked readers, as in load_pytorch.py
+chunk_size = 100000
+
+# Rows of the features kept to compare the readers
+n_compared = 1000
+
+###############################################################################
+
+readers = ("pandas", "pandas chunks", "arrow")
+
+
+def max_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def read(reader, csv_path):
+    # Runs in its own process: returns the load time, peak memory growth, shape and every k-th row of the features
+    import pandas as pd
+    from co2mof.features import get_features, read_features_into
+    import co2mof.csv_reader  # noqa: F401 (imported here so that its import is not timed)
+
+    baseline = max_rss_mb()
+    start = perf_counter()
+    if reader == "pandas":
+        features = get_features(Feature_Set, pd.read_csv(csv_path), verbose=False).to_numpy()
+    else:
+        _, features, _ = read_features_into(Feature_Set, csv_path, chunk_size,
+                                            csv_engine="arrow" if reader == "arrow" else "pandas")
+    elapsed = perf_counter() - start
+    step = max(len(features) // n_compared, 1)
+    return elapsed, max_rss_mb() - baseline, features.shape, np.asarray(features[::step], dtype=np.float64)
+
+
+if __name__ == "__main__":
+
+    print("Start: ", datetime.now().strftime("%c"))
+    csv_path = '{}/{}'.format(os.path.dirname(os.path.realpath(__file__)), descriptor_csv)
+    print("{} ({:.0f} MB), '{}' features, {} CPUs".format(descriptor_csv, os.path.getsize(csv_path) / 2 ** 20,
+                                                          Feature_Set, os.cpu_count()))
+
+    results = {}
+    for reader in readers:
+        with ProcessPoolExecutor(1, mp_context=mp.get_context("spawn")) as pool:
+            results[reader] = pool.submit(read, reader, csv_path).result()
+
+    reference = results["pandas"][3]
+    print("\n{:>14} {:>10} {:>16} {:>14}".format("reader", "load s", "peak memory MB", "max |diff|"))
+    for reader, (elapsed, memory, shape, sample) in results.items():
+        print("{:>14} {:>10.2f} {:>16.0f} {:>14.2e}".format(reader, elapsed, memory, np.nanmax(np.abs(sample - reference))))
+    print("\n{} MOFs, {} features".format(*shape))
+
+    print("\nEnd: ", datetime.now().strftime("%c"))
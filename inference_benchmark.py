@@ -0,0 +1,80 @@
+"""
+Throughput of the shipped wc/ and Sel/ models on this machine.
+
+For every model, predicts n_rows MOFs once the way load_pytorch.py does (one call on the whole
+array, with torch's default threading) and once with the batched thread-pool engine of
+co2mof/inference.py, with the batch size, torch threads and number of workers picked by its autotune,
+and reports both in rows/s. The features are the matching columns of descriptor_csv, repeated up
+to n_rows, or random values if no csv is given.
+
+For instructions on using this code, please read the corresponding README.
+"""
+import os
+import glob
+from time import perf_counter
+from datetime import datetime
+
+import numpy as np
+
+from co2mof.artifacts import model_dir
+from co2mof.features import read_features
+from co2mof.inference import InferenceEngine
+from co2mof.predict import Predictor, ScalerStats
+
+########################### USER MUST DEFINE THESE ###########################
+
+# Optional csv with descriptors, laid out as required by load_pytorch.py. None uses random features.
+descriptor_csv = None
+
+# Number of MOFs to predict per model
+n_rows = 100000
+
+# "torch" (as load_pytorch.py) or "numpy" (as load_pytorch.py with fast_start = True)
+engine = "torch"
+
+###############################################################################
+
+
+def benchmark_features(feature_set, n_features):
+    if descriptor_csv is None:
+        return np.random.default_rng(0).standard_normal((n_rows, n_features))
+    _, features = read_features(feature_set, descriptor_csv, verbose=False)
+    return np.resize(features, (n_rows, features.shape[1]))
+
+
+if __name__ == "__main__":
+
+    print("Start: ", datetime.now().strftime("%c"))
+    if engine != "numpy":
+        # As load_pytorch.py with tuned_inference: the engine spreads the batches over its own thread pool
+        import torch
+        torch.set_num_interop_threads(1)
+    print("{} rows per model, {} engine, {} CPUs\n".format(n_rows, engine, os.cpu_count()))
+    print("{:<6} {:<12} {:>8} {:>14} {:>14}   {}".format("target", "features", "inputs", "default rows/s",
+                                                     "engine rows/s", "batch size, threads, workers"))
+
+    for target in ('wc', 'Sel'):
+        for path in sorted(glob.glob('{}/{}/*_{}_model.pt'.format(model_dir, target, target))):
+            feature_set = os.path.basename(path)[:-len('_{}_model.pt'.format(target))]
+            predictor = Predictor(feature_set, target, 'cpu', engine=engine)
+            features = benchmark_features(feature_set, predictor.n_features)
+            scaler = ScalerStats.fit(features)
+
+            start = perf_counter()
+            default = predictor.predict(features, scaler)
+            default_time = perf_counter() - start
+
+            tuned = InferenceEngine.autotuned(predictor, scaler.transform(features[:8192]))
+            start = perf_counter()
+            batched = tuned.predict(features, scaler)
+            tuned_time = perf_counter() - start
+            tuned.close()
+
+            if not np.allclose(batched, default, rtol=1e-5, atol=1e-6):
+                print("Warning: the engine's predictions differ from the default ones by up to {:.3e}".format(
+                    np.abs(batched - default).max()))
+            print("{:<6} {:<12} {:>8} {:>14.0f} {:>14.0f}   {}, {}, {}".format(
+                target, feature_set, predictor.n_features, n_rows / default_time, n_rows / tuned_time,
+                tuned.batch_size, tuned.n_threads, tuned.n_workers))
+
+    print("\nEnd: ", datetime.now().strftime("%c"))
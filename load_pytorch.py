@@ -8,129 +8,16 @@ For instructions on using this code, please read the corresponding README.
 
 """
 
-import torch
 import warnings
 import sys
 import os.path
+import csv
 import numpy as np
-import torch.nn as nn
-import torch.nn.functional as F
-import pandas as pd
-from sklearn.preprocessing import StandardScaler
 from datetime import datetime
 
-# Class for 3-layer models
-class Net3(nn.Module):
-    
-    def __init__(self):
-        super(Net3, self).__init__()
-
-    #forward function applies activation function
-    #to input and sends it to output (x is input tensor)
-    def forward(self, x):
-        if device == 'cuda:0':
-            x.cuda(device)
-        x = self.dropout(F.relu(self.hidden1(x)))
-        x = self.dropout(F.relu(self.hidden2(x)))
-        x = self.dropout(F.relu(self.hidden3(x)))
-        x = F.relu(self.output(x))
-        return x
-        
-# Class for 2-layer models
-class Net2(nn.Module):
-    
-    def __init__(self):
-        super(Net2, self).__init__()
-        
-    #forward function applies activation function
-    #to input and sends it to output (x is input tensor)
-    def forward(self, x):
-        if device == 'cuda:0':
-            x.cuda(device)
-        x = self.dropout(F.relu(self.hidden1(x)))
-        x = self.dropout(F.relu(self.hidden2(x)))
-        x = F.relu(self.output(x))
-        return x
-
-def get_features(feature_set, data):
-
-    geom_features = ["CO2_Surf_m2/g", "CO2_VFrac", "Pore_1", "CO2_Surf_m2/cm3", "dense", "Pore_3"]
-    data = data.drop(['motif_furan', 'motif_pyrrole', 'motif_thiophene', 'motif_PO3'], axis=1)
-
-    # Geometric
-    if feature_set == 'geo': 
-        Features = data[geom_features]
-        print("\n\tFeature/Descriptor set:  Geometric {} features".format(Features.shape[1]))
-
-    # Bag of Atoms + Geometric + APW-RDF
-    elif feature_set == 'geo+rdf+boa':
-        Features = data.drop(['wc', 'Unnamed: 0', 'Sel', 'label'], axis=1)
-        Features = Features.drop(data.filter(like='motif'),axis=1)
-        print("\n\tFeature/Descriptor set:  Geometric + APW-RDF + Bag of Atoms {} features".format(Features.shape[1]))
-
-    # Bag of Atoms + APW-RDF
-    elif feature_set == 'rdf+boa':
-        Features = data.drop(['wc', 'Unnamed: 0', 'Sel', 'label'], axis=1)
-        Features = Features.drop(geom_features, axis=1)
-        Features = Features.drop(data.filter(like='motif'), axis=1)
-        print("\n\tFeature/Descriptor set:  Bag of Atoms + APW-RDF {} features".format(Features.shape[1]))
-
-    # Bag of Atoms + Geometric
-    elif feature_set == 'geo+boa':
-        Features = data.filter(like='epsilon')
-        Features = pd.concat([Features,data.filter(like='sigma')], axis=1)
-        Features = pd.concat([Features,data[geom_features]], axis=1)
-        print("\n\tFeature/Descriptor set:  Bag of Atoms + Geometric {} features".format(Features.shape[1]))
-        
-    # Bag of Atoms only
-    elif feature_set == 'boa':
-        Features = data.filter(like='epsilon')
-        Features = pd.concat([Features,data.filter(like='sigma')], axis=1)
-        print("\n\tFeature/Descriptor set:  Bag of Atoms {} features".format(Features.shape[1]))
-        
-    # APW-RDF only
-    elif feature_set == 'rdf':
-        Features = data.filter(like='RDF')
-        print("\n\tFeature/Descriptor set:  APW-RDF {} features".format(Features.shape[1]))
-        
-    # APW-RDF + Geometric
-    elif feature_set == 'geo+rdf':
-        Features = data.filter(like='RDF')
-        Features = pd.concat([Features,data[geom_features]], axis=1)
-        print("\n\tFeature/Descriptor set:  Geometric + APW-RDF {} features".format(Features.shape[1]))
-
-    # Chemical Motifs only
-    elif feature_set == 'mot':
-        Features = data.filter(like='motif')
-        print("\n\tFeature/Descriptor set: Chemical Motifs {} features".format(Features.shape[1]))
-
-    # Chemical Motifs + Geometric
-    elif feature_set == 'geo+mot':
-        Features = data.filter(like='motif')
-        Features = pd.concat([Features,data[geom_features]], axis=1)
-        print("\n\tFeature/Descriptor set: Chemical Motifs + Geometric {} features".format(Features.shape[1]))
-        
-    # Chemical Motifs + Geometric + Bag of Atoms
-    elif feature_set == 'geo+mot+boa':
-        Features = data.filter(like='motif')
-        Features = pd.concat([Features,data[geom_features]], axis=1)
-        Features = pd.concat([Features,data.filter(like='sigma')], axis=1)
-        Features = pd.concat([Features,data.filter(like='epsilon')], axis=1)
-        print("\n\tFeature/Descriptor set: Chemical Motifs + Geometric + Bag of Atoms {} features".format(Features.shape[1]))
-        
-    # Chemical Motifs + Geometric + RDF
-    elif feature_set == 'geo+mot+rdf':
-        Features = data.filter(like='motif')
-        Features = pd.concat([Features,data[geom_features]], axis=1)
-        Features = pd.concat([Features,data.filter(like='RDF')], axis=1)
-        print("\n\tFeature/Descriptor set: Chemical Motifs + Geometric + APW-RDF {} features".format(Features.shape[1]))
-
-    # No valid feature set
-    else:
-        print("\n\tInvalid Feature_Set defined")
-        sys.exit()
-
-    return Features
+# pandas, torch and sklearn are imported below only when needed, since importing them takes seconds
+from co2mof.features import feature_sets, is_sparse, print_description, read_features, read_features_into
+from co2mof.predict import Predictor, ScalerStats, fit_scaler
 
 
 ####################User needs to define these parameters#######################
@@ -154,69 +41,219 @@ Feature_Set = 'rdf+boa'
 # Sel: CO2/N2 Selectivity (note: the 's' is capitalized)
 target = 'wc'
 
-# Name of the csv file containing the descriptors
+# Name of the csv file containing the descriptors. A compact .npz descriptor file (co2mof/sparse.py, e.g. the
+# descriptors.npz of gen-bag-of-atoms.py or SparseDescriptors.from_csv(csv).save(file)) can be given instead;
+# with zero_copy or top_k, its feature columns are densified chunk_size MOFs at a time
 descriptor_csv = 'New_Clean_Stats_3.csv'
 
+# Fast start for small csv files: read the csv without pandas and run the model with NumPy, from a copy
+# of its weights cached in .model_cache/ (made with PyTorch the first time a model is used)
+fast_start = False
+
+# File (.npz) with the mean and standard deviation to scale the features with. If it exists, it is used
+# instead of fitting a StandardScaler on the csv; if not, the scaler fitted on the csv is saved to it, so
+# that later (e.g. smaller) csv files are scaled the same way. None always fits on the csv.
+scaler_file = None
+
+# Use the int8 (dynamically quantized) versions of the models, made by quantize_models.py or on first use.
+# Faster on CPU but less accurate: the predictions can differ by up to about 6% of the range of a model (5.7 for
+# Sel geo+rdf), and by several times their value for near-zero working capacities (see the README; quantize_models.py
+# reports the error on your csv). Meant for a first pass, not a final ranking. Takes precedence over fast_start for
+# the model, which then needs PyTorch.
+quantized = False
+
+# Predict in batches on a thread pool, with the batch size and number of threads picked by a quick autotune
+# (see co2mof/inference.py), instead of in one call on the whole csv. Worth it for large csv files.
+tuned_inference = False
+
+# Read the descriptors in chunks of chunk_size MOFs straight into one float32 array, scale it in place and
+# predict from it without further copies, which uses several times less memory than the default for large csv files
+zero_copy = False
+chunk_size = 100000
+
+# Parse the csv with the multi-threaded pyarrow reader (pip install pyarrow; see co2mof/csv_reader.py) instead of
+# pandas: only the feature columns are converted, to fixed types (float32 descriptors, uint8 motifs), and the
+# columns are checked to be in the order described in the README. Used by the default, zero_copy and top_k modes.
+arrow_csv = False
+
+# Predict each distinct row of descriptors once, copying the prediction to the MOFs with identical descriptors
+# (e.g. duplicate structures under different names)
+dedup = False
+
+# SQLite file (e.g. 'predictions.sqlite') caching the predictions between runs, so that MOFs predicted before with
+# the same model and scaling (use scaler_file) are not predicted again; at most cache_max_entries predictions are
+# kept, dropping the least recently used. None turns the cache off.
+prediction_cache = None
+cache_max_entries = 10000000
+
+# Screening mode: stream the csv in chunks of chunk_size MOFs and only keep the top_k MOFs with the highest
+# predicted target, written with their predictions to CO2WorkingCapacityTop.csv or CO2N2SelectivityTop.csv.
+# None predicts and writes every MOF.
+top_k = None
+
+# In screening mode, keep the top_k MOFs of both wc and Sel and also write the Pareto front of the predicted
+# wc and Sel (the MOFs no other MOF beats on both) to ParetoFront_wc_Sel.csv. Needs wc and Sel models for Feature_Set.
+pareto = False
+
 ################################################################################
 
-#ignore warning about .as_matrix() discontinuation in future versions
-warnings.filterwarnings("ignore")
-
-start_time = datetime.now()
-print("Start: ",start_time.strftime("%c"))
-
-# If CUDA device is available, then use it, otherwise use CPU
-use_cuda = torch.cuda.is_available()
-device = torch.device('cuda:0' if use_cuda else 'cpu')
-print("Device: ", device)
-
-# Process input
-print("\n\tReading in data... This may take a few minutes depending on your device and the size of your CSV file.")
-data = pd.read_csv('{}/{}'.format(os.path.dirname(os.path.realpath(__file__)), descriptor_csv))
-try:
-    MOFs = data['Unnamed: 0']
-except KeyError:
-    pass
-
-# Get the descriptors according to the desired Feature_Set
-Features = get_features(Feature_Set, data)
-# Scale the features using StandardScaler
-scaler = StandardScaler().fit(Features)
-Features = scaler.transform(Features)
-
-# Convert arrays of data to tensors
-Features = torch.from_numpy(Features).float()
-Features = Features.to(device)
-
-# Load the model corresponding to given target and descriptor set
-print("\n\tLoading in PyTorch model...")
-if target == 'wc':
-    model = torch.load('{}/wc/{}_wc_model.pt'.format(os.path.dirname(os.path.realpath(__file__)),Feature_Set), map_location=torch.device(device))
-    results_filename = 'CO2WorkingCapacityPredictions.csv'
-elif target == 'Sel':
-    model = torch.load('{}/Sel/{}_Sel_model.pt'.format(os.path.dirname(os.path.realpath(__file__)),Feature_Set), map_location=torch.device(device))
-    results_filename = 'CO2N2SelectivityPredictions.csv'
-else:
-    print("Invalid selection of target property... exiting.")
-    sys.exit()
-model.eval()
-
-print("\n\tMaking predictions on the dataset...")
-y_predict = model(Features)
-y_predict = y_predict.to('cpu').detach().numpy()
-y_predict = [val for sublist in y_predict for val in sublist]
-results = pd.DataFrame()
-results['Predictions'] = y_predict
-
-try:
-    results.index = [MOFs]
-except:
-    pass
-
-print("\n\tPreparing the CSV file with results...")
-results.to_csv('{}/{}'.format(os.path.dirname(os.path.realpath(__file__)), results_filename))
-print("\nSuccessful termination.")
-end_time = datetime.now()
-elapsed_time = end_time - start_time
-print("End:",end_time.strftime("%c"))
-print("Total time: {0:.1f} s".format(elapsed_time.total_seconds()))
+csv_engine = "arrow" if arrow_csv else "pandas"
+results_filenames = {'wc': 'CO2WorkingCapacityPredictions.csv', 'Sel': 'CO2N2SelectivityPredictions.csv'}
+top_filenames = {'wc': 'CO2WorkingCapacityTop.csv', 'Sel': 'CO2N2SelectivityTop.csv'}
+pareto_filename = 'ParetoFront_wc_Sel.csv'
+
+def run_screening(csv_path, model_engine):
+    from co2mof.features import iter_features
+    from co2mof.screening import screen_csv
+
+    targets = ('wc', 'Sel') if pareto else (target,)
+    if scaler_file and os.path.exists(scaler_file):
+        scaler = ScalerStats.load(scaler_file)
+    else:
+        print("\n\tComputing the scaling statistics over the dataset...")
+        chunks = iter_features(Feature_Set, csv_path, chunk_size, csv_engine=csv_engine)
+        scaler = ScalerStats.fit_chunks(features for _, features in chunks)
+        if scaler_file:
+            scaler.save(scaler_file)
+
+    print("\n\tScreening the dataset for the top {} MOFs by {}...".format(top_k, " and ".join(targets)))
+    screen = screen_csv(Feature_Set, csv_path, targets, top_k, pareto, scaler, model_engine, chunk_size, csv_engine)
+    print("\t{} MOFs screened".format(screen.n_screened))
+
+    print("\n\tPreparing the CSV files with results...")
+    directory = os.path.dirname(os.path.realpath(__file__))
+    for t in targets:
+        screen.write_top(t, '{}/{}'.format(directory, top_filenames[t]))
+    if pareto:
+        screen.write_front('{}/{}'.format(directory, pareto_filename))
+        print("\t{} MOFs on the Pareto front".format(len(screen.front())))
+
+if __name__ == "__main__":
+
+    #ignore warning about .as_matrix() discontinuation in future versions
+    warnings.filterwarnings("ignore")
+
+    start_time = datetime.now()
+    print("Start: ",start_time.strftime("%c"))
+
+    model_engine = "int8" if quantized else "numpy" if fast_start else "torch"
+    if model_engine == "torch":
+        from co2mof.model import device
+        print("Device: ", device)
+    else:
+        print("Device:  cpu ({})".format("int8" if quantized else "NumPy"))
+    if tuned_inference and model_engine != "numpy":
+        # The tuned engine spreads the batches over its own thread pool, so torch's inter-op pool is kept to one
+        # thread (this can only be set before torch starts any inter-op work)
+        import torch
+        torch.set_num_interop_threads(1)
+    if not fast_start:
+        import pandas as pd
+
+    # Process input
+    print("\n\tReading in data... This may take a few minutes depending on your device and the size of your CSV file.")
+    csv_path = '{}/{}'.format(os.path.dirname(os.path.realpath(__file__)), descriptor_csv)
+    if top_k:
+        if Feature_Set not in feature_sets:
+            print("\n\tInvalid Feature_Set defined")
+            sys.exit()
+        if target not in results_filenames:
+            print("Invalid selection of target property... exiting.")
+            sys.exit()
+        run_screening(csv_path, model_engine)
+    else:
+        MOFs = None
+        try:
+            # Get the descriptors according to the desired Feature_Set
+            if zero_copy:
+                fit = not (scaler_file and os.path.exists(scaler_file))
+                MOFs, Features, fitted_scaler = read_features_into(Feature_Set, csv_path, chunk_size, fit=fit,
+                                                                   csv_engine=csv_engine)
+                print_description(Feature_Set, Features.shape[1])
+            elif fast_start or is_sparse(csv_path):
+                MOFs, Features = read_features(Feature_Set, csv_path)
+            elif arrow_csv:
+                MOFs, Features, _ = read_features_into(Feature_Set, csv_path, chunk_size, csv_engine=csv_engine)
+                print_description(Feature_Set, Features.shape[1])
+            else:
+                from co2mof.features import get_features
+                data = pd.read_csv(csv_path)
+                if 'Unnamed: 0' in data:
+                    MOFs = data['Unnamed: 0']
+                Features = get_features(Feature_Set, data).to_numpy()
+        except ValueError as e:
+            print("\n\t{}".format(e) if Feature_Set in feature_sets else "\n\tInvalid Feature_Set defined")
+            sys.exit()
+
+        # Load the model corresponding to given target and descriptor set
+        print("\n\tLoading in PyTorch model...")
+        if target not in results_filenames:
+            print("Invalid selection of target property... exiting.")
+            sys.exit()
+        predictor = Predictor(Feature_Set, target, engine=model_engine)
+        results_filename = results_filenames[target]
+
+        # Scale the features using StandardScaler and make the predictions
+        print("\n\tMaking predictions on the dataset...")
+        if scaler_file and os.path.exists(scaler_file):
+            scaler = ScalerStats.load(scaler_file)
+        else:
+            if zero_copy:
+                scaler = fitted_scaler
+            else:
+                scaler = ScalerStats.fit(Features) if fast_start else fit_scaler(Features)
+            if scaler_file:
+                ScalerStats.from_scaler(scaler).save(scaler_file)
+        if zero_copy:
+            # Scale the float32 features in place and predict from them without copies
+            Features = scaler.transform_in_place(Features)
+        if tuned_inference:
+            from co2mof.inference import InferenceEngine
+            sample = Features[:8192] if zero_copy else scaler.transform(Features[:8192])
+            engine = InferenceEngine.autotuned(predictor, sample)
+            print("\tBatch size: {}, threads: {}, workers: {}".format(engine.batch_size, engine.n_threads, engine.n_workers))
+            run_model = engine.run if zero_copy else lambda x: engine.predict(x, scaler)
+        elif zero_copy:
+            run_model = predictor.predict_scaled
+        else:
+            run_model = lambda x: predictor.predict(x, scaler)
+
+        if dedup:
+            # Predict every distinct descriptor row once and copy the prediction to its duplicates
+            run_unique = run_model
+            def run_model(x):
+                unique, inverse = np.unique(x, axis=0, return_inverse=True)
+                print("\t{} MOFs, {} distinct descriptor rows".format(len(x), len(unique)))
+                return run_unique(np.ascontiguousarray(unique))[inverse.ravel()]
+
+        if prediction_cache:
+            from co2mof.prediction_cache import PredictionCache, model_key
+            cache = PredictionCache(prediction_cache, cache_max_entries)
+            key = model_key(Feature_Set, target, model_engine, scaler, "zero_copy" if zero_copy else "")
+            y_predict = cache.predict(key, Features, lambda rows: run_model(Features[rows]))
+            print("\t{} predictions found in the cache, {} computed".format(cache.n_hits, cache.n_misses))
+            cache.close()
+        else:
+            y_predict = run_model(Features)
+        if tuned_inference:
+            engine.close()
+
+        print("\n\tPreparing the CSV file with results...")
+        results_path = '{}/{}'.format(os.path.dirname(os.path.realpath(__file__)), results_filename)
+        if fast_start or zero_copy or arrow_csv or is_sparse(csv_path):
+            # Same layout as the DataFrame.to_csv below
+            with open(results_path, 'w', newline='') as f:
+                writer = csv.writer(f, lineterminator='\n')
+                writer.writerow(['Unnamed: 0' if MOFs is not None else '', 'Predictions'])
+                writer.writerows(zip(MOFs if MOFs is not None else range(len(y_predict)), y_predict))
+        else:
+            results = pd.DataFrame()
+            results['Predictions'] = y_predict
+            if MOFs is not None:
+                results.index = [MOFs]
+            results.to_csv(results_path)
+    print("\nSuccessful termination.")
+    end_time = datetime.now()
+    elapsed_time = end_time - start_time
+    print("End:",end_time.strftime("%c"))
+    print("Total time: {0:.1f} s".format(elapsed_time.total_seconds()))
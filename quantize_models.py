@@ -0,0 +1,71 @@
+"""
+Makes the dynamically quantized (int8) versions of the models in wc/ and Sel/ and reports how they
+compare with the float32 models.
+
+Every model is quantized with co2mof/quantize.py and saved in the model cache (.model_cache/, see
+the README), where load_pytorch.py picks it up when quantized = True. For each model the script
+then predicts the MOFs of descriptor_csv with both versions and reports the mean and largest
+absolute difference and the Spearman rank correlation between them (the features are standardised
+as in load_pytorch.py), followed by the throughput of both versions in rows/s on n_rows MOFs.
+
+For instructions on using this code, please read the corresponding README.
+"""
+import os
+import glob
+from time import perf_counter
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from co2mof.features import read_features
+from co2mof.model import model_dir
+from co2mof.predict import Predictor, ScalerStats
+from co2mof.quantize import export_quantized
+
+########################### USER MUST DEFINE THESE ###########################
+
+# Reference csv with descriptors, laid out as required by load_pytorch.py
+descriptor_csv = 'New_Clean_Stats_3.csv'
+
+# Number of MOFs (the rows of descriptor_csv repeated) used to measure the throughput
+n_rows = 100000
+
+###############################################################################
+
+
+def rows_per_s(predictor, features, scaler):
+    predictor.predict(features[:1000], scaler)
+    start = perf_counter()
+    predictor.predict(features, scaler)
+    return len(features) / (perf_counter() - start)
+
+
+if __name__ == "__main__":
+
+    print("Start: ", datetime.now().strftime("%c"))
+    csv_path = '{}/{}'.format(os.path.dirname(os.path.realpath(__file__)), descriptor_csv)
+    print("Reference descriptors: {}, throughput on {} rows\n".format(csv_path, n_rows))
+    print("{:<6} {:<12} {:>10} {:>10} {:>10} {:>14} {:>14}".format(
+        "target", "features", "MAE", "max |dy|", "Spearman", "fp32 rows/s", "int8 rows/s"))
+
+    for target in ('wc', 'Sel'):
+        for path in sorted(glob.glob('{}/{}/*_{}_model.pt'.format(model_dir, target, target))):
+            feature_set = os.path.basename(path)[:-len('_{}_model.pt'.format(target))]
+            export_quantized(feature_set, target)
+            fp32 = Predictor(feature_set, target, 'cpu')
+            int8 = Predictor(feature_set, target, engine="int8")
+
+            _, features = read_features(feature_set, csv_path, verbose=False)
+            scaler = ScalerStats.fit(features)
+            y32 = fp32.predict(features, scaler)
+            y8 = int8.predict(features, scaler)
+            diff = np.abs(y8.astype(np.float64) - y32)
+            spearman = pd.Series(y32).corr(pd.Series(y8), method='spearman')
+
+            features = np.resize(features, (n_rows, features.shape[1]))
+            print("{:<6} {:<12} {:>10.4f} {:>10.4f} {:>10.5f} {:>14.0f} {:>14.0f}".format(
+                target, feature_set, diff.mean(), diff.max(), spearman,
+                rows_per_s(fp32, features, scaler), rows_per_s(int8, features, scaler)))
+
+    print("\nEnd: ", datetime.now().strftime("%c"))
@@ -0,0 +1,541 @@
+"""
+Regression check of the descriptors and predictions against stored golden outputs.
+
+The golden outputs (golden_dir) are a set of structures, written as cifs to golden_dir/cifs, and
+their reference descriptors and predictions in golden_dir/golden.npz, made by the original code paths:
+    AP-RDFs:   calculate_rdfs.main of CalculateRDFs/calculate_rdfs.py, with the "reference" backend
+               (the original pair-by-pair loop) and the settings of the shipped models
+    BOA:       bag-of-atoms.py then gen-bag-of-atoms.py of CalculateBOAs/, run on a copy of the cifs
+               whose atoms are all in the cell (the scripts take no others); the cifs end with a bond
+               loop as the CoRE cifs do, so that the scripts of the original repository also run on them
+               (and give the same values)
+    geometry:  the geometric descriptors of calculate_rdfs.py (Pore_3, which is not estimated, is
+               taken equal to Pore_1; the values only serve as model inputs here)
+    models:    the PyTorch models in wc/ and Sel/ that need no chemical motifs, on the features of the
+               reference descriptors scaled with statistics fitted on them (stored too)
+Only the AP-RDFs are checked for the structures with atoms outside the cell; everything else is checked
+on the others.
+The structures are synthetic (random cells, atoms on the bag edges, every element with all the
+properties, a cubic framework and a supercell for the symmetry reduction, and cubic frameworks in a
+skewed basis and with atoms outside [0, 1) where it must not be used) plus any cifs in src.
+
+Every other way of computing the same values (backends, Gaussian truncation, float32, batched,
+symmetry-reduced, sampled and incremental AP-RDFs; batched and compact bag-of-atoms; the csv readers;
+the model engines and BatchScorer) is then compared with them, column by column: a value passes if it
+is within atol + rtol * (largest |reference| of its column), with (atol, rtol) from tolerances below
+(the sampled AP-RDFs are allowed n_stderr standard errors, and the int8 models int8_range times the
+range of the reference predictions of each model).
+Checks whose optional package (numba, scipy, pyarrow, torch) is missing are skipped. The script exits
+with status 1 if any check fails.
+
+For instructions on using this code, please read the corresponding README.
+"""
+import os
+import sys
+import csv
+import shutil
+import tempfile
+import subprocess
+import importlib.util
+from glob import glob
+from itertools import permutations, product
+from dataclasses import replace
+from datetime import datetime
+
+import numpy as np
+
+from co2mof import RDFConfig, boa_columns, cell_matrix, compute_aprdf, compute_aprdf_batch, compute_boa, compute_boa_batch, \
+    read_cif, read_cif_atoms, to_species
+from co2mof.boa import bag_edges, bag_indices
+from co2mof.features import assemble_features, dropped_motifs, geom_features, read_features
+from co2mof.rdf_kernels import has_numba
+
+########################### USER MUST DEFINE THESE ###########################
+
+# Directory of the golden outputs: the structures (cifs/) and their reference descriptors and predictions (golden.npz)
+golden_dir = 'regression'
+
+# Write the golden outputs instead of checking against them (also: python regression_check.py --update): the synthetic
+# structures and the cifs in src are written to golden_dir/cifs and their references computed with the original code
+# paths, replacing golden.npz. Only do this when the descriptors or models are meant to change.
+update = False
+
+# Directory of cifs of your own (e.g. a few CoRE MOFs) to add to the synthetic structures on update, or None
+src = None
+
+# Also recompute the references with the original code paths on every check (the reference backend takes a few
+# seconds for the bundled structures) and compare them with the stored ones
+check_reference = True
+
+# Pair budget of the sampled AP-RDFs (structures with more pairs are sampled) and the number of standard errors
+# their values may be from the reference
+sample_pairs = 2000
+n_stderr = 6
+
+###############################################################################
+
+root = os.path.dirname(os.path.realpath(__file__))
+
+# The settings of the shipped models
+shipped_config = RDFConfig(backend="numpy")
+
+# (atol, rtol) of every check. The AP-RDFs are rounded to 12 decimals and the bag-of-atoms written with 8.
+tolerances = {
+    "calculate_rdfs.main, reference": (2e-12, 0.0),
+    "calculate_rdfs.main_batch": (2e-12, 0.0),
+    "numpy": (2e-12, 0.0),
+    "numba": (2e-12, 0.0),
+    "batch": (2e-12, 0.0),
+    "gauss_tol=1e-12": (1e-11, 0.0),
+    "float32 numpy": (5e-7, 1e-5),
+    "float32 numba": (5e-7, 1e-5),
+    "float32 batch": (5e-7, 1e-5),
+    "symmetry": (1e-9, 0.0),
+    # For the sampled AP-RDFs: atol for the structures computed exactly, and rtol times the largest value of each
+    # sampled structure on top of n_stderr standard errors (those of the sparse far tails are underestimated)
+    "sampled": (2e-12, 1e-4),
+    "incremental": (2e-12, 0.0),
+    "incremental, edited": (1e-11, 0.0),
+    "bag-of-atoms scripts": (0.0, 0.0),
+    "compute_boa": (5.01e-9, 0.0),
+    "compute_boa_batch": (5.01e-9, 0.0),
+    "incremental boa": (5.01e-9, 0.0),
+    "BagCounts (compact)": (1.01e-8, 0.0),
+    "geometry": (0.0, 1e-9),
+    "pandas csv": (0.0, 1e-14),
+    "sparse .npz": (0.0, 1e-14),
+    "arrow csv (float32)": (0.0, 1e-7),
+    "torch": (0.0, 1e-5),
+    "numpy engine": (0.0, 1e-4),
+    "BatchScorer": (0.0, 1e-4),
+    "arrow csv to numpy engine": (0.0, 1e-3),
+}
+
+# The int8 models (see quantize_models.py) may differ from the torch ones by at most int8_range times the range of the
+# reference predictions of each model. Dynamic quantization differs between backends (fbgemm, qnnpack) and torch
+# versions; the shipped models differ by up to about 6% of the range on the bundled structures.
+int8_range = 0.1
+
+# Elements with every property the descriptors and the geometry use
+elements = ["H", "C", "N", "O", "F", "Mg", "Al", "P", "S", "Cl", "V", "Cr", "Mn", "Fe", "Co", "Ni", "Cu", "Zn", "Br",
+            "Zr", "Cd", "In", "I", "Ba"]
+common = ["H", "C", "N", "O", "Zn", "Cu"]
+
+
+def wrap(frac):
+    frac = np.mod(frac, 1.0)
+    frac[frac >= 1.0] = 0.0
+    return frac
+
+
+def in_cell(frac):
+    # Whether every atom is in the cell as the bag-of-atoms takes it (x, y in [0, 1), z in [0, 1])
+    frac = np.asarray(frac)
+    return bool(np.all(frac >= 0) and np.all(frac[:, :2] < 1) and np.all(frac[:, 2] <= 1))
+
+
+def synthetic_structures(rng):
+    # [(name, (a, b, c, alpha, beta, gamma), element symbols, frac)]
+    def random_cell(n, low, high, elements=common):
+        return (tuple(rng.uniform(low, high, 3)) + tuple(rng.uniform(75, 105, 3)),
+                list(rng.choice(elements, n)), rng.random((n, 3)))
+
+    structures = [("syn_pair", (4.2, 4.5, 4.9, 90.0, 90.0, 90.0), ["Zn", "O"], np.array([[0.1, 0.2, 0.3], [0.6, 0.5, 0.4]]))]
+    structures += [(name, *random_cell(n, low, high)) for name, n, low, high in
+                   (("syn_small", 20, 8, 12), ("syn_medium", 90, 12, 16), ("syn_large", 230, 16, 20))]
+    structures.append(("syn_elements", *random_cell(2 * len(elements), 12, 15, elements)))
+
+    # Atoms exactly on the bag edges (bag_edges[k], as bag-of-atoms.py computes them), including z = 1
+    n = 40
+    edges = np.column_stack([rng.choice(bag_edges[:-1], n), rng.choice(bag_edges[:-1], n), rng.choice(bag_edges, n)])
+    structures.append(("syn_bag_edges", (11.0, 12.5, 13.0, 90.0, 100.0, 90.0), list(rng.choice(common, n)), edges))
+
+    # Cubic framework: the 48 operations of m-3m on 3 atoms in general positions (144 atoms)
+    rotations = []
+    for axes in permutations(range(3)):
+        for signs in product([1, -1], repeat=3):
+            rotation = np.zeros((3, 3))
+            rotation[range(3), axes] = signs
+            rotations.append(rotation)
+    asymmetric = rng.random((3, 3))
+    frac = wrap(np.concatenate([asymmetric @ rotation.T for rotation in rotations]))
+    species = [element for element in rng.choice(common, 3) for _ in rotations]
+    frac = frac.reshape(len(rotations), 3, 3).transpose(1, 0, 2).reshape(-1, 3)
+    structures.append(("syn_cubic", (24.0, 24.0, 24.0, 90.0, 90.0, 90.0), species, frac))
+
+    # 2 x 2 x 1 supercell of a centrosymmetric triclinic cell (80 atoms)
+    base = rng.random((10, 3))
+    base_species = list(rng.choice(common, 10))
+    frac, species = [], []
+    for x, element in zip(np.concatenate([base, wrap(-base)]), base_species * 2):
+        for i, j in product(range(2), range(2)):
+            frac.append((x + [i, j, 0]) / [2, 2, 1])
+            species.append(element)
+    structures.append(("syn_supercell", (2 * 9.1, 2 * 9.7, 10.3, 82.0, 97.0, 103.0), species, wrap(np.array(frac))))
+
+    # Cubic framework of 96 atoms in the skewed basis a = (L, 0, 0), b = (2L, L, L), c = (0, 0, L), whose 27
+    # images do not always hold the nearest copy of an atom (the symmetry reduction must not be used)
+    length = 12.0
+    asymmetric = rng.random((2, 3))
+    cubic = wrap(np.concatenate([asymmetric @ rotation.T for rotation in rotations]))
+    basis = np.array([[1.0, 0.0, 0.0], [2.0, 1.0, 1.0], [0.0, 0.0, 1.0]]).T
+    species = list(rng.choice(common, 2, replace=False)) * len(rotations)
+    angles = np.degrees(np.arccos([1 / np.sqrt(6), 0.0, 2 / np.sqrt(6)]))
+    structures.append(("syn_skewed", (length, length * np.sqrt(6), length, *angles), species,
+                       wrap(np.linalg.solve(basis, cubic.T).T)))
+
+    # Cubic framework of 96 atoms with every third atom written one cell away (outside [0, 1)), as in some CoRE
+    # cifs; the AP-RDF sums the coordinates as written, so the symmetry reduction must not be used
+    asymmetric = rng.random((2, 3))
+    frac = wrap(np.concatenate([asymmetric @ rotation.T for rotation in rotations]))
+    frac[::3] += rng.choice([-1.0, 1.0], (len(frac[::3]), 3))
+    species = list(rng.choice(common, 2, replace=False)) * len(rotations)
+    structures.append(("syn_shifted", (20.0, 20.0, 20.0, 90.0, 90.0, 90.0), species, frac))
+    return structures
+
+
+def write_cif(path, name, cell, species, frac):
+    # P1 cif in the layout of the CoRE MOF cifs, which both read_cif and read_cif_atoms read; the coordinates
+    # are written exactly (repr), so that the atoms on the bag edges stay on them. As in the CoRE cifs, a bond loop
+    # (here of the first two atoms) follows the atoms: the original bag-of-atoms.py reads them up to the next loop_
+    # and never stops without one.
+    with open(path, 'w') as f:
+        f.write("data_{}\n_symmetry_space_group_name_H-M    'P1'\n_symmetry_Int_Tables_number 1\n"
+                "loop_\n_symmetry_equiv_pos_as_xyz\n  x,y,z\n".format(name))
+        for key, value in zip(("a", "b", "c"), cell[:3]):
+            f.write("_cell_length_{} {!r}\n".format(key, float(value)))
+        for key, value in zip(("alpha", "beta", "gamma"), cell[3:]):
+            f.write("_cell_angle_{} {!r}\n".format(key, float(value)))
+        f.write("loop_\n_atom_site_label\n_atom_site_type_symbol\n_atom_site_description\n_atom_site_fract_x\n"
+                "_atom_site_fract_y\n_atom_site_fract_z\n_atom_type_partial_charge\n")
+        for k, (element, x) in enumerate(zip(species, frac)):
+            f.write("{0}{1} {0} {0} {2!r} {3!r} {4!r} 0.0\n".format(element, k, *(float(v) for v in x)))
+        distance = np.linalg.norm(cell_matrix(*cell) @ (np.asarray(frac[1]) - frac[0]))
+        f.write("loop_\n_geom_bond_atom_site_label_1\n_geom_bond_atom_site_label_2\n_geom_bond_distance\n"
+                "_geom_bond_site_symmetry_2\n_ccdc_geom_bond_type\n{}0 {}1 {:.3f} . S\n".format(
+                    species[0], species[1], distance))
+
+
+def load_calculate_rdfs():
+    spec = importlib.util.spec_from_file_location("calculate_rdfs", os.path.join(root, "CalculateRDFs", "calculate_rdfs.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_calculate_rdfs(module, cifs, config, batched=False):
+    # AP-RDFs of the cifs from calculate_rdfs.main (or main_batch), whatever the settings at the top of the script
+    module.config, module.full_config = config, replace(config, symmetry=False)
+    module.sample_pairs = module.error_dst = module.geometry_dst = None
+    module.batch_atoms, module.grid_spacing = 200, 0.5
+    lines = module.main_batch(cifs)[0].splitlines() if batched else [module.main(cif) for cif in cifs]
+    return np.array([line.rstrip('\n').split(',')[-len(config.columns):] for line in lines], dtype=np.float64)
+
+
+def run_boa_scripts(cifs, names):
+    # Bag-of-atoms of the cifs from bag-of-atoms.py and gen-bag-of-atoms.py, run on a copy of the cifs
+    import pandas as pd
+
+    with tempfile.TemporaryDirectory() as directory:
+        for cif in cifs:
+            shutil.copy(cif, directory)
+        for script in ("bag-of-atoms.py", "gen-bag-of-atoms.py"):
+            subprocess.run([sys.executable, os.path.join(root, "CalculateBOAs", script), directory], cwd=directory,
+                           check=True, stdout=subprocess.DEVNULL)
+        data = pd.read_csv(os.path.join(directory, "descriptors.csv"), index_col=0)
+    data.index = [name.strip() for name in data.index]
+    return data.loc[names, boa_columns].to_numpy(dtype=np.float64)
+
+
+def geometry(module, cifs, structures):
+    # The five estimated geometric descriptors of calculate_rdfs.py, with Pore_3 = Pore_1, in the order of geom_features
+    module.grid_spacing = 0.5
+    values = np.array([module.geometry(cif, structure) for cif, structure in zip(cifs, structures)])
+    return np.column_stack([values, values[:, geom_features.index("Pore_1")]])
+
+
+def model_sets():
+    # (target, feature set) of every shipped model that needs no chemical motifs
+    models = []
+    for target in ("wc", "Sel"):
+        for path in sorted(glob(os.path.join(root, target, "*_{}_model.pt".format(target)))):
+            feature_set = os.path.basename(path)[:-len("_{}_model.pt".format(target))]
+            if 'mot' not in feature_set.split('+'):
+                models.append((target, feature_set))
+    return models
+
+
+def model_features(feature_set, golden):
+    return assemble_features(feature_set, golden["boa"], golden["rdf"][golden["in_cell"]], golden["geometric"])
+
+
+def make_golden(cifs):
+    from co2mof.predict import Predictor, ScalerStats
+
+    structures = [read_cif(cif) for cif in cifs]
+    names = [read_cif_atoms(cif)[0].strip() for cif in cifs]
+    inside = np.array([in_cell(frac) for _, frac, _ in structures])
+    calculate_rdfs = load_calculate_rdfs()
+    cell_cifs = [cif for cif, keep in zip(cifs, inside) if keep]
+    golden = {"names": np.array(names), "in_cell": inside,
+              "rdf": run_calculate_rdfs(calculate_rdfs, cifs, replace(shipped_config, backend="reference")),
+              "boa": run_boa_scripts(cell_cifs, list(np.array(names)[inside])),
+              "geometric": geometry(calculate_rdfs, cell_cifs, [s for s, keep in zip(structures, inside) if keep])}
+    for target, feature_set in model_sets():
+        features = model_features(feature_set, golden)
+        scaler = ScalerStats.fit(features)
+        golden["mean {}".format(feature_set)] = scaler.mean_
+        golden["scale {}".format(feature_set)] = scaler.scale_
+        predictions = Predictor(feature_set, target).predict(features, scaler)
+        golden["{} {}".format(target, feature_set)] = predictions
+    return golden
+
+
+class Report:
+    """Prints one line per check and counts the failures."""
+
+    def __init__(self):
+        self.names = []
+        self.n_checks = self.n_failed = 0
+        self.skipped = []
+
+    def section(self, title, names):
+        # names: the structures of the rows of the checks that follow
+        self.names = list(names)
+        print("\n{}\n{:<32} {:>11} {:>9}  {}".format(title, "check", "max |diff|", "of tol", "worst value"))
+
+    def compare(self, check, values, reference, columns, tolerance=None):
+        # tolerance: per value, by default from tolerances[check] and the largest |reference| of every column
+        reference = np.asarray(reference, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64).reshape(reference.shape)
+        if tolerance is None:
+            atol, rtol = tolerances[check]
+            tolerance = atol + rtol * np.abs(reference).max(axis=0)
+        diff = np.abs(values - reference)
+        diff[np.isnan(diff)] = np.inf
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = np.where(diff > 0, diff / tolerance, 0.0)
+        row, column = np.unravel_index(np.argmax(ratio), ratio.shape)
+        failed = bool(np.any(diff > tolerance))
+        self.n_checks += 1
+        self.n_failed += failed
+        worst = "{}: {}".format(self.names[row], columns[column]) if diff.max() > 0 else "-"
+        print("{:<32} {:>11.2e} {:>9.3g}  {}{}".format(check, diff.max(), ratio.max(), worst, "  FAILED" if failed else ""))
+
+    def skip(self, check, reason):
+        self.skipped.append("{} ({})".format(check, reason))
+
+
+def check_rdfs(report, cifs, structures, golden, calculate_rdfs):
+    from co2mof.incremental import IncrementalDescriptors
+    from co2mof.rdf_sampling import compute_aprdf_sampled
+
+    reference, columns = golden["rdf"], shipped_config.columns
+    report.section("AP-RDFs ({} values)".format(reference.shape[1]), golden["names"])
+
+    def each(config):
+        return np.array([compute_aprdf(*structure, config) for structure in structures])
+
+    if check_reference:
+        report.compare("calculate_rdfs.main, reference", run_calculate_rdfs(
+            calculate_rdfs, cifs, replace(shipped_config, backend="reference")), reference, columns)
+    report.compare("calculate_rdfs.main_batch", run_calculate_rdfs(
+        calculate_rdfs, cifs, replace(shipped_config, backend="auto"), batched=True), reference, columns)
+    backends = ("numpy", "numba") if has_numba else ("numpy",)
+    if not has_numba:
+        report.skip("numba, float32 numba", "numba is not installed")
+    for backend in backends:
+        report.compare(backend, each(replace(shipped_config, backend=backend)), reference, columns)
+    report.compare("batch", compute_aprdf_batch(structures, shipped_config), reference, columns)
+    report.compare("gauss_tol=1e-12", each(replace(shipped_config, gauss_tol=1e-12)), reference, columns)
+    for backend in backends:
+        report.compare("float32 " + backend, each(replace(shipped_config, backend=backend, precision="float32")),
+                       reference, columns)
+    report.compare("float32 batch", compute_aprdf_batch(structures, replace(shipped_config, precision="float32")),
+                   reference, columns)
+
+    try:
+        report.compare("symmetry", each(replace(shipped_config, symmetry=True)), reference, columns)
+    except ImportError:
+        report.skip("symmetry", "needs scipy")
+
+    # Sampled: exact below the budget, within n_stderr standard errors above it
+    sampled = [compute_aprdf_sampled(*structure, shipped_config, sample_pairs, seed=k)
+               for k, structure in enumerate(structures)]
+    values, stderr = (np.array(part) for part in zip(*sampled))
+    atol, rtol = tolerances["sampled"]
+    exact = stderr.max(axis=1, keepdims=True) == 0
+    report.compare("sampled", values, reference, columns, np.where(
+        exact, atol, n_stderr * stderr + rtol * np.abs(reference).max(axis=1, keepdims=True)))
+
+    # IncrementalDescriptors keeps the bag-of-atoms too, so only of the structures in the cell
+    inside = golden["in_cell"]
+    report.names = list(golden["names"][inside])
+    structures, reference = [s for s, keep in zip(structures, inside) if keep], reference[inside]
+    mofs = [IncrementalDescriptors(*structure, shipped_config) for structure in structures]
+    report.compare("incremental", np.array([mof.rdf() for mof in mofs]), reference, columns)
+    # Remove the first atom and add it back (at the end, which changes nothing), then move the last one away and back
+    for mof, (_, frac, species) in zip(mofs, structures):
+        mof.remove(0)
+        mof.add(int(species[0]), frac[0])
+        mof.move(len(species) - 1, wrap(frac[-1] + 0.25))
+        mof.move(len(species) - 1, frac[-1])
+    report.compare("incremental, edited", np.array([mof.rdf() for mof in mofs]), reference, columns)
+    return mofs
+
+
+def check_boas(report, cifs, names, structures, golden, mofs):
+    from co2mof.sparse import BagCounts
+
+    reference = golden["boa"]
+    report.section("Bag-of-atoms ({} values)".format(reference.shape[1]), names)
+    if check_reference:
+        report.compare("bag-of-atoms scripts", run_boa_scripts(cifs, names), reference, boa_columns)
+    report.compare("compute_boa", np.array([compute_boa(frac, species) for _, frac, species in structures]),
+                   reference, boa_columns)
+    report.compare("compute_boa_batch", compute_boa_batch(structures), reference, boa_columns)
+    report.compare("incremental boa", np.array([mof.boa() for mof in mofs]), reference, boa_columns)
+
+    # As bag-of-atoms.py and gen-bag-of-atoms.py with compact = True
+    atoms = [read_cif_atoms(cif) for cif in cifs]
+    bag_counts = BagCounts.from_atoms([name for name, _, _ in atoms], [to_species(symbols) for _, symbols, _ in atoms],
+                                      [bag_indices(frac) for _, _, frac in atoms])
+    compact = bag_counts.to_descriptors()
+    report.compare("BagCounts (compact)", compact.dense(positions=[compact.columns.index(c) for c in boa_columns]),
+                   reference, boa_columns)
+
+
+def check_geometry(report, cifs, structures, golden, calculate_rdfs):
+    report.section("Geometric descriptors", [read_cif_atoms(cif)[0].strip() for cif in cifs])
+    try:
+        report.compare("geometry", geometry(calculate_rdfs, cifs, structures), golden["geometric"], geom_features)
+    except ImportError:
+        report.skip("geometry", "needs scipy")
+
+
+def write_descriptor_csv(path, golden, columns):
+    # The reference descriptors as a descriptor csv laid out as described in the README (duplicate AP-RDF names included)
+    rows = assemble_features("geo+rdf+boa", golden["boa"], golden["rdf"][golden["in_cell"]], golden["geometric"])
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(['Unnamed: 0'] + dropped_motifs + columns + ['wc', 'Sel', 'label'])
+        writer.writerows([name] + [0] * len(dropped_motifs) + [repr(float(v)) for v in row] + ['', '', '']
+                         for name, row in zip(golden["names"][golden["in_cell"]], rows))
+
+
+def check_readers(report, golden, directory):
+    from co2mof.csv_reader import has_pyarrow
+    from co2mof.sparse import SparseDescriptors
+
+    columns = boa_columns + shipped_config.columns + geom_features
+    reference = assemble_features("geo+rdf+boa", golden["boa"], golden["rdf"][golden["in_cell"]], golden["geometric"])
+    report.section("Descriptor files ('geo+rdf+boa', {} values)".format(reference.shape[1]),
+                   golden["names"][golden["in_cell"]])
+    descriptor_csv = os.path.join(directory, "descriptors.csv")
+    write_descriptor_csv(descriptor_csv, golden, columns)
+    report.compare("pandas csv", read_features("geo+rdf+boa", descriptor_csv, verbose=False)[1], reference, columns)
+    sparse = os.path.join(directory, "descriptors.npz")
+    SparseDescriptors.from_csv(descriptor_csv).save(sparse)
+    report.compare("sparse .npz", read_features("geo+rdf+boa", sparse, verbose=False)[1], reference, columns)
+    if has_pyarrow:
+        from co2mof.csv_reader import iter_descriptor_csv
+        report.compare("arrow csv (float32)", np.concatenate(
+            [features for _, features in iter_descriptor_csv("geo+rdf+boa", descriptor_csv)]), reference, columns)
+    else:
+        report.skip("arrow csv (float32)", "pyarrow is not installed")
+    return descriptor_csv
+
+
+def check_predictions(report, structures, golden, descriptor_csv):
+    from co2mof.csv_reader import has_pyarrow
+    from co2mof.features import iter_features
+    from co2mof.predict import Predictor, ScalerStats
+    from co2mof.scoring import BatchScorer
+
+    models = model_sets()
+    columns = ["{} {}".format(target, feature_set) for target, feature_set in models]
+    reference = np.column_stack([golden[column] for column in columns])
+    report.section("Predictions ({})".format(", ".join(columns)), golden["names"][golden["in_cell"]])
+    scalers = {feature_set: ScalerStats(golden["mean " + feature_set], golden["scale " + feature_set])
+               for _, feature_set in models}
+
+    def predict(engine, features=None):
+        return np.column_stack([Predictor(feature_set, target, engine=engine).predict(
+            model_features(feature_set, golden) if features is None else features(feature_set), scalers[feature_set])
+            for target, feature_set in models])
+
+    has_torch = importlib.util.find_spec("torch") is not None
+    if has_torch:
+        report.compare("torch", predict("torch"), reference, columns)
+    else:
+        report.skip("torch, int8 engine", "torch is not installed")
+    try:
+        report.compare("numpy engine", predict("numpy"), reference, columns)
+    except (ImportError, FileNotFoundError) as e:
+        report.skip("numpy engine", e)
+        return
+    if has_torch:
+        report.compare("int8 engine", predict("int8"), reference, columns,
+                       int8_range * np.ptp(reference, axis=0))
+
+    report.compare("BatchScorer", np.column_stack([
+        BatchScorer(feature_set, scalers[feature_set], [target], config=shipped_config).score(
+            structures, golden["geometric"])[target] for target, feature_set in models]), reference, columns)
+    if has_pyarrow:
+        report.compare("arrow csv to numpy engine", predict("numpy", lambda feature_set: np.concatenate(
+            [features for _, features in iter_features(feature_set, descriptor_csv, csv_engine="arrow")])),
+                       reference, columns)
+
+
+if __name__ == "__main__":
+
+    print("Start: ", datetime.now().strftime("%c"))
+    update = update or "--update" in sys.argv[1:]
+    golden_path = os.path.join(root, golden_dir, "golden.npz")
+    cif_dir = os.path.join(root, golden_dir, "cifs")
+
+    if update:
+        if os.path.isdir(cif_dir):
+            shutil.rmtree(cif_dir)
+        os.makedirs(cif_dir)
+        for name, cell, species, frac in synthetic_structures(np.random.default_rng(0)):
+            write_cif(os.path.join(cif_dir, name + ".cif"), name, cell, species, frac)
+        if src is not None:
+            for cif in sorted(glob(os.path.join(src, "*.cif"))):
+                shutil.copy(cif, cif_dir)
+        cifs = sorted(glob(os.path.join(cif_dir, "*.cif")))
+        print("Computing the golden outputs of {} structures...".format(len(cifs)))
+        np.savez(golden_path, **make_golden(cifs))
+        print("Written to {}".format(golden_path))
+        print("\nEnd: ", datetime.now().strftime("%c"))
+        sys.exit()
+
+    with np.load(golden_path) as stored:
+        golden = dict(stored)
+    names = list(golden["names"])
+    cifs = sorted(glob(os.path.join(cif_dir, "*.cif")))
+    structures = [read_cif(cif) for cif in cifs]
+    if [read_cif_atoms(cif)[0].strip() for cif in cifs] != names:
+        sys.exit("The cifs in {} are not those of {}; run with --update".format(cif_dir, golden_path))
+    print("{} structures ({} to {} atoms)".format(len(cifs), min(len(s) for _, _, s in structures),
+                                                  max(len(s) for _, _, s in structures)))
+
+    report = Report()
+    calculate_rdfs = load_calculate_rdfs()
+    mofs = check_rdfs(report, cifs, structures, golden, calculate_rdfs)
+    # The structures with atoms outside the cell only have AP-RDFs
+    inside = golden["in_cell"]
+    cifs, names = [cif for cif, keep in zip(cifs, inside) if keep], [name for name, keep in zip(names, inside) if keep]
+    structures = [structure for structure, keep in zip(structures, inside) if keep]
+    check_boas(report, cifs, names, structures, golden, mofs)
+    check_geometry(report, cifs, structures, golden, calculate_rdfs)
+    with tempfile.TemporaryDirectory() as directory:
+        descriptor_csv = check_readers(report, golden, directory)
+        check_predictions(report, structures, golden, descriptor_csv)
+
+    print("\n{} checks, {} failed".format(report.n_checks, report.n_failed))
+    for skipped in report.skipped:
+        print("Skipped: {}".format(skipped))
+    print("\nEnd: ", datetime.now().strftime("%c"))
+    if report.n_failed:
+        sys.exit(1)
@@ -0,0 +1,114 @@
+"""
+Throughput of in-process candidate scoring (co2mof/scoring.py) on this machine, in candidates/s.
+
+Scores n_candidates structures with the models of feature_set, batch_size candidates at a time,
+from the cifs in src or, if src is None, from random structures generated in memory (as a
+generative loop would produce them). Reports candidates/s for every batch size, the time spent on
+the AP-RDFs, the bag-of-atoms and the models (batch size 1 scores the candidates one at a time).
+The features are scaled with statistics fitted once on all the candidates. For the 'geo' feature
+sets, the geometric descriptors of every candidate are estimated once beforehand (untimed) with
+co2mof/geometry.py, on a coarse grid and with few surface samples, and Pore_3, which it does not
+estimate, is taken equal to Pore_1.
+
+For instructions on using this code, please read the corresponding README.
+"""
+import os
+from glob import glob
+from time import perf_counter
+from datetime import datetime
+
+import numpy as np
+
+from co2mof import RDFConfig, cell_matrix, read_cif
+from co2mof.features import geom_features
+from co2mof.geometry import geometric_descriptors
+from co2mof.predict import ScalerStats
+from co2mof.scoring import BatchScorer
+
+########################### USER MUST DEFINE THESE ###########################
+
+# Feature set of the models: 'boa' (wc only) needs nothing but the structures; 'geo+rdf' and 'geo+boa' also
+# need the geometric descriptors
+feature_set = "geo+rdf"
+
+# Directory of cifs to score, or None for random structures of n_atoms atoms
+src = None
+n_atoms = (50, 150)
+
+n_candidates = 2000
+batch_sizes = (1, 16, 64, 256)
+
+# "numpy" (no torch) or "torch"
+engine = "numpy"
+
+# Gaussian truncation tolerance of the AP-RDFs, as in CalculateRDFs/calculate_rdfs.py (None evaluates every bin)
+gauss_tol = None
+
+# Grid spacing (A) and surface samples per atom of the geometric descriptors of the 'geo' feature sets (see
+# co2mof/geometry.py); coarser than the defaults, since the values only serve as model inputs here
+grid_spacing = 1.0
+surface_samples = 100
+
+###############################################################################
+
+
+def random_candidates(n, rng):
+    # Random triclinic cells of 10-16 A with atoms of common MOF elements
+    elements = np.array([1, 6, 7, 8, 30])
+    candidates = []
+    for _ in range(n):
+        lengths = rng.uniform(10, 16, 3)
+        angles = rng.uniform(80, 100, 3)
+        count = rng.integers(n_atoms[0], n_atoms[1] + 1)
+        # Keep the coordinates strictly inside the bags' [0, 1) range
+        frac = rng.random((count, 3)) * (1 - 1e-9)
+        candidates.append((cell_matrix(*lengths, *angles), frac, rng.choice(elements, count)))
+    return candidates
+
+
+def geometric_inputs(candidates):
+    # The six geometric descriptors of every candidate, in the order of geom_features, with Pore_3 = Pore_1
+    rows = []
+    for structure in candidates:
+        values = geometric_descriptors(*structure, spacing=grid_spacing, n_samples=surface_samples)
+        values["Pore_3"] = values["Pore_1"]
+        rows.append([values[column] for column in geom_features])
+    return np.array(rows)
+
+
+def timed(scorer, candidates, geometric, batch_size):
+    scorer.timings = dict.fromkeys(scorer.timings, 0.0)
+    start = perf_counter()
+    for k in range(0, len(candidates), batch_size):
+        scorer.score(candidates[k:k + batch_size], None if geometric is None else geometric[k:k + batch_size])
+    return perf_counter() - start
+
+
+if __name__ == "__main__":
+
+    print("Start: ", datetime.now().strftime("%c"))
+    rng = np.random.default_rng(0)
+    if src is None:
+        candidates = random_candidates(n_candidates, rng)
+    else:
+        candidates = [read_cif(name) for name in sorted(glob(os.path.join(src, '*.cif')))[:n_candidates]]
+    geometric = None
+    if 'geo' in feature_set.split('+'):
+        print("Estimating the geometric descriptors of {} candidates...".format(len(candidates)))
+        geometric = geometric_inputs(candidates)
+
+    # Statistics fitted once on all the candidates, so that every batch is scaled the same way
+    scorer = BatchScorer(feature_set, None, engine=engine, config=RDFConfig(gauss_tol=gauss_tol))
+    scorer.scaler = ScalerStats.fit(scorer.features(candidates, geometric))
+    scorer.score(candidates[:2], None if geometric is None else geometric[:2])
+    print("{} candidates ({} atoms on average), {} models of '{}', {} engine, {} CPUs\n".format(
+        len(candidates), int(np.mean([len(s) for _, _, s in candidates])), "/".join(scorer.predictors),
+        feature_set, engine, os.cpu_count()))
+
+    print("{:>10} {:>14} {:>9} {:>9} {:>9}".format("batch size", "candidates/s", "RDF s", "BOA s", "model s"))
+    for batch_size in batch_sizes:
+        elapsed = timed(scorer, candidates, geometric, batch_size)
+        print("{:>10} {:>14.1f} {:>9.2f} {:>9.2f} {:>9.2f}".format(
+            batch_size, len(candidates) / elapsed, scorer.timings['rdf'], scorer.timings['boa'], scorer.timings['model']))
+
+    print("\nEnd: ", datetime.now().strftime("%c"))